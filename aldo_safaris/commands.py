@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+import click
+from flask_migrate import stamp
+
+from aldo_safaris.extensions import db
+from aldo_safaris.repositories.analytics import rebuild_rollups
+from aldo_safaris.repositories.exports import EXPORT_KINDS, EXPORT_INCLUDES, stream_export
+from aldo_safaris.repositories.package_search import reindex_all_packages
+from aldo_safaris.repositories.payment_totals import find_drift, recompute_payment_totals
+from aldo_safaris.repositories.sync import purge_superseded_changes
+from aldo_safaris.utils.exports import EXPORT_FORMATS, export_chunks, gzip_chunks
+from aldo_safaris.utils.idempotency import purge_expired_keys
+
+
+def register_commands(app):
+    @app.cli.command('create-db')
+    @click.option('--no-stamp', is_flag=True, help='Do not mark the new schema as the migrations head.')
+    def create_db(no_stamp):
+        # Create all tables from the models on an empty database. The schema is stamped with the
+        # current Alembic head so later "flask db upgrade" runs only newer migrations.
+        db.create_all()
+        click.echo('Created database tables.')
+        if not no_stamp:
+            stamp()
+            click.echo('Stamped schema at the migrations head.')
+
+    @app.cli.command('reindex-packages')
+    @click.option('--batch-size', default=500, show_default=True, help='Packages indexed per transaction.')
+    def reindex_packages(batch_size):
+        # Rebuild the travel package search index, e.g. after the search tables were first created.
+        # Package writes keep it up to date after that.
+        indexed = reindex_all_packages(batch_size)
+        click.echo('Indexed %d travel packages.' % indexed)
+
+    @app.cli.command('purge-idempotency-keys')
+    @click.option('--batch-size', default=1000, show_default=True, help='Keys deleted per transaction.')
+    def purge_idempotency_keys(batch_size):
+        # Delete Idempotency-Key records past their TTL; run it from cron
+        deleted = purge_expired_keys(batch_size)
+        click.echo('Deleted %d expired idempotency keys.' % deleted)
+
+    @app.cli.command('purge-notification-changes')
+    @click.option('--days', type=int, help='Keep changes younger than this '
+                  '(default: NOTIFICATION_CHANGE_RETENTION_DAYS).')
+    @click.option('--batch-size', default=1000, show_default=True, help='Changes deleted per transaction.')
+    def purge_notification_changes(days, batch_size):
+        # Compact the delta sync log: drop changes a later change of the same notification
+        # supersedes. Run it from cron.
+        if days is None:
+            days = app.config.get('NOTIFICATION_CHANGE_RETENTION_DAYS', 7)
+        deleted = purge_superseded_changes(datetime.now() - timedelta(days=days), batch_size)
+        click.echo('Deleted %d superseded notification changes.' % deleted)
+
+    @app.cli.command('reconcile-payments')
+    @click.option('--fix', is_flag=True, help='Rewrite the totals of every booking from its payments.')
+    @click.option('--sample', default=20, show_default=True, help='Drifted bookings to list.')
+    def reconcile_payments(fix, sample):
+        # Compare Booking.amount_paid / balance_due / payment_status with the payments table.
+        # Exits with status 1 when drift is found and --fix was not given.
+        count, total, rows = find_drift(sample)
+        click.echo('%d bookings drifted, %.2f in total.' % (count, total))
+        for row in rows:
+            click.echo('  booking %s: stored %.2f, actual %.2f, status %s (expected %s)' % (
+                row.booking_id, row.stored, row.actual, row.payment_status, row.expected_status))
+        if fix and count:
+            updated = recompute_payment_totals()
+            db.session.commit()
+            click.echo('Recomputed totals for %d bookings.' % updated)
+        elif count:
+            raise SystemExit(1)
+
+
+    @app.cli.command('rebuild-analytics')
+    @click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='First day to rebuild (default: all).')
+    @click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Last day to rebuild (default: all).')
+    def rebuild_analytics(start, end):
+        # Recompute the daily revenue rollups from Booking and payments, e.g. after bookings were
+        # changed outside the API. Booking and payment writes keep them up to date otherwise.
+        written = rebuild_rollups(start.date() if start else None, end.date() if end else None)
+        db.session.commit()
+        click.echo('Wrote %d rollup rows.' % written)
+
+    @app.cli.command('export')
+    @click.argument('kind', type=click.Choice(EXPORT_KINDS))
+    @click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv', show_default=True)
+    @click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='First day (date_of_booking / payment_date).')
+    @click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Last day, inclusive.')
+    @click.option('--include', type=click.Choice(list(EXPORT_INCLUDES)), multiple=True,
+                  help='Join package or user columns; may be repeated.')
+    @click.option('--gzip', 'compress', is_flag=True, help='Write gzip-compressed output.')
+    @click.option('--output', '-o', type=click.Path(dir_okay=False), help='File to write (default: stdout).')
+    def export_data(kind, fmt, start, end, include, compress, output):
+        # Same export as GET /api/v1/export/<kind>, streamed from a server-side cursor:
+        #     flask export bookings --start 2024-01-01 --include package --gzip -o bookings.csv.gz
+        columns, rows = stream_export(kind, start.date() if start else None, end.date() if end else None,
+                                      list(dict.fromkeys(include)))
+        chunks = export_chunks(fmt, columns, rows)
+        chunks = gzip_chunks(chunks) if compress else (chunk.encode('utf-8') for chunk in chunks)
+        out = open(output, 'wb') if output else click.get_binary_stream('stdout')
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if output:
+                out.close()
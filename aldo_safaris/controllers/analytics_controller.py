@@ -0,0 +1,74 @@
+from flask import Blueprint, request, jsonify, current_app
+from datetime import date, datetime, timedelta
+from aldo_safaris.repositories.analytics import (
+    BOOKING_DIMENSIONS, PAYMENT_DIMENSIONS, booking_report, payment_report
+)
+from aldo_safaris.utils.auth import admin_required
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/api/v1/analytics')
+
+# Days reported when no start date is given
+DEFAULT_RANGE_DAYS = 30
+
+
+def parse_report_args(dimensions):
+    # Returns (start, end, group_by, error) from the query string
+    try:
+        end = request.args.get('end')
+        end = datetime.strptime(end, '%Y-%m-%d').date() if end else date.today()
+        start = request.args.get('start')
+        start = datetime.strptime(start, '%Y-%m-%d').date() if start else end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    except ValueError:
+        return None, None, None, 'Invalid date format. Use YYYY-MM-DD'
+
+    if start > end:
+        return None, None, None, 'start must not be after end'
+    max_days = current_app.config.get('ANALYTICS_MAX_RANGE_DAYS', 731)
+    if (end - start).days >= max_days:
+        return None, None, None, 'A report may cover at most %d days' % max_days
+
+    group_by = [name.strip() for name in request.args.get('group_by', '').split(',') if name.strip()]
+    unknown = [name for name in group_by if name not in dimensions]
+    if unknown:
+        return None, None, None, 'Cannot group by %s; use %s' % (', '.join(unknown), ', '.join(dimensions))
+    return start, end, list(dict.fromkeys(group_by)), None
+
+
+def report_response(report, dimensions, count_name, sum_name):
+    start, end, group_by, error = parse_report_args(dimensions)
+    if error:
+        return jsonify({'error': error}), 400
+
+    rows = report(start, end, group_by)
+    totals = {count_name: sum(row[count_name] for row in rows),
+              sum_name: round(sum(row[sum_name] for row in rows), 2)}
+    return jsonify({'start': start.isoformat(), 'end': end.isoformat(), 'group_by': group_by,
+                    'totals': totals, 'rows': rows}), 200
+
+
+# Bookings and booked revenue (total_cost) by day of booking
+# Query parameters:
+#   start, end - YYYY-MM-DD, inclusive; defaults to the last 30 days
+#   group_by   - comma separated: day, package, destination, booking_source
+@analytics_bp.route('/bookings', methods=['GET'])
+@admin_required
+def get_booking_report():
+    try:
+        return report_response(booking_report, BOOKING_DIMENSIONS, 'bookings', 'revenue')
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Paid payments and collected revenue by day of payment
+# Query parameters:
+#   start, end - YYYY-MM-DD, inclusive; defaults to the last 30 days
+#   group_by   - comma separated: day, payment_method
+@analytics_bp.route('/payments', methods=['GET'])
+@admin_required
+def get_payment_report():
+    try:
+        return report_response(payment_report, PAYMENT_DIMENSIONS, 'payments', 'amount')
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
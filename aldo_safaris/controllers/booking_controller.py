@@ -1,7 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
 from datetime import datetime
+import json
+from sqlalchemy import select, insert, or_, and_, text
+from sqlalchemy.exc import SQLAlchemyError
 from aldo_safaris.extensions import db
 from aldo_safaris.models.booking import Booking
+from aldo_safaris.repositories.analytics import (
+    add_bookings_to_rollup, booking_rollup_entry, remove_booking_from_rollup, update_booking_rollup
+)
+from aldo_safaris.repositories.booking_activities import (
+    add_booking_activities, set_booking_activities, delete_booking_activities
+)
+from aldo_safaris.repositories.ownership import NOT_FOUND, get_owned_booking
+from aldo_safaris.repositories.payment_totals import payment_status_for, refresh_balance
+from aldo_safaris.utils.lists import parse_string_list
+from aldo_safaris.utils.pagination import (
+    parse_limit, encode_cursor, decode_cursor, stream_json_array, STREAM_BATCH_SIZE
+)
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 booking_bp = Blueprint('Booking', __name__, url_prefix='/api/v1/booking')
@@ -18,17 +33,19 @@ def create_booking():
         travel_start_date = data.get('travel_start_date')
         travel_end_date = data.get('travel_end_date')
         total_cost = data.get('total_cost')
-        payment_status = data.get('payment_status')
         booking_status = data.get('booking_status')
         destination = data.get('destination')
         accommodation = data.get('accommodation')
         transportation = data.get('transportation')
-        activities = data.get('activities', [])
+        activities = data.get('activities')
         booking_source = data.get('booking_source')
 
         # Basic input validation
         if not all([package_id,user_id, travel_start_date, travel_end_date, total_cost, destination]):
             return jsonify({"error": "All fields are required"}), 400
+        activities, error = parse_string_list(activities, 'activities')
+        if error:
+            return jsonify({"error": error}), 400
 
         # Get the current user from the JWT token
         current_user_id = get_jwt_identity()
@@ -41,7 +58,10 @@ def create_booking():
             travel_start_date=datetime.strptime(travel_start_date, '%Y-%m-%d'),
             travel_end_date=datetime.strptime(travel_end_date, '%Y-%m-%d'),
             total_cost=total_cost,
-            payment_status=payment_status,
+            # Payment totals are maintained from the payments table, starting from nothing paid
+            amount_paid=0,
+            balance_due=total_cost,
+            payment_status=payment_status_for(0, total_cost),
             booking_status=booking_status,
             destination=destination,
             accommodation=accommodation,
@@ -50,8 +70,11 @@ def create_booking():
             booking_source=booking_source
         )
 
-        # Add booking to the database and commit
+        # Add booking, its activity rows and its share of the analytics rollups to the database and commit
         db.session.add(new_booking)
+        db.session.flush()
+        add_booking_activities([(new_booking.booking_id, activities)])
+        add_bookings_to_rollup([new_booking])
         db.session.commit()
 
         return jsonify({'message': 'Booking created successfully', 'booking_id': new_booking.booking_id}), 201
@@ -61,19 +84,223 @@ def create_booking():
         return jsonify({'error': str(e)}), 500
 
 
+# Content types accepted as newline-delimited JSON by the bulk endpoint
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines')
+
+
+def booking_values(data, current_user_id):
+    # Validate one booking from a bulk upload; same rules as create_booking
+    if not isinstance(data, dict):
+        return None, 'Booking must be a JSON object'
+
+    package_id = data.get('package_id')
+    user_id = data.get('user_id')
+    travel_start_date = data.get('travel_start_date')
+    travel_end_date = data.get('travel_end_date')
+    total_cost = data.get('total_cost')
+    destination = data.get('destination')
+
+    if not all([package_id, user_id, travel_start_date, travel_end_date, total_cost, destination]):
+        return None, 'All fields are required'
+
+    activities, error = parse_string_list(data.get('activities'), 'activities')
+    if error:
+        return None, error
+
+    try:
+        travel_start_date = datetime.strptime(travel_start_date, '%Y-%m-%d')
+        travel_end_date = datetime.strptime(travel_end_date, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None, 'Invalid date format. Use YYYY-MM-DD'
+
+    return {
+        'package_id': package_id,
+        'user_id': current_user_id,
+        'date_of_booking': datetime.now(),
+        'travel_start_date': travel_start_date,
+        'travel_end_date': travel_end_date,
+        'total_cost': total_cost,
+        'amount_paid': 0,
+        'balance_due': total_cost,
+        'payment_status': payment_status_for(0, total_cost),
+        'booking_status': data.get('booking_status'),
+        'destination': destination,
+        'accommodation': data.get('accommodation'),
+        'transportation': data.get('transportation'),
+        'activities': activities,
+        'booking_source': data.get('booking_source')
+    }, None
+
+
+def iter_bulk_bookings():
+    # Yields (booking, error) pairs from a JSON array or an NDJSON stream read line by line
+    if request.mimetype in NDJSON_MIMETYPES:
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line), None
+            except ValueError:
+                yield None, 'Invalid JSON'
+        return
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array of bookings')
+    for booking in data:
+        yield booking, None
+
+
+def insert_booking_chunk(chunk):
+    # One INSERT for the whole chunk plus one for its activity rows; the chunk's analytics
+    # rollup change is upserted when the transaction commits. Returns the new ids in chunk order.
+    values = [row for _, row in chunk]
+    dialect = db.engine.dialect
+    if dialect.insert_executemany_returning_sort_by_parameter_order:
+        statement = insert(Booking).returning(Booking.booking_id, sort_by_parameter_order=True)
+        ids = db.session.execute(statement, values).scalars().all()
+    elif dialect.name == 'mysql':
+        # No RETURNING: a single multi-row INSERT, whose rows InnoDB numbers consecutively
+        # (the row count is known up front) from LAST_INSERT_ID(), in auto_increment_increment steps
+        first_id = db.session.execute(insert(Booking).values(values)).lastrowid
+        step = db.session.execute(text('SELECT @@auto_increment_increment')).scalar()
+        ids = [first_id + i * step for i in range(len(values))]
+    else:
+        ids = [db.session.execute(insert(Booking).values(row)).inserted_primary_key[0] for row in values]
+    add_booking_activities(zip(ids, [row['activities'] for row in values]))
+    add_bookings_to_rollup(values)
+    return ids
+
+
+def insert_booking_rows(chunk):
+    # Fallback for a chunk that failed as a whole: isolate the bad rows with savepoints
+    results = []
+    for index, row in chunk:
+        try:
+            with db.session.begin_nested():
+                booking_id = insert_booking_chunk([(index, row)])[0]
+            results.append({'index': index, 'status': 'created', 'booking_id': booking_id})
+        except SQLAlchemyError as e:
+            results.append({'index': index, 'status': 'error', 'error': str(getattr(e, 'orig', None) or e)})
+    return results
+
+
+# Create many bookings in one request
+# Body: a JSON array of bookings, or one booking per line with Content-Type application/x-ndjson
+# Query parameters:
+#   mode=partial - insert the valid rows and report the bad ones, committing chunk by chunk
+#                  once the whole body has been read; by default the whole batch is rejected
+#                  if any row fails
+# Uploads over BULK_BOOKING_MAX_ROWS are answered with 413 and create nothing in either mode
+@booking_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def create_bookings_bulk():
+    try:
+        # Get the current user from the JWT token
+        current_user_id = get_jwt_identity()
+
+        partial = request.args.get('mode') == 'partial'
+        chunk_size = current_app.config.get('BULK_BOOKING_CHUNK_SIZE', 500)
+        max_rows = current_app.config.get('BULK_BOOKING_MAX_ROWS', 5000)
+
+        results = []
+        chunk = []
+        # Partial mode: full chunks waiting for the end of the upload. Nothing is committed
+        # until the whole body has been read, so an upload over max_rows creates nothing.
+        pending = []
+        failed = False
+
+        def flush(rows):
+            if partial:
+                try:
+                    ids = insert_booking_chunk(rows)
+                    db.session.commit()
+                    results.extend({'index': index, 'status': 'created', 'booking_id': booking_id}
+                                   for (index, _), booking_id in zip(rows, ids))
+                except SQLAlchemyError:
+                    db.session.rollback()
+                    results.extend(insert_booking_rows(rows))
+                    db.session.commit()
+            else:
+                ids = insert_booking_chunk(rows)
+                results.extend({'index': index, 'status': 'created', 'booking_id': booking_id}
+                               for (index, _), booking_id in zip(rows, ids))
+
+        try:
+            for index, (data, error) in enumerate(iter_bulk_bookings()):
+                if index >= max_rows:
+                    db.session.rollback()
+                    return jsonify({'error': 'A bulk upload may contain at most %d bookings' % max_rows}), 413
+
+                row = None
+                if error is None:
+                    row, error = booking_values(data, current_user_id)
+                if error:
+                    failed = True
+                    results.append({'index': index, 'status': 'error', 'error': error})
+                    continue
+
+                # In atomic mode there is no point writing more rows once one has failed
+                if failed and not partial:
+                    results.append({'index': index, 'status': 'skipped'})
+                    continue
+
+                chunk.append((index, row))
+                if len(chunk) >= chunk_size:
+                    if partial:
+                        pending.append(chunk)
+                    else:
+                        flush(chunk)
+                    chunk = []
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
+
+        for rows in pending:
+            flush(rows)
+        if chunk and (partial or not failed):
+            flush(chunk)
+        else:
+            for index, _ in chunk:
+                results.append({'index': index, 'status': 'skipped'})
+
+        results.sort(key=lambda result: result['index'])
+        created = sum(1 for result in results if result['status'] == 'created')
+        errors = sum(1 for result in results if result['status'] == 'error')
+
+        if failed and not partial:
+            # Nothing from this batch is kept
+            db.session.rollback()
+            for result in results:
+                if result['status'] == 'created':
+                    result['status'] = 'skipped'
+                    result.pop('booking_id', None)
+            return jsonify({'error': 'Batch rejected, no bookings were created', 'created': 0,
+                            'failed': errors, 'results': results}), 400
+
+        db.session.commit()
+
+        return jsonify({'message': 'Bookings processed', 'created': created,
+                        'failed': errors, 'results': results}), 201 if not errors else 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 @booking_bp.route('/<int:booking_id>', methods=['GET'])
 @jwt_required()
 def get_booking(booking_id):
     try:
-        # Get booking by ID
-        booking = Booking.query.get(booking_id)
-        
-        if not booking:
-            return jsonify({'error': 'Booking not found'}), 404
-        
-        # Ensure the current user is the owner of the booking
+        # Get booking by ID, checking that the current user owns it (JWT identities are strings)
         current_user_id = get_jwt_identity()
-        if booking.user_id != current_user_id:
+        booking, error = get_owned_booking(booking_id, current_user_id)
+
+        if error == NOT_FOUND:
+            return jsonify({'error': 'Booking not found'}), 404
+
+        if error:
             return jsonify({'error': 'You are not authorized to view this booking'}), 403
 
         # Convert booking object to dictionary for response
@@ -85,6 +312,8 @@ def get_booking(booking_id):
             'travel_start_date': booking.travel_start_date,
             'travel_end_date': booking.travel_end_date,
             'total_cost': booking.total_cost,
+            'amount_paid': booking.amount_paid,
+            'balance_due': booking.balance_due,
             'payment_status': booking.payment_status,
             'booking_status': booking.booking_status,
             'destination': booking.destination,
@@ -104,19 +333,22 @@ def get_booking(booking_id):
 @jwt_required()
 def update_booking(booking_id):
     try:
-        # Get booking by ID
-        booking = Booking.query.get(booking_id)
+        # Get booking by ID, checking that the current user owns it (JWT identities are strings)
+        current_user_id = get_jwt_identity()
+        booking, error = get_owned_booking(booking_id, current_user_id)
 
-        if not booking:
+        if error == NOT_FOUND:
             return jsonify({'error': 'Booking not found'}), 404
 
-        # Ensure the current user is the owner of the booking
-        current_user_id = get_jwt_identity()
-        if booking.user_id != current_user_id:
+        if error:
             return jsonify({'error': 'You are not authorized to update this booking'}), 403
 
         # Extract booking data from request JSON
         data = request.json
+        if 'payment_status' in data:
+            # Derived from the booking's payments (see repositories/payment_totals.py)
+            return jsonify({'error': "payment_status cannot be set; it follows the booking's payments"}), 400
+        rollup_before = booking_rollup_entry(booking)
 
         # Update booking fields if provided in request
         if 'travel_package_id' in data:
@@ -129,8 +361,7 @@ def update_booking(booking_id):
             booking.travel_end_date = datetime.strptime(data['travel_end_date'], '%Y-%m-%d')
         if 'total_cost' in data:
             booking.total_cost = data['total_cost']
-        if 'payment_status' in data:
-            booking.payment_status = data['payment_status']
+            refresh_balance(booking.booking_id)
         if 'booking_status' in data:
             booking.booking_status = data['booking_status']
         if 'destination' in data:
@@ -140,11 +371,18 @@ def update_booking(booking_id):
         if 'transportation' in data:
             booking.transportation = data['transportation']
         if 'activities' in data:
-            booking.activities = data['activities']
+            activities, error = parse_string_list(data['activities'], 'activities')
+            if error:
+                # Drop the field changes made above
+                db.session.rollback()
+                return jsonify({"error": error}), 400
+            booking.activities = activities
+            set_booking_activities(booking.booking_id, activities)
         if 'booking_source' in data:
             booking.booking_source = data['booking_source']
 
-        # Commit changes to the database
+        # Move the booking between analytics rollup rows if its key or cost changed, then commit
+        update_booking_rollup(rollup_before, booking)
         db.session.commit()
 
         return jsonify({'message': 'Booking updated successfully'}), 200
@@ -158,18 +396,19 @@ def update_booking(booking_id):
 @jwt_required()
 def delete_booking(booking_id):
     try:
-        # Get booking by ID
-        booking = Booking.query.get(booking_id)
+        # Get booking by ID, checking that the current user owns it (JWT identities are strings)
+        current_user_id = get_jwt_identity()
+        booking, error = get_owned_booking(booking_id, current_user_id)
 
-        if not booking:
+        if error == NOT_FOUND:
             return jsonify({'error': 'Booking not found'}), 404
 
-        # Ensure the current user is the owner of the booking
-        current_user_id = get_jwt_identity()
-        if booking.user_id != current_user_id:
+        if error:
             return jsonify({'error': 'You are not authorized to delete this booking'}), 403
 
-        # Delete booking from the database
+        # Delete booking and its activity rows from the database and take it off the rollups
+        delete_booking_activities(booking.booking_id)
+        remove_booking_from_rollup(booking)
         db.session.delete(booking)
         db.session.commit()
 
@@ -179,7 +418,61 @@ def delete_booking(booking_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def booking_to_dict(booking):
+    # Convert a booking object to a dictionary for listing responses
+    return {
+        'booking_id': booking.booking_id,
+        'travel_package_id': booking.package_id,
+        'user_id': booking.user_id,
+        'date_of_booking': booking.date_of_booking,
+        'travel_start_date': booking.travel_start_date,
+        'travel_end_date': booking.travel_end_date,
+        'total_cost': booking.total_cost,
+        'amount_paid': booking.amount_paid,
+        'balance_due': booking.balance_due,
+        'payment_status': booking.payment_status,
+        'booking_status': booking.booking_status,
+        'destination': booking.destination,
+        'accommodation': booking.accommodation,
+        'transportation': booking.transportation,
+        'activities': booking.activities,
+        'booking_source': booking.booking_source
+    }
+
+
+def parse_bookings_cursor(cursor):
+    # (date or None, booking_id) of the last row served; ValueError for anything else
+    after = decode_cursor(cursor)
+    if (len(after) != 2 or not (after[0] is None or isinstance(after[0], datetime))
+            or not isinstance(after[1], int) or isinstance(after[1], bool)):
+        raise ValueError('Invalid cursor')
+    return after
+
+
+def user_bookings_query(user_id, after=None):
+    # Newest bookings first, keyed on the raw (date_of_booking, booking_id) columns so the page is read
+    # in order from ix_booking_user_id_date_of_booking (InnoDB appends the primary key to it) without a
+    # filesort. MySQL sorts NULL below every date, so undated bookings come last, newest id first: after
+    # a dated row the keyset also takes every undated one, and a cursor without a date pages only those.
+    query = select(Booking).where(Booking.user_id == user_id)
+    if after is not None:
+        after_date, after_id = after
+        if after_date is None:
+            query = query.where(Booking.date_of_booking.is_(None), Booking.booking_id < after_id)
+        else:
+            query = query.where(or_(
+                Booking.date_of_booking < after_date,
+                and_(Booking.date_of_booking == after_date, Booking.booking_id < after_id),
+                Booking.date_of_booking.is_(None)
+            ))
+    return query.order_by(Booking.date_of_booking.desc(), Booking.booking_id.desc())
+
+
 # Example route to list all bookings for the current user
+# Query parameters:
+#   limit  - page size; returns {'bookings': [...], 'next_cursor': ...}
+#   after  - cursor returned as next_cursor by the previous page
+#   stream - when true, stream every booking as a JSON array from a server-side cursor
 @booking_bp.route('/user_bookings', methods=['GET'])
 @jwt_required()
 def get_user_bookings():
@@ -187,31 +480,44 @@ def get_user_bookings():
         # Get the current user ID from JWT token
         current_user_id = get_jwt_identity()
 
-        # Retrieve all bookings for the current user
-        bookings = Booking.query.filter_by(user_id=current_user_id).all()
-
-        # Convert bookings to list of dictionaries for response
-        bookings_data = [
-            {
-                'booking_id': booking.booking_id,
-                'travel_package_id': booking.travel_package_id,
-                'user_id': booking.user_id,
-                'date_of_booking': booking.date_of_booking,
-                'travel_start_date': booking.travel_start_date,
-                'travel_end_date': booking.travel_end_date,
-                'total_cost': booking.total_cost,
-                'payment_status': booking.payment_status,
-                'booking_status': booking.booking_status,
-                'destination': booking.destination,
-                'accommodation': booking.accommodation,
-                'transportation': booking.transportation,
-                'activities': booking.activities,
-                'booking_source': booking.booking_source
-            } for booking in bookings
-        ]
-
-        return jsonify(bookings_data), 200
+        limit = request.args.get('limit')
+        after = request.args.get('after')
+        stream = request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+        try:
+            after = parse_bookings_cursor(after) if after else None
+            limit = parse_limit(limit) if (limit or (after and not stream)) else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if stream:
+            # Rows are fetched in batches from a server-side cursor and written out as they arrive
+            query = user_bookings_query(current_user_id, after).execution_options(
+                stream_results=True, yield_per=STREAM_BATCH_SIZE)
+            if limit is not None:
+                query = query.limit(limit)
+            rows = db.session.execute(query).scalars()
+            body = stream_json_array(rows, booking_to_dict, current_app.json.dumps)
+            return Response(stream_with_context(body), status=200, mimetype='application/json')
+
+        if limit is None:
+            # Retrieve all bookings for the current user
+            bookings = db.session.execute(user_bookings_query(current_user_id)).scalars().all()
+            return jsonify([booking_to_dict(booking) for booking in bookings]), 200
+
+        # Fetch one extra row to find out whether another page exists
+        bookings = db.session.execute(
+            user_bookings_query(current_user_id, after).limit(limit + 1)).scalars().all()
+        next_cursor = None
+        if len(bookings) > limit:
+            bookings = bookings[:limit]
+            last = bookings[-1]
+            next_cursor = encode_cursor(last.date_of_booking, last.booking_id)
+
+        return jsonify({
+            'bookings': [booking_to_dict(booking) for booking in bookings],
+            'next_cursor': next_cursor
+        }), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-
@@ -1,10 +1,9 @@
-from flask import Blueprint, request, jsonify, current_app
-from werkzeug.utils import secure_filename
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import os
 from datetime import datetime
-from aldo_safaris.extensions import db
+from aldo_safaris.extensions import db, images
 from aldo_safaris.models.car_hiring import Car, Rental
+from aldo_safaris.repositories.availability import available_cars_query, lock_car, has_conflict
 
 # Define the blueprint
 car_rental_bp = Blueprint('car_rental', __name__, url_prefix='/api/v1')
@@ -15,10 +14,20 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def set_car_image(car_id):
+    # Callback for the image processor: point the car at its processed image
+    def on_done(image_url):
+        car = db.session.get(Car, car_id)
+        if car:
+            car.image_url = image_url
+            db.session.commit()
+    return on_done
+
 # Car Management Routes
 @car_rental_bp.route('/car', methods=['POST'])
 @jwt_required()
 def create_car():
+    upload = None
     try:
         # Extract car data from request
         make = request.form.get('make')
@@ -37,13 +46,10 @@ def create_car():
         except ValueError:
             return jsonify({"error": "Price per day must be a valid number"}), 400
 
-        # Validate and save the image if provided
-        image_url = None
+        # Validate and receive the image if provided; resizing happens in the background
+        upload = None
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(upload_path)
-            image_url = os.path.join(current_app.config['UPLOAD_URL'], filename)
+            upload = images.receive(file)
 
         # Create a new car
         new_car = Car(
@@ -51,7 +57,7 @@ def create_car():
             model=model,
             year=year,
             available=True,
-            image_url=image_url,
+            image_url=None,
             price_per_day=price_per_day  # Save the price per day
         )
 
@@ -59,15 +65,22 @@ def create_car():
         db.session.add(new_car)
         db.session.commit()
 
-        return jsonify({'message': 'Car created successfully', 'car_id': new_car.id}), 201
+        if upload:
+            images.submit(upload, set_car_image(new_car.id))
+
+        return jsonify({'message': 'Car created successfully', 'car_id': new_car.id,
+                        'image_status': 'processing' if upload else None}), 201
 
     except Exception as e:
         db.session.rollback()
+        if upload:
+            images.discard(upload)
         return jsonify({'error': str(e)}), 500
 
 @car_rental_bp.route('/car/<int:car_id>', methods=['PUT'])
 @jwt_required()
 def update_car(car_id):
+    upload = None
     try:
         # Get car by ID
         car = Car.query.get(car_id)
@@ -95,20 +108,23 @@ def update_car(car_id):
             except ValueError:
                 return jsonify({"error": "Price per day must be a valid number"}), 400
 
-        # Validate and save the new image if provided
+        # Validate and receive the new image if provided; image_url switches once it is processed
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(upload_path)
-            car.image_url = os.path.join(current_app.config['UPLOAD_URL'], filename)
+            upload = images.receive(file)
 
         # Commit changes to the database
         db.session.commit()
 
-        return jsonify({'message': 'Car updated successfully'}), 200
+        if upload:
+            images.submit(upload, set_car_image(car.id))
+
+        return jsonify({'message': 'Car updated successfully',
+                        'image_status': 'processing' if upload else None}), 200
 
     except Exception as e:
         db.session.rollback()
+        if upload:
+            images.discard(upload)
         return jsonify({'error': str(e)}), 500
 
 # Rental Management Route
@@ -135,11 +151,21 @@ def create_rental():
         except ValueError:
             return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
 
-        # Get the car by ID
-        car = Car.query.get(car_id)
+        # Get the car by ID, locking its row until this transaction ends
+        car = lock_car(car_id)
         if not car:
+            db.session.rollback()
             return jsonify({"error": "Car not found"}), 404
 
+        if not car.available:
+            db.session.rollback()
+            return jsonify({"error": "This car is not available for rental"}), 409
+
+        # With the car locked, no other request can book it between this check and the insert
+        if has_conflict(car.id, start_date, end_date):
+            db.session.rollback()
+            return jsonify({"error": "This car is already rented for some of these dates"}), 409
+
         # Calculate the total cost
         days_rented = (end_date - start_date).days
         total_cost = days_rented * car.price_per_day
@@ -162,3 +188,45 @@ def create_rental():
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+
+# Availability search: cars that are free for the whole of [start, end)
+@car_rental_bp.route('/car/available', methods=['GET'])
+def get_available_cars():
+    try:
+        start_date = request.args.get('start')
+        end_date = request.args.get('end')
+
+        # Basic input validation
+        if not all([start_date, end_date]):
+            return jsonify({"error": "Start and end dates are required"}), 400
+
+        # Convert dates to datetime objects
+        try:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d')
+            end_date = datetime.strptime(end_date, '%Y-%m-%d')
+            if start_date >= end_date:
+                return jsonify({"error": "End date must be after start date"}), 400
+        except ValueError:
+            return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+
+        days = (end_date - start_date).days
+        cars = db.session.execute(available_cars_query(start_date, end_date)).scalars()
+
+        # Convert cars to list of dictionaries for response
+        cars_data = [
+            {
+                'car_id': car.id,
+                'make': car.make,
+                'model': car.model,
+                'year': car.year,
+                'image_url': car.image_url,
+                'price_per_day': car.price_per_day,
+                'total_cost': days * car.price_per_day
+            } for car in cars
+        ]
+
+        return jsonify(cars_data), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,67 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from datetime import datetime
+from aldo_safaris.repositories.exports import EXPORT_KINDS, EXPORT_INCLUDES, stream_export
+from aldo_safaris.utils.auth import admin_required
+from aldo_safaris.utils.exports import EXPORT_FORMATS, export_chunks, gzip_chunks
+
+export_bp = Blueprint('export', __name__, url_prefix='/api/v1/export')
+
+
+def parse_export_args(args):
+    # Returns ((format, start, end, include), error) from the query string
+    fmt = args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return None, 'format must be one of %s' % ', '.join(EXPORT_FORMATS)
+
+    try:
+        start = datetime.strptime(args['start'], '%Y-%m-%d').date() if args.get('start') else None
+        end = datetime.strptime(args['end'], '%Y-%m-%d').date() if args.get('end') else None
+    except ValueError:
+        return None, 'Invalid date format. Use YYYY-MM-DD'
+    if start and end and start > end:
+        return None, 'start must not be after end'
+
+    include = [name.strip() for name in args.get('include', '').split(',') if name.strip()]
+    unknown = [name for name in include if name not in EXPORT_INCLUDES]
+    if unknown:
+        return None, 'Cannot include %s; use %s' % (', '.join(unknown), ', '.join(EXPORT_INCLUDES))
+    return (fmt, start, end, list(dict.fromkeys(include))), None
+
+
+# Export every booking or payment for finance
+# Query parameters:
+#   format     - csv (default) or ndjson
+#   start, end - YYYY-MM-DD, inclusive, on date_of_booking / payment_date
+#   include    - comma separated: package, user (joined columns)
+# The file is streamed from a server-side cursor as it is read, gzip-compressed when the
+# client sends Accept-Encoding: gzip
+@export_bp.route('/<kind>', methods=['GET'])
+@admin_required
+def export(kind):
+    try:
+        if kind not in EXPORT_KINDS:
+            return jsonify({'error': 'Unknown export %r; use %s' % (kind, ', '.join(EXPORT_KINDS))}), 404
+
+        params, error = parse_export_args(request.args)
+        if error:
+            return jsonify({'error': error}), 400
+        fmt, start, end, include = params
+
+        # The query runs here, so database errors are still reported as JSON
+        columns, rows = stream_export(kind, start, end, include)
+        body = export_chunks(fmt, columns, rows)
+
+        headers = {
+            'Content-Disposition': 'attachment; filename="%s-%s.%s"' % (
+                kind, datetime.now().strftime('%Y%m%d-%H%M%S'), fmt),
+            'Cache-Control': 'no-store',
+            'Vary': 'Accept-Encoding'
+        }
+        if request.accept_encodings['gzip']:
+            body = gzip_chunks(body)
+            headers['Content-Encoding'] = 'gzip'
+
+        return Response(stream_with_context(body), status=200, mimetype=EXPORT_FORMATS[fmt], headers=headers)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
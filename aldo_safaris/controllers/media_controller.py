@@ -0,0 +1,30 @@
+import re
+from flask import Blueprint, current_app, jsonify, send_file
+
+media_bp = Blueprint('media', __name__)
+
+# Only content-addressed keys are served: "<sha256>[_<variant>].<ext>"
+MEDIA_KEY = re.compile(r'^([0-9a-f]{64}(?:_[a-z0-9]+)?)\.(jpg|jpeg|png|gif|webp)$')
+
+# Content never changes under a given key, so clients may cache it for a year
+IMMUTABLE_MAX_AGE = 31536000
+
+
+@media_bp.route('/<filename>', methods=['GET'])
+def get_media(filename):
+    match = MEDIA_KEY.match(filename)
+    if not match:
+        return jsonify({'error': 'File not found'}), 404
+
+    storage = current_app.extensions['storage']
+    path = storage.local_path(filename)
+    if path is None or not storage.exists(filename):
+        # Remote backends serve their objects themselves (S3_PUBLIC_URL)
+        return jsonify({'error': 'File not found'}), 404
+
+    # conditional=True answers If-None-Match with 304 and Range with 206; the file is passed
+    # to the server's wsgi.file_wrapper, which uses sendfile() where available
+    response = send_file(path, conditional=True, etag=match.group(1), max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -1,12 +1,30 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from datetime import datetime
-from aldo_safaris.extensions import db
+from aldo_safaris.extensions import db, jobs, notifier
 from aldo_safaris.models.notifications import Notification
+from aldo_safaris.models.broadcasts import NotificationBroadcast
 from aldo_safaris.models.user_accounts import User  # Assuming there is a User model with user_id
+from aldo_safaris.repositories.fanout import parse_segment, run_broadcast
+from aldo_safaris.repositories.ownership import is_owner
+from aldo_safaris.repositories.sync import DELETE, changes_since, record_change
+from aldo_safaris.repositories.unread import adjust_unread, get_unread_count, is_unread, mark_all_read, status_change_delta
+from aldo_safaris.utils.auth import admin_required
+from aldo_safaris.utils.pagination import parse_limit
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 notification_bp = Blueprint('notification', __name__, url_prefix='/api/v1/notification')
 
+
+def notification_to_dict(notification):
+    return {
+        'notification_id': notification.notification_id,
+        'recipient_id': notification.recipient_id,
+        'message': notification.message,
+        'created_at': notification.created_at,
+        'status': notification.status
+    }
+
+
 @notification_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_notification():
@@ -35,10 +53,17 @@ def create_notification():
             status=status
         )
 
-        # Add notification to the database and commit
+        # Add notification to the database and bump the recipient's unread counter in the same transaction
         db.session.add(new_notification)
+        if is_unread(status):
+            adjust_unread(recipient_id, 1)
+        db.session.flush()
+        record_change(new_notification)
         db.session.commit()
 
+        # Push to the recipient's open streams now that the row is visible
+        notifier.publish([recipient_id], 'notification', notification_to_dict(new_notification))
+
         return jsonify({'message': 'Notification created successfully', 'notification_id': new_notification.notification_id}), 201
 
     except Exception as e:
@@ -58,19 +83,10 @@ def get_notification(notification_id):
         
         # Ensure the current user is the recipient of the notification
         current_user_id = get_jwt_identity()
-        if notification.recipient_id != current_user_id:
+        if not is_owner(notification.recipient_id, current_user_id):
             return jsonify({'error': 'You are not authorized to view this notification'}), 403
 
-        # Convert notification object to dictionary for response
-        notification_data = {
-            'notification_id': notification.notification_id,
-            'recipient_id': notification.recipient_id,
-            'message': notification.message,
-            'created_at': notification.created_at,
-            'status': notification.status
-        }
-
-        return jsonify(notification_data), 200
+        return jsonify(notification_to_dict(notification)), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -80,15 +96,17 @@ def get_notification(notification_id):
 @jwt_required()
 def update_notification(notification_id):
     try:
-        # Get notification by ID
-        notification = Notification.query.get(notification_id)
+        # Get notification by ID, locked so concurrent updates see each other's status change
+        # and the unread counter is adjusted once
+        notification = db.session.get(Notification, notification_id, with_for_update=True)
 
         if not notification:
             return jsonify({'error': 'Notification not found'}), 404
 
         # Ensure the current user is the recipient of the notification
         current_user_id = get_jwt_identity()
-        if notification.recipient_id != current_user_id:
+        if not is_owner(notification.recipient_id, current_user_id):
+            db.session.rollback()
             return jsonify({'error': 'You are not authorized to update this notification'}), 403
 
         # Extract notification data from request JSON
@@ -98,7 +116,9 @@ def update_notification(notification_id):
         if 'message' in data:
             notification.message = data['message']
         if 'status' in data:
+            adjust_unread(notification.recipient_id, status_change_delta(notification.status, data['status']))
             notification.status = data['status']
+        record_change(notification)
 
         # Commit changes to the database
         db.session.commit()
@@ -114,19 +134,23 @@ def update_notification(notification_id):
 @jwt_required()
 def delete_notification(notification_id):
     try:
-        # Get notification by ID
-        notification = Notification.query.get(notification_id)
+        # Get notification by ID, locked for the same reason as in update_notification
+        notification = db.session.get(Notification, notification_id, with_for_update=True)
 
         if not notification:
             return jsonify({'error': 'Notification not found'}), 404
 
         # Ensure the current user is the recipient of the notification
         current_user_id = get_jwt_identity()
-        if notification.recipient_id != current_user_id:
+        if not is_owner(notification.recipient_id, current_user_id):
+            db.session.rollback()
             return jsonify({'error': 'You are not authorized to delete this notification'}), 403
 
         # Delete notification from the database
         db.session.delete(notification)
+        if is_unread(notification.status):
+            adjust_unread(notification.recipient_id, -1)
+        record_change(notification, DELETE)
         db.session.commit()
 
         return jsonify({'message': 'Notification deleted successfully'}), 200
@@ -148,17 +172,181 @@ def get_user_notifications():
         notifications = Notification.query.filter_by(recipient_id=current_user_id).all()
 
         # Convert notifications to list of dictionaries for response
-        notifications_data = [
-            {
-                'notification_id': notification.notification_id,
-                'recipient_id': notification.recipient_id,
-                'message': notification.message,
-                'created_at': notification.created_at,
-                'status': notification.status
-            } for notification in notifications
-        ]
+        notifications_data = [notification_to_dict(notification) for notification in notifications]
 
         return jsonify(notifications_data), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+# Delta sync: notifications created or changed after the `since` cursor plus the ids of
+# deleted ones. Start from since=0 and pass back the returned cursor.
+@notification_bp.route('/sync', methods=['GET'])
+@jwt_required()
+def sync_notifications():
+    try:
+        current_user_id = get_jwt_identity()
+
+        try:
+            since = int(request.args.get('since', 0))
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            return jsonify({'error': 'since must be a non-negative integer'}), 400
+        try:
+            limit = parse_limit(request.args.get('limit'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        notifications, deleted, cursor, has_more = changes_since(
+            current_user_id, since, limit, current_app.config.get('NOTIFICATION_SYNC_SETTLE_SECONDS', 2))
+
+        return jsonify({
+            'notifications': [notification_to_dict(notification) for notification in notifications],
+            'deleted': deleted,
+            'cursor': cursor,
+            'has_more': has_more
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Badge count for the current user; cheap to poll and answers 304 while it is unchanged
+@notification_bp.route('/unread_count', methods=['GET'])
+@jwt_required()
+def get_notification_unread_count():
+    try:
+        current_user_id = get_jwt_identity()
+        unread = get_unread_count(current_user_id)
+
+        response = jsonify({'unread': unread})
+        response.set_etag('unread-%s-%d' % (current_user_id, unread))
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Mark every unread notification of the current user as read with a single UPDATE
+@notification_bp.route('/mark_all_read', methods=['POST'])
+@jwt_required()
+def mark_all_notifications_read():
+    try:
+        current_user_id = get_jwt_identity()
+        updated = mark_all_read(current_user_id)
+        db.session.commit()
+
+        return jsonify({'message': 'Notifications marked as read', 'updated': updated}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+# Server-Sent Events stream of the current user's new notifications. Clients keep one
+# connection open instead of polling; events: notification, broadcast, resync.
+@notification_bp.route('/stream', methods=['GET'])
+@jwt_required()
+def stream_notifications():
+    subscription = notifier.subscribe(get_jwt_identity())
+    if subscription is None:
+        response = jsonify({'error': 'Too many open notification streams, try again later'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    heartbeat = current_app.config.get('PUSH_HEARTBEAT_SECONDS', 15)
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                item = subscription.get(timeout=heartbeat)
+                if subscription.overflowed:
+                    # Events were dropped; the client refetches and reconnects
+                    yield 'event: resync\ndata: {}\n\n'
+                    return
+                if item is None:
+                    yield ': keepalive\n\n'
+                    continue
+                event, data = item
+                yield 'event: %s\ndata: %s\n\n' % (event, data)
+        finally:
+            notifier.unsubscribe(subscription)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass events through unbuffered
+    return response
+
+
+def broadcast_to_dict(broadcast):
+    return {
+        'broadcast_id': broadcast.broadcast_id,
+        'message': broadcast.message,
+        'segment': broadcast.segment,
+        'status': broadcast.status,
+        'total_recipients': broadcast.total_recipients,
+        'sent': broadcast.sent,
+        'error': broadcast.error,
+        'created_at': broadcast.created_at,
+        'finished_at': broadcast.finished_at
+    }
+
+
+# Send one message to every user in a segment, e.g. all travellers booked on a package:
+# {"message": "...", "segment": {"package_id": 3, "start_date": "2024-07-01", "end_date": "2024-07-31"}}
+@notification_bp.route('/broadcast', methods=['POST'])
+@admin_required
+def create_broadcast():
+    try:
+        # Extract broadcast data from request JSON
+        data = request.get_json(silent=True) or {}
+        message = data.get('message')
+
+        # Basic input validation
+        if not message:
+            return jsonify({"error": "Message is required"}), 400
+
+        segment, error = parse_segment(data.get('segment'))
+        if error:
+            return jsonify({"error": error}), 400
+
+        # Record the job, then expand recipients in the background
+        broadcast = NotificationBroadcast(
+            created_by=get_jwt_identity(),
+            message=message,
+            segment=segment,
+            status='queued',
+            sent=0,
+            created_at=datetime.now()
+        )
+        db.session.add(broadcast)
+        db.session.commit()
+
+        jobs.submit(run_broadcast, broadcast.broadcast_id,
+                    current_app.config.get('BROADCAST_CHUNK_SIZE', 1000))
+
+        return jsonify({'message': 'Broadcast queued', 'broadcast_id': broadcast.broadcast_id}), 202
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+# Progress of a broadcast
+@notification_bp.route('/broadcast/<int:broadcast_id>', methods=['GET'])
+@admin_required
+def get_broadcast(broadcast_id):
+    try:
+        broadcast = db.session.get(NotificationBroadcast, broadcast_id)
+
+        if not broadcast:
+            return jsonify({'error': 'Broadcast not found'}), 404
+
+        return jsonify(broadcast_to_dict(broadcast)), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -3,12 +3,22 @@ from datetime import datetime
 from aldo_safaris.extensions import db
 from aldo_safaris.models.payments import Payment
 from aldo_safaris.models.booking import Booking
+from aldo_safaris.repositories.analytics import (
+    add_payment_to_rollup, payment_rollup_entry, remove_payment_from_rollup, update_payment_rollup
+)
+from aldo_safaris.repositories.ownership import (
+    get_owned_booking, get_owned_payment, list_owned_payments, NOT_FOUND
+)
+from aldo_safaris.repositories.payment_totals import apply_payment_delta, paid_amount
+from aldo_safaris.utils.idempotency import idempotent
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 payment_bp = Blueprint('payment', __name__, url_prefix='/api/v1/payment')
 
+# Send an Idempotency-Key header to make retries safe: a repeated key replays the first response
 @payment_bp.route('/', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_payment():
     try:
         # Extract payment data from request JSON
@@ -25,12 +35,12 @@ def create_payment():
 
         # Verify if the booking exists and belongs to the current user
         current_user_id = get_jwt_identity()
-        booking = Booking.query.get(booking_id)
-        
-        if not booking:
+        booking, error = get_owned_booking(booking_id, current_user_id)
+
+        if error == NOT_FOUND:
             return jsonify({"error": "Booking not found"}), 404
-        
-        if booking.user_id != current_user_id:
+
+        if error:
             return jsonify({"error": "You are not authorized to add a payment to this booking"}), 403
 
         # Create a new payment
@@ -42,8 +52,11 @@ def create_payment():
             status=status
         )
 
-        # Add payment to the database and commit
+        # Add payment to the database and update the booking's totals in the same
+        # transaction; the analytics rollups are upserted as it commits
         db.session.add(new_payment)
+        apply_payment_delta(booking.booking_id, paid_amount(status, amount))
+        add_payment_to_rollup(new_payment)
         db.session.commit()
 
         return jsonify({'message': 'Payment created successfully', 'payment_id': new_payment.payment_id}), 201
@@ -57,15 +70,14 @@ def create_payment():
 @jwt_required()
 def get_payment(payment_id):
     try:
-        # Get payment by ID
-        payment = Payment.query.get(payment_id)
-        
-        if not payment:
-            return jsonify({'error': 'Payment not found'}), 404
-        
-        # Ensure the current user is the owner of the booking associated with the payment
+        # Get payment by ID, checking that the current user owns its booking in the same query
         current_user_id = get_jwt_identity()
-        if payment.booking.user_id != current_user_id:
+        payment, error = get_owned_payment(payment_id, current_user_id)
+
+        if error == NOT_FOUND:
+            return jsonify({'error': 'Payment not found'}), 404
+
+        if error:
             return jsonify({'error': 'You are not authorized to view this payment'}), 403
 
         # Convert payment object to dictionary for response
@@ -88,20 +100,26 @@ def get_payment(payment_id):
 @jwt_required()
 def update_payment(payment_id):
     try:
-        # Get payment by ID
-        payment = Payment.query.get(payment_id)
+        # Get payment by ID, checking that the current user owns its booking in the same query.
+        # The rows stay locked until commit, so concurrent edits of this payment apply their
+        # deltas to the booking's totals one after the other.
+        current_user_id = get_jwt_identity()
+        payment, error = get_owned_payment(payment_id, current_user_id, for_update=True)
 
-        if not payment:
+        if error == NOT_FOUND:
+            db.session.rollback()
             return jsonify({'error': 'Payment not found'}), 404
 
-        # Ensure the current user is the owner of the booking associated with the payment
-        current_user_id = get_jwt_identity()
-        if payment.booking.user_id != current_user_id:
+        if error:
+            db.session.rollback()
             return jsonify({'error': 'You are not authorized to update this payment'}), 403
 
         # Extract payment data from request JSON
         data = request.json
 
+        paid_before = paid_amount(payment.status, payment.amount)
+        rollup_before = payment_rollup_entry(payment)
+
         # Update payment fields if provided in request
         if 'amount' in data:
             payment.amount = data['amount']
@@ -110,7 +128,9 @@ def update_payment(payment_id):
         if 'status' in data:
             payment.status = data['status']
 
-        # Commit changes to the database
+        # Keep the booking's totals and the analytics rollups in step, then commit
+        apply_payment_delta(payment.booking_id, paid_amount(payment.status, payment.amount) - paid_before)
+        update_payment_rollup(rollup_before, payment)
         db.session.commit()
 
         return jsonify({'message': 'Payment updated successfully'}), 200
@@ -124,18 +144,23 @@ def update_payment(payment_id):
 @jwt_required()
 def delete_payment(payment_id):
     try:
-        # Get payment by ID
-        payment = Payment.query.get(payment_id)
+        # Get payment by ID, checking that the current user owns its booking in the same query.
+        # The rows stay locked until commit, so concurrent edits of this payment apply their
+        # deltas to the booking's totals one after the other.
+        current_user_id = get_jwt_identity()
+        payment, error = get_owned_payment(payment_id, current_user_id, for_update=True)
 
-        if not payment:
+        if error == NOT_FOUND:
+            db.session.rollback()
             return jsonify({'error': 'Payment not found'}), 404
 
-        # Ensure the current user is the owner of the booking associated with the payment
-        current_user_id = get_jwt_identity()
-        if payment.booking.user_id != current_user_id:
+        if error:
+            db.session.rollback()
             return jsonify({'error': 'You are not authorized to delete this payment'}), 403
 
-        # Delete payment from the database
+        # Delete payment from the database and take it off the booking's totals and the rollups
+        apply_payment_delta(payment.booking_id, -paid_amount(payment.status, payment.amount))
+        remove_payment_from_rollup(payment)
         db.session.delete(payment)
         db.session.commit()
 
@@ -150,17 +175,15 @@ def delete_payment(payment_id):
 def get_payments_for_booking(booking_id):
     try:
         # Verify if the booking exists and belongs to the current user
+        # and retrieve all of its payments in the same query
         current_user_id = get_jwt_identity()
-        booking = Booking.query.get(booking_id)
-        
-        if not booking:
+        payments, error = list_owned_payments(booking_id, current_user_id)
+
+        if error == NOT_FOUND:
             return jsonify({"error": "Booking not found"}), 404
-        
-        if booking.user_id != current_user_id:
-            return jsonify({"error": "You are not authorized to view payments for this booking"}), 403
 
-        # Retrieve all payments for the specified booking
-        payments = Payment.query.filter_by(booking_id=booking_id).all()
+        if error:
+            return jsonify({"error": "You are not authorized to view payments for this booking"}), 403
 
         # Convert payments to list of dictionaries for response
         payments_data = [
@@ -1,10 +1,32 @@
-from flask import Blueprint, request, jsonify
-from aldo_safaris.extensions import db
+from flask import Blueprint, request, jsonify, Response, current_app
+from aldo_safaris.extensions import db, cache
 from aldo_safaris.models.travel_packages import TravelPackage
+from aldo_safaris.repositories.package_search import index_package, unindex_package, search_packages
+from aldo_safaris.utils.lists import parse_string_list
+from aldo_safaris.utils.pagination import parse_limit
 from flask_jwt_extended import jwt_required
 
 travel_package_bp = Blueprint('travel_package', __name__, url_prefix='/api/v1/travel_package')
 
+# Cache key for the serialized list of available travel packages
+CATALOGUE_CACHE_KEY = 'travel_packages:available'
+
+
+def travel_package_to_dict(travel_package):
+    return {
+        'package_id': travel_package.package_id,
+        'package_name': travel_package.package_name,
+        'description': travel_package.description,
+        'destinations': travel_package.destinations,
+        'activities': travel_package.activities,
+        'inclusions': travel_package.inclusions,
+        'price': travel_package.price,
+        'duration': travel_package.duration,
+        'availability': travel_package.availability,
+        'image_url': travel_package.image_url
+    }
+
+
 @travel_package_bp.route('/', methods=['POST'])
 @jwt_required()  # Ensure the user is authenticated
 def create_travel_package():
@@ -14,8 +36,12 @@ def create_travel_package():
         
         package_name = data.get('package_name')
         description = data.get('description')
-        destinations = data.get('destinations', [])
-        activities = data.get('activities', [])
+        destinations, error = parse_string_list(data.get('destinations'), 'destinations')
+        if error:
+            return jsonify({"error": error}), 400
+        activities, error = parse_string_list(data.get('activities'), 'activities')
+        if error:
+            return jsonify({"error": error}), 400
         inclusions = data.get('inclusions')
         price = data.get('price')
         duration = data.get('duration')
@@ -39,10 +65,15 @@ def create_travel_package():
             image_url=image_url
         )
 
-        # Add the new travel package to the database and commit
+        # Add the new travel package to the database and index it in the same transaction
         db.session.add(new_travel_package)
+        db.session.flush()
+        index_package(new_travel_package)
         db.session.commit()
 
+        # The public catalogue must not serve the old version of this package
+        cache.delete(CATALOGUE_CACHE_KEY)
+
         return jsonify({'message': 'Travel package created successfully', 'package_id': new_travel_package.package_id}), 201
 
     except Exception as e:
@@ -61,18 +92,7 @@ def get_travel_package(package_id):
             return jsonify({'error': 'Travel package not found'}), 404
 
         # Convert travel package object to dictionary for response
-        travel_package_data = {
-            'package_id': travel_package.package_id,
-            'package_name': travel_package.package_name,
-            'description': travel_package.description,
-            'destinations': travel_package.destinations,
-            'activities': travel_package.activities,
-            'inclusions': travel_package.inclusions,
-            'price': travel_package.price,
-            'duration': travel_package.duration,
-            'availability': travel_package.availability,
-            'image_url': travel_package.image_url
-        }
+        travel_package_data = travel_package_to_dict(travel_package)
 
         return jsonify(travel_package_data), 200
 
@@ -98,10 +118,14 @@ def update_travel_package(package_id):
             travel_package.package_name = data['package_name']
         if 'description' in data:
             travel_package.description = data['description']
-        if 'destinations' in data:
-            travel_package.destinations = data['destinations']
-        if 'activities' in data:
-            travel_package.activities = data['activities']
+        for field in ('destinations', 'activities'):
+            if field in data:
+                values, error = parse_string_list(data[field], field)
+                if error:
+                    # Drop the field changes made above
+                    db.session.rollback()
+                    return jsonify({"error": error}), 400
+                setattr(travel_package, field, values)
         if 'inclusions' in data:
             travel_package.inclusions = data['inclusions']
         if 'price' in data:
@@ -113,9 +137,13 @@ def update_travel_package(package_id):
         if 'image_url' in data:
             travel_package.image_url = data['image_url']
 
-        # Commit changes to the database
+        # Re-index and commit changes to the database
+        index_package(travel_package)
         db.session.commit()
 
+        # The public catalogue must not serve the old version of this package
+        cache.delete(CATALOGUE_CACHE_KEY)
+
         return jsonify({'message': 'Travel package updated successfully'}), 200
 
     except Exception as e:
@@ -133,10 +161,14 @@ def delete_travel_package(package_id):
         if not travel_package:
             return jsonify({'error': 'Travel package not found'}), 404
 
-        # Delete travel package from the database
+        # Delete travel package and its search index rows from the database
+        unindex_package(package_id)
         db.session.delete(travel_package)
         db.session.commit()
 
+        # The public catalogue must not serve the old version of this package
+        cache.delete(CATALOGUE_CACHE_KEY)
+
         return jsonify({'message': 'Travel package deleted successfully'}), 200
 
     except Exception as e:
@@ -147,26 +179,70 @@ def delete_travel_package(package_id):
 @travel_package_bp.route('/', methods=['GET'])
 def get_all_travel_packages():
     try:
-        # Retrieve all travel packages that are available
-        travel_packages = TravelPackage.query.filter_by(availability=True).all()
-
-        # Convert travel packages to list of dictionaries for response
-        travel_packages_data = [
-            {
-                'package_id': travel_package.package_id,
-                'package_name': travel_package.package_name,
-                'description': travel_package.description,
-                'destinations': travel_package.destinations,
-                'activities': travel_package.activities,
-                'inclusions': travel_package.inclusions,
-                'price': travel_package.price,
-                'duration': travel_package.duration,
-                'availability': travel_package.availability,
-                'image_url': travel_package.image_url
-            } for travel_package in travel_packages
-        ]
-
-        return jsonify(travel_packages_data), 200
+        # Serve the pre-serialized catalogue when it is cached
+        cached = cache.get_json(CATALOGUE_CACHE_KEY)
+
+        if cached is None:
+            # Retrieve all travel packages that are available
+            travel_packages = TravelPackage.query.filter_by(availability=True).all()
+
+            # Convert travel packages to list of dictionaries for response
+            travel_packages_data = [
+                travel_package_to_dict(travel_package) for travel_package in travel_packages
+            ]
+
+            body = current_app.json.dumps(travel_packages_data).encode('utf-8')
+            cached = cache.set_json(CATALOGUE_CACHE_KEY, body)
+
+        body, etag = cached
+        response = Response(body, status=200, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'public, no-cache'
+
+        # Answers 304 Not Modified when the client's If-None-Match matches
+        return response.make_conditional(request)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def parse_search_filters(args):
+    # Raises ValueError with a client-facing message on malformed numbers
+    filters = {
+        'destinations': [value for value in args.getlist('destination') if value],
+        'activities': [value for value in args.getlist('activity') if value]
+    }
+    for key, cast in (('min_price', float), ('max_price', float), ('min_duration', int), ('max_duration', int)):
+        value = args.get(key)
+        if value not in (None, ''):
+            try:
+                filters[key] = cast(value)
+            except ValueError:
+                raise ValueError('%s must be a number' % key)
+    return filters
+
+
+# Full-text and faceted search over available packages, e.g.
+# /search?q=gorilla trek&destination=Bwindi&activity=Hiking&max_price=2000&min_duration=3
+@travel_package_bp.route('/search', methods=['GET'])
+def search_travel_packages():
+    try:
+        try:
+            filters = parse_search_filters(request.args)
+            limit = parse_limit(request.args.get('limit'), default=20, maximum=100)
+            offset = int(request.args.get('offset', 0))
+            if offset < 0:
+                raise ValueError('offset must be a non-negative integer')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        packages, total, facets = search_packages(request.args.get('q'), filters, limit, offset)
+
+        return jsonify({
+            'total': total,
+            'packages': [travel_package_to_dict(package) for package in packages],
+            'facets': facets
+        }), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,50 +1,89 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
-from aldo_safaris.extensions import db, bcrypt,Bcrypt,JWTManager
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from aldo_safaris.extensions import db, hasher, JWTManager
 from aldo_safaris.models.user_accounts import User
+from aldo_safaris.utils.hashing import PasswordHasherBusy
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 
 customer = Blueprint('auth', __name__, url_prefix='/api/v1/customer')
-bcrypt=Bcrypt()
 jwt=JWTManager()
 
+
+def hasher_busy_response(e):
+    # The hashing pool is saturated: ask the client to back off instead of queueing
+    response = jsonify({'error': str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def validate_registration(data):
+    # Cheap schema checks that need neither the database nor bcrypt
+    if not isinstance(data, dict):
+        return None, "All fields are required"
+
+    user_name = data.get('user_name')
+    email = data.get('email')
+    contact = data.get('contact')
+    password = data.get('password')
+
+    if not user_name or not email or not contact or not password:
+        return None, "All fields are required"
+    if not isinstance(user_name, str) or not isinstance(email, str) or not isinstance(password, str):
+        return None, "Name, email and password must be text"
+    if len(password) < 6:
+        return None, "Your password must have at least 6 characters"
+
+    return {'user_name': user_name, 'email': email, 'contact': contact, 'password': password}, None
+
+
+def find_registration_conflict(email, contact):
+    # One round trip covering both unique columns
+    existing = db.session.query(User.email, User.contact).filter(
+        or_(User.email == email, User.contact == contact)
+    ).first()
+    if existing is None:
+        return None
+    if existing.email == email:
+        return "This email is already registered"
+    return "This contact is already registered"
+
+
 @customer.route('/register', methods=['POST'])
 def register():
     try:
-        # Extract user data from request JSON
-        data = request.json
-        user_name = data.get('user_name')
-        email = data.get('email')
-        contact = data.get('contact')
-        password = data.get('password')
-       
-        
-        # Hash the password
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
-        
-        # Basic input validation
-        if not user_name or not email or not contact or not password:
-            return jsonify({"error": "All fields are required"})
+        # Extract user data from request JSON and validate it
+        fields, error = validate_registration(request.get_json(silent=True))
+        if error:
+            return jsonify({"error": error})
 
-        if len(password) < 6:
-            return jsonify({"error": "Your password must have at least 6 characters"})
-        
         # Check if user already exists
-        if User.query.filter_by(email=email).first():
-            return jsonify({"error": "This email is already registered"})
-        if User.query.filter_by(contact=contact).first():
-            return jsonify({"error": "This contact is already registered"})
-        
+        error = find_registration_conflict(fields['email'], fields['contact'])
+        if error:
+            return jsonify({"error": error})
+
+        # Hash the password only once we know the user will be created
+        hashed_password = hasher.generate_password_hash(fields['password'])
+
         # Create a new user
-        new_user = User(user_name=user_name, email=email, contact=contact,
-                        password=hashed_password)
-        
+        new_user = User(user_name=fields['user_name'], email=fields['email'],
+                        contact=fields['contact'], password=hashed_password)
+
         # Add user to database and commit
         db.session.add(new_user)
-        db.session.commit()
-        
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent signup claimed the email or contact after our check
+            db.session.rollback()
+            return jsonify({"error": find_registration_conflict(fields['email'], fields['contact'])
+                            or "This user is already registered"})
+
         return jsonify({'message': 'User registered successfully'})
-        
+
+    except PasswordHasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -62,10 +101,19 @@ def login():
         user = User.query.filter_by(email=email).first()
 
         # Check if user exists and password is correct
-        if user and bcrypt.check_password_hash(user.password, password):
+        if user and hasher.check_password_hash(user.password, password):
+            # Upgrade hashes made with an outdated work factor while we have the plain password
+            if hasher.needs_rehash(user.password):
+                try:
+                    user.password = hasher.generate_password_hash(password)
+                    db.session.commit()
+                except PasswordHasherBusy:
+                    # Not worth failing the login over; the next one will retry the upgrade
+                    db.session.rollback()
+
             # Create access token and refresh token
-            access_token = create_access_token(identity=str(user.id))
-            refresh_token = create_refresh_token(identity=str(user.id))
+            access_token = create_access_token(identity=str(user.user_id))
+            refresh_token = create_refresh_token(identity=str(user.user_id))
             # Return tokens in response
             return jsonify({'message': 'Login successful',
                             'access_token': access_token,
@@ -73,6 +121,8 @@ def login():
         else:
             return jsonify({'error': 'Invalid email or password'}), 401
 
+    except PasswordHasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -8,7 +8,20 @@ from flask_jwt_extended import JWTManager
 
 # from flask_jwt_extended import JWTManager
 
+from aldo_safaris.utils.cache import ResponseCache
+from aldo_safaris.utils.hashing import PasswordHasher
+from aldo_safaris.utils.instrumentation import SQLInstrumentation
+from aldo_safaris.utils.images import ImageProcessor
+from aldo_safaris.utils.jobs import BackgroundJobs
+from aldo_safaris.utils.pubsub import NotificationHub
+
 db = SQLAlchemy()
 migrate = Migrate()
 bcrypt = Bcrypt()
 jwt = JWTManager()
+cache = ResponseCache()
+hasher = PasswordHasher()
+instrumentation = SQLInstrumentation()
+images = ImageProcessor()
+jobs = BackgroundJobs()
+notifier = NotificationHub()
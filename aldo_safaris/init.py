@@ -1,33 +1,56 @@
+import os
+import config
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_bcrypt import Bcrypt
-from aldo_safaris.extensions import db, migrate, jwt, bcrypt
+from aldo_safaris.extensions import db, migrate, jwt, bcrypt, cache, hasher, instrumentation, images, jobs, notifier
 from aldo_safaris.controllers.booking_controller import booking_bp 
 from aldo_safaris.controllers.payments_controller import payment_bp
 from aldo_safaris.controllers.car_hiring_controller import car_rental_bp 
 from aldo_safaris.controllers.notifications_controller import notification_bp
 from aldo_safaris.controllers.t_package_controller import travel_package_bp
 from aldo_safaris.controllers.user_accounts_controller import customer
+from aldo_safaris.controllers.media_controller import media_bp
+from aldo_safaris.controllers.analytics_controller import analytics_bp
+from aldo_safaris.controllers.export_controller import export_bp
 from aldo_safaris.models.user_accounts import User
 from aldo_safaris.models.booking import Booking
 from aldo_safaris.models.car_hiring import Car, Rental
 from aldo_safaris.models.notifications import Notification
 from aldo_safaris.models.payments import Payment
 from aldo_safaris.models.travel_packages import TravelPackage
+from aldo_safaris.models.broadcasts import NotificationBroadcast
+from aldo_safaris.models.notification_counters import NotificationCounter
+from aldo_safaris.models.notification_changes import NotificationChange
+from aldo_safaris.models.package_search import PackageSearchTerm, PackageFacet
+from aldo_safaris.models.booking_activities import BookingActivity
+from aldo_safaris.models.idempotency_keys import IdempotencyKey
+from aldo_safaris.models.analytics import DailyBookingRollup, DailyPaymentRollup
+from aldo_safaris.utils.pool import pool_metrics, warm_up_pool_per_process, dispose_pool_after_fork
+from aldo_safaris.utils.schema import check_schema_version
+from aldo_safaris.commands import register_commands
 
-def create_app():
+def create_app(config_object=None):
     app = Flask(__name__)
 
-    # Load configuration from config.py
-    app.config.from_object('config.Config')
+    # Load configuration from config.py, picking the class for APP_ENV when one is set
+    if config_object is None:
+        config_object = config.configs.get(os.environ.get('APP_ENV'), config.Config)
+    app.config.from_object(config_object)
 
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, directory=os.path.join(os.path.dirname(app.root_path), 'migrations'))
     jwt.init_app(app)
     bcrypt.init_app(app)
+    cache.init_app(app)
+    hasher.init_app(app)
+    instrumentation.init_app(app)
+    images.init_app(app)
+    jobs.init_app(app)
+    notifier.init_app(app)
 
     # Register blueprints
     app.register_blueprint(booking_bp, url_prefix='/api/v1/booking')
@@ -36,9 +59,20 @@ def create_app():
     app.register_blueprint(payment_bp, url_prefix='/api/v1/payment')
     app.register_blueprint(travel_package_bp, url_prefix='/api/v1/travel_package')
     app.register_blueprint(customer, url_prefix='/api/v1/customer')
+    app.register_blueprint(analytics_bp, url_prefix='/api/v1/analytics')
+    app.register_blueprint(export_bp, url_prefix='/api/v1/export')
+    app.register_blueprint(media_bp, url_prefix=app.config['UPLOAD_URL'])
+
+    # Schema creation is an explicit step ("flask create-db" or "flask db upgrade")
+    register_commands(app)
 
-    # Ensure models are registered with SQLAlchemy
     with app.app_context():
-        db.create_all()  # Create all database tables (if not created)
+        # One cheap query instead of creating tables on every worker boot
+        check_schema_version(app, db, migrate)
+
+        # Pool saturation metrics, and connections opened before the app takes traffic
+        instrumentation.add_collector('db_pool', pool_metrics(db.engine))
+        dispose_pool_after_fork(db.engine)
+        warm_up_pool_per_process(db.engine, app.config.get('DB_POOL_WARMUP', 0))
 
     return app
@@ -0,0 +1,37 @@
+from aldo_safaris.extensions import db
+
+
+class DailyBookingRollup(db.Model):
+    # Bookings and booked revenue per day of booking, package, destination and source.
+    # Updated in the same transaction as every change to the Booking table (see
+    # repositories/analytics.py), so reports never have to scan Booking. Missing package
+    # ids are stored as 0 and missing destinations / sources as '' because they are part
+    # of the key.
+    __tablename__ = 'daily_booking_rollups'
+    __table_args__ = (
+        db.Index('ix_daily_booking_rollups_destination_day', 'destination', 'day'),
+        db.Index('ix_daily_booking_rollups_booking_source_day', 'booking_source', 'day'),
+    )
+
+    day = db.Column(db.Date, primary_key=True)
+    package_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    destination = db.Column(db.String(100), primary_key=True)
+    booking_source = db.Column(db.String(20), primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)  # sum of Booking.total_cost
+
+    def __repr__(self):
+        return '<DailyBookingRollup %r %r %r %r>' % (self.day, self.package_id, self.destination, self.booking_source)
+
+
+class DailyPaymentRollup(db.Model):
+    # Paid payments and collected revenue per day of payment and payment method
+    __tablename__ = 'daily_payment_rollups'
+
+    day = db.Column(db.Date, primary_key=True)
+    payment_method = db.Column(db.String(50), primary_key=True)
+    payments = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<DailyPaymentRollup %r %r>' % (self.day, self.payment_method)
@@ -1,10 +1,13 @@
-from flask_sqlalchemy import SQLAlchemy
 from aldo_safaris.extensions import db
 
-#db = SQLAlchemy()
 
 class Booking(db.Model):
     __tablename__ = 'Booking'
+    __table_args__ = (
+        db.Index('ix_booking_user_id_date_of_booking', 'user_id', 'date_of_booking'),
+        db.Index('ix_booking_package_id_user_id', 'package_id', 'user_id'),
+        db.Index('ix_booking_destination_user_id', 'destination', 'user_id'),
+    )
 
     booking_id = db.Column(db.Integer, primary_key=True)
     package_id = db.Column(db.Integer, db.ForeignKey('TravelPackages.package_id'))
@@ -13,15 +16,17 @@ class Booking(db.Model):
     travel_start_date = db.Column(db.Date)
     travel_end_date = db.Column(db.Date)
     total_cost = db.Column(db.Float)
-    payment_status = db.Column(db.String(20))
+    amount_paid = db.Column(db.Float, nullable=False, default=0, server_default='0')  # sum of paid payments
+    balance_due = db.Column(db.Float)  # total_cost - amount_paid
+    payment_status = db.Column(db.String(20))  # unpaid, partial or paid; derived from amount_paid
     booking_status = db.Column(db.String(20))
     destination = db.Column(db.String(100))
     accommodation = db.Column(db.String(100))
     transportation = db.Column(db.String(100))
-    activities = db.Column(db.ARRAY(db.String(100)))
+    activities = db.Column(db.JSON)  # list of names, mirrored into booking_activities
     booking_source = db.Column(db.String(20))
   
 
-    travel_package = db.relationship('TravelPackage', backref='Booking')
-    user = db.relationship('User', backref='Booking')
-    payments = db.relationship('Payment', backref='Booking')
+    travel_package = db.relationship('TravelPackage', back_populates='booking')
+    user = db.relationship('User', back_populates='bookings')
+    payments = db.relationship('Payment', back_populates='booking', passive_deletes=True)
@@ -0,0 +1,16 @@
+from aldo_safaris.extensions import db
+
+
+class BookingActivity(db.Model):
+    # One row per activity of a booking, mirroring Booking.activities so bookings can be
+    # filtered by activity through an index
+    __tablename__ = 'booking_activities'
+    __table_args__ = (
+        db.Index('ix_booking_activities_activity_booking_id', 'activity', 'booking_id'),
+    )
+
+    booking_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    activity = db.Column(db.String(100), primary_key=True)
+
+    def __repr__(self):
+        return '<BookingActivity %r %r>' % (self.booking_id, self.activity)
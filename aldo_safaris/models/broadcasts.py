@@ -0,0 +1,19 @@
+from aldo_safaris.extensions import db
+
+
+class NotificationBroadcast(db.Model):
+    __tablename__ = 'notification_broadcasts'
+
+    broadcast_id = db.Column(db.Integer, primary_key=True)
+    created_by = db.Column(db.Integer)
+    message = db.Column(db.Text, nullable=False)
+    segment = db.Column(db.JSON)  # filters used to select recipients
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed, failed
+    total_recipients = db.Column(db.Integer)
+    sent = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return '<NotificationBroadcast %r>' % self.broadcast_id
@@ -1,7 +1,6 @@
 from datetime import datetime, timedelta
-from flask_sqlalchemy import SQLAlchemy
+from aldo_safaris.extensions import db
 
-db = SQLAlchemy()
 
 # Car Model 
 class Car(db.Model):
@@ -15,7 +14,7 @@ class Car(db.Model):
     image_url = db.Column(db.String(255), nullable=True)
     price_per_day = db.Column(db.Float, nullable=False)  # New field for daily rental price
 
-    rentals = db.relationship('Rental', backref='car')
+    rentals = db.relationship('Rental', backref='car', passive_deletes=True)
 
     def __repr__(self):
         return f'<Car {self.make} {self.model} >'
@@ -23,12 +22,15 @@ class Car(db.Model):
 # Rental Model
 class Rental(db.Model):
     __tablename__ = 'rentals'
+    __table_args__ = (
+        db.Index('ix_rentals_car_id_end_date_start_date', 'car_id', 'end_date', 'start_date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     car_id = db.Column(db.Integer, db.ForeignKey('cars.id'), nullable=False)
     start_date = db.Column(db.DateTime, default=datetime.utcnow)
     end_date = db.Column(db.DateTime, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=False)
     total_cost = db.Column(db.Float, nullable=False)  # New field for total rental cost
 
     def __repr__(self):
@@ -0,0 +1,22 @@
+from aldo_safaris.extensions import db
+
+
+class IdempotencyKey(db.Model):
+    # First response to a request sent with an Idempotency-Key header, replayed for retries.
+    # Keys are scoped to the user that sent them.
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
+
+    user_id = db.Column(db.String(64), primary_key=True)
+    idempotency_key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 of method, path and body
+    status = db.Column(db.String(20), nullable=False)  # in_progress or completed
+    response_status = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return '<IdempotencyKey %r %r>' % (self.user_id, self.idempotency_key)
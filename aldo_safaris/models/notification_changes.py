@@ -0,0 +1,18 @@
+from aldo_safaris.extensions import db
+
+
+class NotificationChange(db.Model):
+    # Append-only log of notification writes; change_id is the cursor clients sync from
+    __tablename__ = 'notification_changes'
+    __table_args__ = (
+        db.Index('ix_notification_changes_recipient_id_change_id', 'recipient_id', 'change_id'),
+    )
+
+    change_id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    recipient_id = db.Column(db.Integer, nullable=False)
+    notification_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # upsert or delete
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return '<NotificationChange %r>' % self.change_id
@@ -0,0 +1,13 @@
+from aldo_safaris.extensions import db
+
+
+class NotificationCounter(db.Model):
+    # Denormalized count of a user's unread notifications, kept in step with the
+    # notifications table in the same transaction as every change to it
+    __tablename__ = 'notification_counters'
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    unread = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<NotificationCounter %r>' % self.user_id
@@ -1,10 +1,11 @@
-from flask_sqlalchemy import SQLAlchemy
 from aldo_safaris.extensions import db
 
-db = SQLAlchemy()
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_recipient_id_status_created_at', 'recipient_id', 'status', 'created_at'),
+    )
 
     notification_id = db.Column(db.Integer, primary_key=True)
     recipient_id = db.Column(db.Integer, db.ForeignKey('user.user_id'))
@@ -12,7 +13,7 @@ class Notification(db.Model):
     created_at = db.Column(db.DateTime)
     status = db.Column(db.String(20))
 
-    recipient = db.relationship('User', backref='notifications')
+    recipient = db.relationship('User', backref=db.backref('notifications', passive_deletes=True))
 
     def __repr__(self):
         return '<Notification %r>' % self.notification_id
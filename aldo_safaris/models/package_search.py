@@ -0,0 +1,35 @@
+from sqlalchemy.dialects import mysql
+from aldo_safaris.extensions import db
+
+
+class PackageSearchTerm(db.Model):
+    # Inverted index over package_name, description and inclusions. weight adds up the
+    # fields a term appears in; a hit in the name counts more than one in the description.
+    __tablename__ = 'package_search_terms'
+    __table_args__ = (
+        db.Index('ix_package_search_terms_package_id', 'package_id'),
+    )
+
+    # Terms are stored lowercased and compared byte-wise, so prefix searches are index ranges
+    term = db.Column(db.String(50).with_variant(mysql.VARCHAR(50, collation='utf8mb4_bin'), 'mysql'), primary_key=True)
+    package_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    weight = db.Column(db.Integer, nullable=False, default=1)
+
+    def __repr__(self):
+        return '<PackageSearchTerm %r %r>' % (self.term, self.package_id)
+
+
+class PackageFacet(db.Model):
+    # One row per destination / activity of a package: the association table behind
+    # TravelPackage.destinations and .activities, used for facet filters and counts
+    __tablename__ = 'package_facets'
+    __table_args__ = (
+        db.Index('ix_package_facets_package_id', 'package_id'),
+    )
+
+    facet = db.Column(db.String(20), primary_key=True)  # destination or activity
+    value = db.Column(db.String(100), primary_key=True)
+    package_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    def __repr__(self):
+        return '<PackageFacet %r=%r %r>' % (self.facet, self.value, self.package_id)
@@ -1,21 +1,24 @@
-from flask_sqlalchemy import SQLAlchemy
 from aldo_safaris.extensions import db
 
-db = SQLAlchemy()
 
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_booking_id', 'booking_id'),
+    )
     
     payment_id = db.Column(db.Integer, primary_key=True)
-    booking_id = db.Column(db.Integer, db.ForeignKey('bookings.booking_id'))
+    booking_id = db.Column(db.Integer, db.ForeignKey('Booking.booking_id'))
     payment_date = db.Column(db.DateTime)
     amount = db.Column(db.Float)
     payment_method = db.Column(db.String(50))
     status = db.Column(db.String(20))
     car_id = db.Column(db.Integer, db.ForeignKey('rentals.car_id'))
 
-    booking = db.relationship('Booking', backref='payments')
-    car_hiring = db.relationship('Rental', backref='payments')
+    booking = db.relationship('Booking', back_populates='payments')
+    # car_id matches every rental of the car rather than a key of rentals, so the link can only
+    # be read; as a writable many-to-one the ORM would load it on every payment delete
+    car_hiring = db.relationship('Rental', backref='payments', viewonly=True)
     
     
 
@@ -1,7 +1,5 @@
-from flask_sqlalchemy import SQLAlchemy
 from aldo_safaris.extensions import db
 
-db = SQLAlchemy()
 
 class TravelPackage(db.Model):
     __tablename__ = 'TravelPackages'
@@ -9,15 +7,15 @@ class TravelPackage(db.Model):
     package_id = db.Column(db.Integer, primary_key=True)
     package_name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    destinations = db.Column(db.ARRAY(db.String(100)))
-    activities = db.Column(db.ARRAY(db.String(100)))
+    destinations = db.Column(db.JSON)  # list of names, mirrored into package_facets
+    activities = db.Column(db.JSON)  # list of names, mirrored into package_facets
     inclusions = db.Column(db.Text)
     price = db.Column(db.Float)
     duration = db.Column(db.Integer)
     availability = db.Column(db.Boolean)
     image_url = db.Column(db.String(200))
     
-    booking = db.relationship('Booking', backref='TravelPackages')
+    booking = db.relationship('Booking', back_populates='travel_package', passive_deletes=True)
     
 
     def __repr__(self):
@@ -1,7 +1,5 @@
-from flask_sqlalchemy import SQLAlchemy
 from aldo_safaris.extensions import db
 
-db = SQLAlchemy()
 
 class User(db.Model):
     __tablename__ = 'user'
@@ -11,8 +9,8 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     contact=db.Column(db.Integer,unique=True)
     password = db.Column(db.String(128), nullable=False)
-    bookings = db.relationship('Booking', backref='user')
-    car_hiring = db.relationship('Car', backref='user')
+    bookings = db.relationship('Booking', back_populates='user', passive_deletes=True)
+    car_hiring = db.relationship('Rental', backref='user', passive_deletes=True)
     
     def __init__(self,user_name,email,password,contact):
         self.user_name=user_name
@@ -0,0 +1,249 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import event, select, insert, delete, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from aldo_safaris.extensions import db
+from aldo_safaris.models.analytics import DailyBookingRollup, DailyPaymentRollup
+from aldo_safaris.models.booking import Booking
+from aldo_safaris.models.payments import Payment
+from aldo_safaris.repositories.payment_totals import PAID_STATUSES
+
+_UPSERTS = {'mysql': mysql_insert, 'postgresql': postgresql_insert, 'sqlite': sqlite_insert}
+
+BOOKING_KEY = ('day', 'package_id', 'destination', 'booking_source')
+PAYMENT_KEY = ('day', 'payment_method')
+
+# group_by names accepted by the reports
+BOOKING_DIMENSIONS = {
+    'day': DailyBookingRollup.day,
+    'package': DailyBookingRollup.package_id,
+    'destination': DailyBookingRollup.destination,
+    'booking_source': DailyBookingRollup.booking_source,
+}
+PAYMENT_DIMENSIONS = {
+    'day': DailyPaymentRollup.day,
+    'payment_method': DailyPaymentRollup.payment_method,
+}
+
+
+def _value(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name)
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def booking_rollup_entry(booking):
+    # (rollup key, revenue) of a Booking or a dict of its column values
+    day = _day(_value(booking, 'date_of_booking'))
+    if day is None:
+        return None
+    key = (day, int(_value(booking, 'package_id') or 0),
+           _value(booking, 'destination') or '', _value(booking, 'booking_source') or '')
+    return key, float(_value(booking, 'total_cost') or 0)
+
+
+def payment_rollup_entry(payment):
+    # (rollup key, amount) of a payment; only paid payments count as collected revenue
+    day = _day(payment.payment_date)
+    if day is None or payment.status not in PAID_STATUSES:
+        return None
+    return (day, payment.payment_method or ''), float(payment.amount or 0)
+
+
+def _apply(connection, model, key, count_name, sum_name, changes):
+    # `changes` are (entry, +1 / -1) pairs. They are summed per rollup row first, so a bulk
+    # insert touches each row once, and written with one upsert that adds to the stored values.
+    totals = {}
+    for entry, sign in changes:
+        if entry is None:
+            continue
+        row_key, value = entry
+        count, total = totals.get(row_key, (0, 0.0))
+        totals[row_key] = (count + sign, total + sign * value)
+
+    # Sorted, so concurrent writers lock shared rollup rows in the same order
+    rows = [dict(zip(key, row_key), **{count_name: count, sum_name: total})
+            for row_key, (count, total) in sorted(totals.items()) if count or total]
+    if not rows:
+        return
+
+    dialect = connection.dialect.name
+    stmt = _UPSERTS[dialect](model).values(rows)
+    if dialect == 'mysql':
+        stmt = stmt.on_duplicate_key_update({
+            name: getattr(model, name) + stmt.inserted[name] for name in (count_name, sum_name)})
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=list(key), set_={
+            name: getattr(model, name) + stmt.excluded[name] for name in (count_name, sum_name)})
+    connection.execute(stmt)
+
+
+# Rollup rows are shared by every booking of a day and package and by every payment of a
+# day and method, so upserting them as soon as a booking or payment changes would make
+# every other write of that row queue on its lock for the rest of the transaction. The
+# functions below only record the change on the session instead. It is upserted just
+# before the outermost transaction commits, in that same transaction, so the row lock is
+# held for the commit only and the rollups can never disagree with what was committed.
+# Changes recorded in a savepoint that rolls back are dropped with it.
+_PENDING = 'analytics_rollup_changes'
+_TABLES = {
+    DailyBookingRollup: (BOOKING_KEY, 'bookings', 'revenue'),
+    DailyPaymentRollup: (PAYMENT_KEY, 'payments', 'amount'),
+}
+
+
+def _record(model, changes):
+    session = db.session()
+    if not session.in_transaction():
+        # Start the transaction now, so a rollback before any SQL still discards the change
+        session.begin()
+    session.info.setdefault(_PENDING, []).append((session.get_nested_transaction(), model, changes))
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_rolled_back_changes(session, previous_transaction):
+    pending = session.info.get(_PENDING)
+    if not pending:
+        return
+    if not previous_transaction.nested:
+        session.info.pop(_PENDING, None)
+        return
+
+    def inside(savepoint):
+        while savepoint is not None:
+            if savepoint is previous_transaction:
+                return True
+            savepoint = savepoint.parent
+        return False
+
+    pending[:] = [change for change in pending if not inside(change[0])]
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _forget_changes(session, transaction):
+    # Whatever is still recorded when the outermost transaction ends without a commit
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+@event.listens_for(db.session, 'before_commit')
+def _write_recorded_changes(session):
+    if session.in_nested_transaction():
+        # A savepoint being released; its changes wait for the outermost commit
+        return
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    changes = {}
+    for _, model, model_changes in pending:
+        changes.setdefault(model, []).extend(model_changes)
+    connection = session.connection()
+    # Always booking rollups first, like every other writer
+    for model in (DailyBookingRollup, DailyPaymentRollup):
+        if model in changes:
+            _apply(connection, model, *_TABLES[model], changes[model])
+
+
+def add_bookings_to_rollup(bookings):
+    _record(DailyBookingRollup, [(booking_rollup_entry(booking), 1) for booking in bookings])
+
+
+def remove_booking_from_rollup(booking):
+    _record(DailyBookingRollup, [(booking_rollup_entry(booking), -1)])
+
+
+def update_booking_rollup(before, booking):
+    # `before` is booking_rollup_entry(booking) taken before the booking was changed
+    after = booking_rollup_entry(booking)
+    if before != after:
+        _record(DailyBookingRollup, [(before, -1), (after, 1)])
+
+
+def add_payment_to_rollup(payment):
+    _record(DailyPaymentRollup, [(payment_rollup_entry(payment), 1)])
+
+
+def remove_payment_from_rollup(payment):
+    _record(DailyPaymentRollup, [(payment_rollup_entry(payment), -1)])
+
+
+def update_payment_rollup(before, payment):
+    after = payment_rollup_entry(payment)
+    if before != after:
+        _record(DailyPaymentRollup, [(before, -1), (after, 1)])
+
+
+def _report(model, dimensions, count_name, sum_name, start, end, group_by):
+    # Sums the rollup rows of [start, end] by the requested dimensions; never reads the
+    # Booking or payments tables
+    columns = [dimensions[name].label(name) for name in group_by]
+    query = (select(*columns,
+                    func.sum(getattr(model, count_name)).label(count_name),
+                    func.sum(getattr(model, sum_name)).label(sum_name))
+             .where(model.day >= start, model.day <= end))
+    if columns:
+        query = query.group_by(*columns).order_by(*columns)
+
+    rows = []
+    for row in db.session.execute(query):
+        count, total = getattr(row, count_name) or 0, getattr(row, sum_name) or 0
+        if not count and abs(total) < 0.005:
+            # Rows emptied by later changes
+            continue
+        result = {}
+        for name in group_by:
+            value = getattr(row, name)
+            # Undo the placeholders used for missing key values
+            result[name] = value.isoformat() if name == 'day' else (value or None)
+        result[count_name] = int(count)
+        result[sum_name] = round(total, 2)
+        rows.append(result)
+    return rows
+
+
+def booking_report(start, end, group_by=()):
+    return _report(DailyBookingRollup, BOOKING_DIMENSIONS, 'bookings', 'revenue', start, end, group_by)
+
+
+def payment_report(start, end, group_by=()):
+    return _report(DailyPaymentRollup, PAYMENT_DIMENSIONS, 'payments', 'amount', start, end, group_by)
+
+
+def _rebuild(model, stamp, keys, aggregates, conditions, start, end):
+    # Replaces the rollup rows of [start, end] with the grouped source rows
+    day = func.date(stamp)
+    conditions = conditions + [stamp.isnot(None)]
+    stale = delete(model)
+    if start is not None:
+        conditions.append(stamp >= datetime.combine(start, time.min))
+        stale = stale.where(model.day >= start)
+    if end is not None:
+        conditions.append(stamp < datetime.combine(end + timedelta(days=1), time.min))
+        stale = stale.where(model.day <= end)
+
+    db.session.execute(stale)
+    result = db.session.execute(insert(model).from_select(
+        [column.name for column in model.__table__.columns],
+        select(day, *keys, *aggregates).where(*conditions).group_by(day, *keys)))
+    return result.rowcount
+
+
+def rebuild_rollups(start=None, end=None):
+    # Recomputes the rollups of [start, end] (every day by default) from Booking and payments,
+    # one DELETE and one INSERT ... SELECT per table. Returns the number of rollup rows
+    # written; the caller commits.
+    written = _rebuild(
+        DailyBookingRollup, Booking.date_of_booking,
+        [func.coalesce(Booking.package_id, 0), func.coalesce(Booking.destination, ''),
+         func.coalesce(Booking.booking_source, '')],
+        [func.count(), func.coalesce(func.sum(Booking.total_cost), 0)],
+        [], start, end)
+    written += _rebuild(
+        DailyPaymentRollup, Payment.payment_date,
+        [func.coalesce(Payment.payment_method, '')],
+        [func.count(), func.coalesce(func.sum(Payment.amount), 0)],
+        [Payment.status.in_(PAID_STATUSES)], start, end)
+    return written
@@ -0,0 +1,29 @@
+from sqlalchemy import select, exists, and_
+from aldo_safaris.extensions import db
+from aldo_safaris.models.car_hiring import Car, Rental
+
+
+def overlaps(start, end):
+    # Half-open intervals [start, end) overlap when each starts before the other ends.
+    # Served by ix_rentals_car_id_end_date_start_date: only rentals ending after `start` are read,
+    # so past rental history does not slow the probe down.
+    return and_(Rental.end_date > start, Rental.start_date < end)
+
+
+def available_cars_query(start, end):
+    # Cars in service with no rental overlapping [start, end)
+    booked = exists().where(Rental.car_id == Car.id, overlaps(start, end))
+    return select(Car).where(Car.available == True, ~booked).order_by(Car.id)  # noqa: E712
+
+
+def lock_car(car_id):
+    # SELECT ... FOR UPDATE on the car row serializes concurrent reservations of the same car
+    return db.session.execute(
+        select(Car).where(Car.id == car_id).with_for_update()
+    ).scalar_one_or_none()
+
+
+def has_conflict(car_id, start, end):
+    return db.session.execute(
+        select(exists().where(Rental.car_id == car_id, overlaps(start, end)))
+    ).scalar()
@@ -0,0 +1,30 @@
+from sqlalchemy import select, insert, delete
+from aldo_safaris.extensions import db
+from aldo_safaris.models.booking import Booking
+from aldo_safaris.models.booking_activities import BookingActivity
+from aldo_safaris.utils.lists import distinct_values
+
+
+def add_booking_activities(bookings):
+    # `bookings` yields (booking_id, activities) pairs; one executemany INSERT for all of them
+    rows = [{'booking_id': booking_id, 'activity': activity}
+            for booking_id, activities in bookings
+            for activity in distinct_values(activities)]
+    if rows:
+        db.session.execute(insert(BookingActivity), rows)
+
+
+def set_booking_activities(booking_id, activities):
+    # Runs in the same transaction as the booking write
+    delete_booking_activities(booking_id)
+    add_booking_activities([(booking_id, activities)])
+
+
+def delete_booking_activities(booking_id):
+    db.session.execute(delete(BookingActivity).where(BookingActivity.booking_id == booking_id))
+
+
+def has_activity(activities):
+    # Bookings with any of the activities, resolved through the (activity, booking_id) index
+    return Booking.booking_id.in_(
+        select(BookingActivity.booking_id).where(BookingActivity.activity.in_(activities)))
@@ -0,0 +1,66 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import select
+from aldo_safaris.extensions import db
+from aldo_safaris.models.booking import Booking
+from aldo_safaris.models.payments import Payment
+from aldo_safaris.models.travel_packages import TravelPackage
+from aldo_safaris.models.user_accounts import User
+from aldo_safaris.utils.pagination import STREAM_BATCH_SIZE
+
+EXPORT_KINDS = ('bookings', 'payments')
+
+# Related tables that can be joined into an export, and the columns they add
+EXPORT_INCLUDES = {
+    'package': [TravelPackage.package_name.label('package_name'),
+                TravelPackage.price.label('package_price'),
+                TravelPackage.duration.label('package_duration')],
+    'user': [User.user_name.label('user_name'), User.email.label('user_email')],
+}
+
+BOOKING_COLUMNS = ['booking_id', 'package_id', 'user_id', 'date_of_booking', 'travel_start_date',
+                   'travel_end_date', 'total_cost', 'amount_paid', 'balance_due', 'payment_status',
+                   'booking_status', 'destination', 'accommodation', 'transportation', 'activities',
+                   'booking_source']
+PAYMENT_COLUMNS = ['payment_id', 'booking_id', 'payment_date', 'amount', 'payment_method', 'status', 'car_id']
+
+
+def export_query(kind, start=None, end=None, include=()):
+    # Plain column rows rather than ORM objects, in primary key order. start / end are dates;
+    # they filter on Booking.date_of_booking or Payment.payment_date, both inclusive.
+    if kind == 'bookings':
+        source = Booking
+        columns = [getattr(Booking, name) for name in BOOKING_COLUMNS]
+        stamp, key = Booking.date_of_booking, Booking.booking_id
+    else:
+        source = Payment
+        columns = [getattr(Payment, name) for name in PAYMENT_COLUMNS]
+        stamp, key = Payment.payment_date, Payment.payment_id
+        if include:
+            # Packages and users are reached through the payment's booking
+            columns.append(Booking.user_id.label('user_id'))
+
+    for name in include:
+        columns += EXPORT_INCLUDES[name]
+    query = select(*columns).select_from(source)
+
+    if kind == 'payments' and include:
+        query = query.outerjoin(Booking, Booking.booking_id == Payment.booking_id)
+    if 'package' in include:
+        query = query.outerjoin(TravelPackage, TravelPackage.package_id == Booking.package_id)
+    if 'user' in include:
+        query = query.outerjoin(User, User.user_id == Booking.user_id)
+
+    if start is not None:
+        query = query.where(stamp >= datetime.combine(start, time.min))
+    if end is not None:
+        query = query.where(stamp < datetime.combine(end + timedelta(days=1), time.min))
+    return query.order_by(key)
+
+
+def stream_export(kind, start=None, end=None, include=()):
+    # Returns (column names, row iterator). Rows come from a server-side cursor a batch at a
+    # time, so memory use does not grow with the size of the export. Iterate inside the app
+    # context that ran the query.
+    result = db.session.execute(export_query(kind, start, end, include).execution_options(
+        stream_results=True, yield_per=STREAM_BATCH_SIZE))
+    return list(result.keys()), (tuple(row) for row in result)
@@ -0,0 +1,105 @@
+from datetime import datetime
+from sqlalchemy import select, insert, func, literal
+from aldo_safaris.extensions import db, notifier
+from aldo_safaris.models.booking import Booking
+from aldo_safaris.models.broadcasts import NotificationBroadcast
+from aldo_safaris.models.notifications import Notification
+from aldo_safaris.repositories.booking_activities import has_activity
+from aldo_safaris.repositories.unread import UNREAD, add_unread_from_select
+from aldo_safaris.repositories.sync import record_changes_from_select
+
+# Filters a broadcast segment may use
+SEGMENT_FILTERS = ('package_id', 'destination', 'activity', 'start_date', 'end_date')
+
+
+def parse_segment(data):
+    # Returns (segment, None) or (None, error message)
+    if not isinstance(data, dict) or not any(data.get(key) for key in SEGMENT_FILTERS):
+        return None, 'Segment needs at least one of: %s' % ', '.join(SEGMENT_FILTERS)
+
+    segment = {key: data[key] for key in SEGMENT_FILTERS if data.get(key)}
+    for key in ('start_date', 'end_date'):
+        if key in segment:
+            try:
+                datetime.strptime(segment[key], '%Y-%m-%d')
+            except (TypeError, ValueError):
+                return None, 'Invalid date format. Use YYYY-MM-DD'
+    return segment, None
+
+
+def segment_query(segment, *columns):
+    # Distinct users with a booking matching the segment; travelling at any point in
+    # [start_date, end_date] counts as matching the date range
+    query = select(*columns).where(Booking.user_id.isnot(None))
+    if 'package_id' in segment:
+        query = query.where(Booking.package_id == segment['package_id'])
+    if 'destination' in segment:
+        query = query.where(Booking.destination == segment['destination'])
+    if 'activity' in segment:
+        query = query.where(has_activity([segment['activity']]))
+    if 'start_date' in segment:
+        query = query.where(Booking.travel_end_date >= datetime.strptime(segment['start_date'], '%Y-%m-%d'))
+    if 'end_date' in segment:
+        query = query.where(Booking.travel_start_date <= datetime.strptime(segment['end_date'], '%Y-%m-%d'))
+    return query.distinct()
+
+
+def run_broadcast(broadcast_id, chunk_size=1000):
+    # Expands the segment server-side: one INSERT ... SELECT per chunk of recipients, committed
+    # together with the unread counters and the progress counter so GET /broadcast/<id> always
+    # matches what was sent
+    broadcast = db.session.get(NotificationBroadcast, broadcast_id)
+    try:
+        broadcast.status = 'running'
+        broadcast.total_recipients = db.session.execute(
+            select(func.count()).select_from(segment_query(broadcast.segment, Booking.user_id).subquery())
+        ).scalar()
+        db.session.commit()
+
+        created_at = datetime.now()
+        last_id = 0
+        while True:
+            # Recipients of the next chunk, walking user ids in order
+            user_ids = db.session.execute(
+                segment_query(broadcast.segment, Booking.user_id)
+                .where(Booking.user_id > last_id)
+                .order_by(Booking.user_id)
+                .limit(chunk_size)
+            ).scalars().all()
+            if not user_ids:
+                break
+            upper_id, count = user_ids[-1], len(user_ids)
+
+            rows = (segment_query(broadcast.segment, Booking.user_id, literal(broadcast.message, db.Text),
+                                  literal(created_at, db.DateTime), literal(UNREAD, db.String(20)))
+                    .where(Booking.user_id > last_id, Booking.user_id <= upper_id))
+            last_notification_id = db.session.execute(select(func.max(Notification.notification_id))).scalar() or 0
+            db.session.execute(insert(Notification).from_select(
+                ['recipient_id', 'message', 'created_at', 'status'], rows))
+            record_changes_from_select(
+                select(Notification.recipient_id, Notification.notification_id)
+                .where(Notification.notification_id > last_notification_id,
+                       Notification.recipient_id > last_id, Notification.recipient_id <= upper_id)
+            )
+            add_unread_from_select(segment_query(broadcast.segment, Booking.user_id, literal(1, db.Integer))
+                                   .where(Booking.user_id > last_id, Booking.user_id <= upper_id))
+
+            broadcast.sent = (broadcast.sent or 0) + count
+            db.session.commit()
+            notifier.publish(user_ids, 'broadcast', {'broadcast_id': broadcast.broadcast_id,
+                                                     'message': broadcast.message,
+                                                     'created_at': created_at})
+            last_id = upper_id
+
+        broadcast.status = 'completed'
+        broadcast.finished_at = datetime.now()
+        db.session.commit()
+
+    except Exception as e:
+        db.session.rollback()
+        broadcast = db.session.get(NotificationBroadcast, broadcast_id)
+        broadcast.status = 'failed'
+        broadcast.error = str(e)
+        broadcast.finished_at = datetime.now()
+        db.session.commit()
+        raise
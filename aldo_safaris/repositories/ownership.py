@@ -0,0 +1,57 @@
+from sqlalchemy import select
+from aldo_safaris.extensions import db
+from aldo_safaris.models.booking import Booking
+from aldo_safaris.models.payments import Payment
+
+# Outcomes of an owner-scoped lookup
+NOT_FOUND = 'not_found'
+FORBIDDEN = 'forbidden'
+
+
+def is_owner(owner_id, user_id):
+    # JWT identities arrive as strings while the columns are integers
+    return owner_id is not None and str(owner_id) == str(user_id)
+
+
+def get_owned_booking(booking_id, user_id):
+    # Returns (booking, None) or (None, NOT_FOUND / FORBIDDEN)
+    booking = db.session.get(Booking, booking_id)
+    if booking is None:
+        return None, NOT_FOUND
+    if not is_owner(booking.user_id, user_id):
+        return None, FORBIDDEN
+    return booking, None
+
+
+def get_owned_payment(payment_id, user_id, for_update=False):
+    # The payment and the owner of its booking come back in a single joined SELECT.
+    # for_update locks both rows (SELECT ... FOR UPDATE) and reloads the payment, for writes
+    # that compute a delta from its current amount and status.
+    query = (select(Payment, Booking.user_id)
+             .outerjoin(Booking, Payment.booking_id == Booking.booking_id)
+             .where(Payment.payment_id == payment_id))
+    if for_update:
+        query = query.with_for_update().execution_options(populate_existing=True)
+    row = db.session.execute(query).first()
+    if row is None:
+        return None, NOT_FOUND
+    payment, owner_id = row
+    if not is_owner(owner_id, user_id):
+        return None, FORBIDDEN
+    return payment, None
+
+
+def list_owned_payments(booking_id, user_id):
+    # Booking ownership and all of its payments in one round trip; a booking without
+    # payments still yields one row with payment = None
+    rows = db.session.execute(
+        select(Booking.user_id, Payment)
+        .outerjoin(Payment, Payment.booking_id == Booking.booking_id)
+        .where(Booking.booking_id == booking_id)
+        .order_by(Payment.payment_id)
+    ).all()
+    if not rows:
+        return None, NOT_FOUND
+    if not is_owner(rows[0][0], user_id):
+        return None, FORBIDDEN
+    return [payment for _, payment in rows if payment is not None], None
@@ -0,0 +1,159 @@
+import re
+from sqlalchemy import select, insert, delete, func, or_, and_
+from aldo_safaris.extensions import db
+from aldo_safaris.models.package_search import PackageSearchTerm, PackageFacet
+from aldo_safaris.models.travel_packages import TravelPackage
+from aldo_safaris.utils.lists import distinct_values
+
+# Field weights of the text index
+TEXT_FIELDS = (('package_name', 3), ('description', 1), ('inclusions', 1))
+
+# Words too common to narrow a search
+STOPWORDS = frozenset(('a', 'an', 'and', 'at', 'for', 'in', 'of', 'on', 'or', 'the', 'to', 'with'))
+
+# Values returned per facet, most frequent first
+FACET_LIMIT = 20
+
+MAX_TERM_LENGTH = 50
+
+# Sorts after any character, so [term, term + PREFIX_END) holds every word starting with term
+PREFIX_END = '\U0010ffff'
+
+
+def tokenize(text):
+    if not text:
+        return []
+    words = re.findall(r'[^\W_]+', text.lower())
+    return [word[:MAX_TERM_LENGTH] for word in words if len(word) > 1 and word not in STOPWORDS]
+
+
+def index_package(package):
+    # Replaces the package's index rows; runs in the same transaction as the package write.
+    # The package must already have its id (flush after add).
+    unindex_package(package.package_id)
+
+    weights = {}
+    for field, weight in TEXT_FIELDS:
+        for term in set(tokenize(getattr(package, field))):
+            weights[term] = weights.get(term, 0) + weight
+    if weights:
+        db.session.execute(insert(PackageSearchTerm), [
+            {'term': term, 'package_id': package.package_id, 'weight': weight}
+            for term, weight in weights.items()
+        ])
+
+    facets = [{'facet': 'destination', 'value': value, 'package_id': package.package_id}
+              for value in distinct_values(package.destinations)]
+    facets += [{'facet': 'activity', 'value': value, 'package_id': package.package_id}
+               for value in distinct_values(package.activities)]
+    if facets:
+        db.session.execute(insert(PackageFacet), facets)
+
+
+def unindex_package(package_id):
+    db.session.execute(delete(PackageSearchTerm).where(PackageSearchTerm.package_id == package_id))
+    db.session.execute(delete(PackageFacet).where(PackageFacet.package_id == package_id))
+
+
+def _prefix_match(term):
+    # A range rather than LIKE, so the term index is used on every backend
+    return and_(PackageSearchTerm.term >= term, PackageSearchTerm.term < term + PREFIX_END)
+
+
+def _has_facet(facet, values):
+    return TravelPackage.package_id.in_(
+        select(PackageFacet.package_id).where(PackageFacet.facet == facet, PackageFacet.value.in_(values)))
+
+
+def _conditions(terms, filters, skip=None):
+    # WHERE clauses for a search; `skip` leaves out one facet so its counts show the
+    # alternatives to the current selection
+    conditions = [TravelPackage.availability == True]  # noqa: E712
+    for term in terms:
+        # Prefix match, so "saf" finds "safari"; each term must match
+        conditions.append(TravelPackage.package_id.in_(
+            select(PackageSearchTerm.package_id).where(_prefix_match(term))))
+    if filters.get('destinations') and skip != 'destination':
+        conditions.append(_has_facet('destination', filters['destinations']))
+    if filters.get('activities') and skip != 'activity':
+        conditions.append(_has_facet('activity', filters['activities']))
+    if skip != 'price':
+        if filters.get('min_price') is not None:
+            conditions.append(TravelPackage.price >= filters['min_price'])
+        if filters.get('max_price') is not None:
+            conditions.append(TravelPackage.price <= filters['max_price'])
+    if skip != 'duration':
+        if filters.get('min_duration') is not None:
+            conditions.append(TravelPackage.duration >= filters['min_duration'])
+        if filters.get('max_duration') is not None:
+            conditions.append(TravelPackage.duration <= filters['max_duration'])
+    return conditions
+
+
+def _facet_counts(facet, terms, filters):
+    matching = select(TravelPackage.package_id).where(*_conditions(terms, filters, skip=facet))
+    rows = db.session.execute(
+        select(PackageFacet.value, func.count().label('count'))
+        .where(PackageFacet.facet == facet, PackageFacet.package_id.in_(matching))
+        .group_by(PackageFacet.value)
+        .order_by(func.count().desc(), PackageFacet.value)
+        .limit(FACET_LIMIT)
+    ).all()
+    return [{'value': value, 'count': count} for value, count in rows]
+
+
+def search_packages(text, filters, limit, offset=0):
+    # Returns (packages for this page, total matches, facets)
+    terms = tokenize(text)
+    conditions = _conditions(terms, filters)
+
+    query = select(TravelPackage).where(*conditions)
+    if terms:
+        # Relevance: summed weights of the index rows the query terms hit
+        scores = (select(PackageSearchTerm.package_id, func.sum(PackageSearchTerm.weight).label('score'))
+                  .where(or_(*[_prefix_match(term) for term in terms]))
+                  .group_by(PackageSearchTerm.package_id)
+                  .subquery())
+        query = (query.join(scores, scores.c.package_id == TravelPackage.package_id)
+                 .order_by(scores.c.score.desc(), TravelPackage.package_id))
+    else:
+        query = query.order_by(TravelPackage.package_id)
+    packages = db.session.execute(query.limit(limit).offset(offset)).scalars().all()
+
+    total = db.session.execute(
+        select(func.count()).select_from(TravelPackage).where(*conditions)).scalar()
+
+    price_min, price_max = db.session.execute(
+        select(func.min(TravelPackage.price), func.max(TravelPackage.price))
+        .where(*_conditions(terms, filters, skip='price'))).one()
+    durations = db.session.execute(
+        select(TravelPackage.duration, func.count())
+        .where(*_conditions(terms, filters, skip='duration'))
+        .group_by(TravelPackage.duration)
+        .order_by(TravelPackage.duration)).all()
+
+    facets = {
+        'destinations': _facet_counts('destination', terms, filters),
+        'activities': _facet_counts('activity', terms, filters),
+        'price': {'min': price_min, 'max': price_max},
+        'duration': [{'value': value, 'count': count} for value, count in durations if value is not None]
+    }
+    return packages, total, facets
+
+
+def reindex_all_packages(batch_size=500):
+    # Rebuilds the index for every package, committing once per batch
+    last_id = 0
+    indexed = 0
+    while True:
+        packages = db.session.execute(
+            select(TravelPackage).where(TravelPackage.package_id > last_id)
+            .order_by(TravelPackage.package_id).limit(batch_size)
+        ).scalars().all()
+        if not packages:
+            return indexed
+        for package in packages:
+            index_package(package)
+        db.session.commit()
+        indexed += len(packages)
+        last_id = packages[-1].package_id
@@ -0,0 +1,111 @@
+from sqlalchemy import select, update, func, case, or_
+from aldo_safaris.extensions import db
+from aldo_safaris.models.booking import Booking
+from aldo_safaris.models.payments import Payment
+
+# Payment statuses that count towards Booking.amount_paid
+PAID_STATUSES = ('completed', 'paid')
+
+# Amounts are floats; differences below a cent are not drift
+TOLERANCE = 0.005
+
+
+def paid_amount(status, amount):
+    # What a payment contributes to its booking's amount_paid
+    if status in PAID_STATUSES and amount:
+        return float(amount)
+    return 0.0
+
+
+def payment_status_expr(amount_paid, total_cost):
+    # Booking.payment_status as a SQL expression of the amounts
+    return case(
+        (amount_paid <= 0, 'unpaid'),
+        (amount_paid < func.coalesce(total_cost, 0), 'partial'),
+        else_='paid'
+    )
+
+
+def payment_status_for(amount_paid, total_cost):
+    # Same rule as payment_status_expr, for rows built in Python
+    if amount_paid <= 0:
+        return 'unpaid'
+    if amount_paid < (total_cost or 0):
+        return 'partial'
+    return 'paid'
+
+
+def apply_payment_delta(booking_id, delta):
+    # Adds `delta` to the booking's amount_paid in one UPDATE, so concurrent payments for the
+    # same booking cannot overwrite each other. Runs in the caller's transaction.
+    if not delta or booking_id is None:
+        return
+    amount_paid = func.coalesce(Booking.amount_paid, 0) + delta
+    db.session.execute(
+        update(Booking)
+        .where(Booking.booking_id == booking_id)
+        .values(amount_paid=amount_paid,
+                balance_due=func.coalesce(Booking.total_cost, 0) - amount_paid,
+                payment_status=payment_status_expr(amount_paid, Booking.total_cost))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def refresh_balance(booking_id):
+    # After total_cost changes
+    amount_paid = func.coalesce(Booking.amount_paid, 0)
+    db.session.execute(
+        update(Booking)
+        .where(Booking.booking_id == booking_id)
+        .values(balance_due=func.coalesce(Booking.total_cost, 0) - amount_paid,
+                payment_status=payment_status_expr(amount_paid, Booking.total_cost))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _actual_paid():
+    # Sum of paid payments for the booking in the enclosing statement
+    return (select(func.coalesce(func.sum(Payment.amount), 0))
+            .where(Payment.booking_id == Booking.booking_id, Payment.status.in_(PAID_STATUSES))
+            .scalar_subquery())
+
+
+def find_drift(sample_size=20):
+    # Bookings whose stored totals or status disagree with their payments, in one grouped
+    # pass over payments. Returns (number of bookings, summed absolute drift, sample rows).
+    totals = (select(Payment.booking_id, func.sum(Payment.amount).label('paid'))
+              .where(Payment.status.in_(PAID_STATUSES))
+              .group_by(Payment.booking_id)
+              .subquery())
+    actual = func.coalesce(totals.c.paid, 0)
+    stored = func.coalesce(Booking.amount_paid, 0)
+    expected_status = payment_status_expr(actual, Booking.total_cost)
+    drifted = (select(Booking.booking_id, stored.label('stored'), actual.label('actual'),
+                      Booking.payment_status, expected_status.label('expected_status'))
+               .outerjoin(totals, totals.c.booking_id == Booking.booking_id)
+               .where(or_(func.abs(stored - actual) > TOLERANCE,
+                          Booking.payment_status.is_(None),
+                          Booking.payment_status != expected_status,
+                          func.abs(func.coalesce(Booking.balance_due, 0)
+                                   - (func.coalesce(Booking.total_cost, 0) - actual)) > TOLERANCE))
+               .subquery())
+
+    count, total = db.session.execute(
+        select(func.count(), func.coalesce(func.sum(func.abs(drifted.c.stored - drifted.c.actual)), 0))
+    ).one()
+    sample = db.session.execute(select(drifted).order_by(drifted.c.booking_id).limit(sample_size)).all()
+    return count, total, sample
+
+
+def recompute_payment_totals():
+    # Rewrites amount_paid, balance_due and payment_status of every booking from its payments
+    # in a single UPDATE; returns the number of rows matched
+    actual = _actual_paid()
+    result = db.session.execute(
+        update(Booking)
+        .values(amount_paid=actual,
+                balance_due=func.coalesce(Booking.total_cost, 0) - actual,
+                payment_status=payment_status_expr(actual, Booking.total_cost))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, exists, func, literal, or_
+from sqlalchemy.orm import aliased
+from aldo_safaris.extensions import db
+from aldo_safaris.models.notification_changes import NotificationChange
+from aldo_safaris.models.notifications import Notification
+
+# Kinds of change recorded in the log
+UPSERT = 'upsert'
+DELETE = 'delete'
+
+
+def record_change(notification, op=UPSERT):
+    # Runs inside the caller's transaction; the notification must already have its id
+    db.session.add(NotificationChange(
+        recipient_id=notification.recipient_id,
+        notification_id=notification.notification_id,
+        op=op,
+        changed_at=datetime.now()
+    ))
+
+
+def record_changes_from_select(source, op=UPSERT):
+    # `source` selects (recipient_id, notification_id) of every notification a set-based
+    # statement touched
+    rows = source.add_columns(literal(op, db.String(10)), literal(datetime.now(), db.DateTime))
+    db.session.execute(insert(NotificationChange).from_select(
+        ['recipient_id', 'notification_id', 'op', 'changed_at'], rows))
+
+
+def changes_since(user_id, since, limit, settle_seconds=0):
+    # Returns (notifications, deleted ids, cursor, has_more) for changes after `since`.
+    # Reads only the user's slice of the log past the cursor. The page stops before the first
+    # change younger than settle_seconds, so a transaction that took a lower change_id but
+    # committed later is not skipped. Young rows are not filtered out one by one: changed_at
+    # is taken before the INSERT, so ids and timestamps are not in the same order, and the
+    # cursor would move past a held-back row that has a lower id than a returned one.
+    in_slice = (NotificationChange.recipient_id == user_id, NotificationChange.change_id > since)
+    query = (select(NotificationChange.change_id, NotificationChange.notification_id, NotificationChange.op)
+             .where(*in_slice)
+             .order_by(NotificationChange.change_id)
+             .limit(limit + 1))
+    if settle_seconds:
+        cutoff = datetime.now() - timedelta(seconds=settle_seconds)
+        unsettled = (select(func.min(NotificationChange.change_id))
+                     .where(*in_slice, NotificationChange.changed_at > cutoff)
+                     .scalar_subquery())
+        query = query.where(or_(unsettled.is_(None), NotificationChange.change_id < unsettled))
+    changes = db.session.execute(query).all()
+
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if not changes:
+        return [], [], since, False
+
+    # Only the latest change per notification matters
+    latest = {}
+    for _, notification_id, op in changes:
+        latest[notification_id] = op
+
+    upserted = [notification_id for notification_id, op in latest.items() if op == UPSERT]
+    notifications = []
+    if upserted:
+        notifications = db.session.execute(
+            select(Notification)
+            .where(Notification.notification_id.in_(upserted), Notification.recipient_id == user_id)
+            .order_by(Notification.notification_id)
+        ).scalars().all()
+
+    # Rows deleted by a change past this page are tombstoned now rather than left dangling
+    found = {notification.notification_id for notification in notifications}
+    deleted = sorted(notification_id for notification_id in latest if notification_id not in found)
+    return notifications, deleted, changes[-1][0], has_more
+
+
+def purge_superseded_changes(older_than, batch_size=1000):
+    # Deletes log rows older than `older_than` that a later change of the same notification
+    # supersedes, one batch per transaction. Syncs only ever use the latest change per
+    # notification, so every cursor still gets the same result. The latest row of each
+    # notification, upsert or delete tombstone, is kept.
+    newer = aliased(NotificationChange)
+    superseded = exists().where(newer.recipient_id == NotificationChange.recipient_id,
+                                newer.notification_id == NotificationChange.notification_id,
+                                newer.change_id > NotificationChange.change_id)
+    deleted = 0
+    while True:
+        change_ids = db.session.execute(
+            select(NotificationChange.change_id)
+            .where(NotificationChange.changed_at < older_than, superseded)
+            .order_by(NotificationChange.change_id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not change_ids:
+            return deleted
+        db.session.execute(delete(NotificationChange).where(NotificationChange.change_id.in_(change_ids)))
+        db.session.commit()
+        deleted += len(change_ids)
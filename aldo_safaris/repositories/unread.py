@@ -0,0 +1,77 @@
+from sqlalchemy import select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from aldo_safaris.extensions import db
+from aldo_safaris.models.notification_counters import NotificationCounter
+from aldo_safaris.models.notifications import Notification
+from aldo_safaris.repositories.sync import record_changes_from_select
+
+# Status a notification has until the recipient reads it
+UNREAD = 'unread'
+
+_UPSERTS = {'mysql': mysql_insert, 'postgresql': postgresql_insert, 'sqlite': sqlite_insert}
+
+
+def is_unread(status):
+    return status == UNREAD
+
+
+def _add_to_counters(values=None, source=None):
+    # Adds to the counters of the given users, creating missing rows, in one statement.
+    # `values` is a list of {'user_id', 'unread'} dicts, `source` a SELECT of (user_id, unread).
+    dialect = db.session.get_bind().dialect.name
+    stmt = _UPSERTS[dialect](NotificationCounter)
+    stmt = stmt.values(values) if source is None else stmt.from_select(['user_id', 'unread'], source)
+    if dialect == 'mysql':
+        stmt = stmt.on_duplicate_key_update(unread=NotificationCounter.unread + stmt.inserted.unread)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=['user_id'],
+                                          set_={'unread': NotificationCounter.unread + stmt.excluded.unread})
+    db.session.execute(stmt)
+
+
+def adjust_unread(user_id, delta):
+    # Runs inside the caller's transaction; commit together with the notification change
+    if not delta or user_id is None:
+        return
+    if delta > 0:
+        _add_to_counters(values=[{'user_id': user_id, 'unread': delta}])
+    else:
+        db.session.execute(update(NotificationCounter)
+                           .where(NotificationCounter.user_id == user_id)
+                           .values(unread=NotificationCounter.unread + delta))
+
+
+def add_unread_from_select(source):
+    # `source` selects (user_id, number of new unread notifications), one row per user
+    _add_to_counters(source=source)
+
+
+def status_change_delta(old_status, new_status):
+    return int(is_unread(new_status)) - int(is_unread(old_status))
+
+
+def get_unread_count(user_id):
+    count = db.session.execute(
+        select(NotificationCounter.unread).where(NotificationCounter.user_id == user_id)
+    ).scalar()
+    return count or 0
+
+
+def mark_all_read(user_id):
+    # One UPDATE over the (recipient_id, status) index; the counter drops by the rows it
+    # actually changed, so notifications created meanwhile stay counted. The rows are logged
+    # for delta sync first, in the same transaction.
+    record_changes_from_select(
+        select(Notification.recipient_id, Notification.notification_id)
+        .where(Notification.recipient_id == user_id, Notification.status == UNREAD)
+    )
+    result = db.session.execute(
+        update(Notification)
+        .where(Notification.recipient_id == user_id, Notification.status == UNREAD)
+        .values(status='read')
+        .execution_options(synchronize_session=False)
+    )
+    adjust_unread(user_id, -result.rowcount)
+    return result.rowcount
@@ -0,0 +1,18 @@
+from functools import wraps
+from flask import current_app, jsonify
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+
+def is_admin(user_id):
+    return str(user_id) in {str(admin_id) for admin_id in current_app.config.get('ADMIN_USER_IDS', ())}
+
+
+def admin_required(fn):
+    # Like jwt_required(), but only for the user ids listed in ADMIN_USER_IDS
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        verify_jwt_in_request()
+        if not is_admin(get_jwt_identity()):
+            return jsonify({'error': 'You are not authorized to perform this action'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
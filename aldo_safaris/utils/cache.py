@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('aldo_safaris.cache')
+
+
+class LRUCacheBackend:
+    # In-process cache: least recently used entries are evicted once max_entries is reached.
+    # Single process only; delete() and clear() do not reach other workers.
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCacheBackend:
+    # Shared cache for multi-worker deployments; any client exposing get/set(ex=)/delete works,
+    # so tests can pass an in-memory fake instead of a real Redis connection
+    def __init__(self, client, prefix='aldo:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, prefix='aldo:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('The redis package is required for CACHE_BACKEND="redis"')
+        return cls(redis.Redis.from_url(url), prefix=prefix)
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    # Flask extension holding pre-serialized JSON bodies together with their ETag
+    def __init__(self, app=None):
+        self.backend = None
+        self.default_ttl = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, backend=None):
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+        if backend is None:
+            kind = app.config.get('CACHE_BACKEND', 'memory')
+            if kind == 'redis':
+                backend = RedisCacheBackend.from_url(app.config['CACHE_REDIS_URL'])
+            elif kind == 'memory':
+                if app.config.get('WEB_CONCURRENCY', 1) > 1:
+                    logger.warning('CACHE_BACKEND="memory" with %s workers: invalidations only reach '
+                                   'the worker that made them, use "redis"', app.config['WEB_CONCURRENCY'])
+                backend = LRUCacheBackend(app.config.get('CACHE_MAX_ENTRIES', 256))
+            else:
+                raise ValueError('Unknown CACHE_BACKEND %r' % kind)
+        self.backend = backend
+        app.extensions['response_cache'] = self
+
+    def get_json(self, key):
+        # Returns (body, etag) or None on a miss
+        raw = self.backend.get(key)
+        if raw is None:
+            return None
+        etag, _, body = raw.partition(b'\n')
+        return body, etag.decode('ascii')
+
+    def set_json(self, key, body, ttl=None):
+        etag = hashlib.sha1(body).hexdigest()
+        self.backend.set(key, etag.encode('ascii') + b'\n' + body, ttl or self.default_ttl)
+        return body, etag
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+# Output is handed on in pieces of about this many characters rather than row by row
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# format -> Content-Type
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# Spreadsheet programs run cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return _plain(value)
+
+
+def csv_chunks(columns, rows, chunk_size=EXPORT_CHUNK_SIZE):
+    # Header line, then one line per row; only the current chunk is held in memory
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(columns, rows, chunk_size=EXPORT_CHUNK_SIZE):
+    # One JSON object per line
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps({name: _plain(value) for name, value in zip(columns, row)},
+                          ensure_ascii=False, separators=(',', ':'))
+        lines.append(line)
+        size += len(line) + 1
+        if size >= chunk_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+            size = 0
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def export_chunks(fmt, columns, rows):
+    if fmt == 'csv':
+        return csv_chunks(columns, rows)
+    return ndjson_chunks(columns, rows)
+
+
+def gzip_chunks(chunks, level=6):
+    # Compresses a stream of text chunks as it is produced; the output is a complete .gz file
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,96 @@
+import hmac
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt as _bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    # Raised when the hashing pool is saturated; callers answer 503 with Retry-After
+    def __init__(self, retry_after):
+        super().__init__('Too many password operations in progress, please retry shortly')
+        self.retry_after = retry_after
+
+
+# These run inside the pool's worker processes, so they must be plain module-level functions
+def _hash_password(password, rounds):
+    return _bcrypt.hashpw(password.encode('utf-8'), _bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check_password(pw_hash, password):
+    pw_hash = pw_hash.encode('utf-8')
+    return hmac.compare_digest(_bcrypt.hashpw(password.encode('utf-8'), pw_hash), pw_hash)
+
+
+def hash_rounds(pw_hash):
+    # Cost factor stored in a bcrypt hash, e.g. 12 for "$2b$12$..."
+    try:
+        return int(pw_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    # Runs bcrypt in a bounded process pool so request threads are not pinned by hashing
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = 0
+        self.max_pending = 0
+        self.timeout = None
+        self.retry_after = 1
+        self._executor = None
+        self._executor_pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        # 0 workers hashes inline on the request thread (useful for development and tests)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.workers * 4)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        self.retry_after = app.config.get('PASSWORD_HASH_RETRY_AFTER', 1)
+        self._slots = threading.BoundedSemaphore(self.max_pending) if self.max_pending else None
+        app.extensions['password_hasher'] = self
+
+    def _get_executor(self):
+        # Created lazily and per process, so pools are never inherited across a gunicorn fork
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+
+        # Refuse new work instead of queueing without bound
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy(self.retry_after)
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            if self._slots is not None:
+                self._slots.release()
+            raise
+        if self._slots is not None:
+            future.add_done_callback(lambda f: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise PasswordHasherBusy(self.retry_after)
+
+    def generate_password_hash(self, password):
+        return self._run(_hash_password, password, self.rounds)
+
+    def check_password_hash(self, pw_hash, password):
+        return self._run(_check_password, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        # True when the hash was produced with a different work factor than the configured one
+        return hash_rounds(pw_hash) != self.rounds
@@ -0,0 +1,165 @@
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from aldo_safaris.extensions import db
+from aldo_safaris.models.idempotency_keys import IdempotencyKey
+from aldo_safaris.utils.cache import LRUCacheBackend
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+IN_PROGRESS = 'in_progress'
+COMPLETED = 'completed'
+
+
+def request_fingerprint():
+    digest = hashlib.sha256()
+    for part in (request.method.encode('utf-8'), request.path.encode('utf-8'), request.get_data(cache=True)):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _recent_responses():
+    # Per-process LRU of completed responses, so retries skip the database
+    cache = current_app.extensions.get('idempotency_cache')
+    if cache is None:
+        cache = current_app.extensions['idempotency_cache'] = LRUCacheBackend(
+            current_app.config.get('IDEMPOTENCY_CACHE_ENTRIES', 1024))
+    return cache
+
+
+def _replay(status, body):
+    response = Response(body, status=status, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _conflict(message, status):
+    response = jsonify({'error': message})
+    if status == 409:
+        response.headers['Retry-After'] = str(current_app.config.get('IDEMPOTENCY_RETRY_AFTER', 1))
+    return response, status
+
+
+def _from_record(record, fingerprint):
+    # Response for a request whose key is already taken, or None when the record has expired
+    if record.expires_at <= datetime.now():
+        return None
+    if record.fingerprint != fingerprint:
+        return _conflict('Idempotency-Key was already used for a different request', 422)
+    if record.status != COMPLETED:
+        return _conflict('A request with this Idempotency-Key is still being processed', 409)
+    return _replay(record.response_status, record.response_body)
+
+
+def _await_record(user_id, key, fingerprint):
+    # A duplicate that lost the race polls for the first request's response for up to
+    # IDEMPOTENCY_WAIT_SECONDS, then gives up with 409
+    deadline = time.monotonic() + current_app.config.get('IDEMPOTENCY_WAIT_SECONDS', 2)
+    while True:
+        db.session.rollback()
+        record = db.session.get(IdempotencyKey, (user_id, key))
+        response = _from_record(record, fingerprint) if record is not None else None
+        if response is None or record.status == COMPLETED or record.fingerprint != fingerprint:
+            break
+        if time.monotonic() >= deadline:
+            return response
+        time.sleep(0.05)
+    return response or _conflict('A request with this Idempotency-Key is still being processed', 409)
+
+
+def idempotent(fn):
+    # Stores the first response to a request carrying an Idempotency-Key header and replays it
+    # for retries until IDEMPOTENCY_TTL_SECONDS have passed. The key row is inserted in the
+    # same transaction as the view's writes: a concurrent duplicate blocks on the key until
+    # the first request commits, then replays its response instead of writing again.
+    # Apply below jwt_required().
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return fn(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': '%s must be 1 to %d characters' % (HEADER, MAX_KEY_LENGTH)}), 400
+
+        user_id = str(get_jwt_identity())
+        fingerprint = request_fingerprint()
+        cache = _recent_responses()
+        cache_key = '%s:%s' % (user_id, key)
+
+        cached = cache.get(cache_key)
+        if cached is not None:
+            cached_fingerprint, status, body = cached
+            if cached_fingerprint != fingerprint:
+                return _conflict('Idempotency-Key was already used for a different request', 422)
+            return _replay(status, body)
+
+        record = db.session.get(IdempotencyKey, (user_id, key))
+        if record is not None:
+            if record.expires_at > datetime.now():
+                if record.status == IN_PROGRESS and record.fingerprint == fingerprint:
+                    return _await_record(user_id, key, fingerprint)
+                return _from_record(record, fingerprint)
+            # Expired, or an in-progress lease that ran out because its worker died: the key may be
+            # used again
+            db.session.delete(record)
+            db.session.flush()
+
+        # Until the response is stored the key is only leased, so a request whose worker dies after
+        # the view has committed does not hold it for the whole TTL
+        now = datetime.now()
+        lease = current_app.config.get('IDEMPOTENCY_LEASE_SECONDS', 60)
+        record = IdempotencyKey(user_id=user_id, idempotency_key=key, fingerprint=fingerprint,
+                                status=IN_PROGRESS, created_at=now, expires_at=now + timedelta(seconds=lease))
+        try:
+            db.session.add(record)
+            db.session.flush()
+        except IntegrityError:
+            # Another request holds the key and has committed by now
+            return _await_record(user_id, key, fingerprint)
+
+        response = make_response(fn(*args, **kwargs))
+
+        if response.status_code >= 500:
+            # Failed requests may be retried with the same key
+            db.session.rollback()
+            db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id,
+                                                            IdempotencyKey.idempotency_key == key))
+            db.session.commit()
+            return response
+
+        body = response.get_data(as_text=True)
+        ttl = current_app.config.get('IDEMPOTENCY_TTL_SECONDS', 86400)
+        record.status = COMPLETED
+        record.response_status = response.status_code
+        record.response_body = body
+        record.expires_at = datetime.now() + timedelta(seconds=ttl)
+        db.session.commit()
+        cache.set(cache_key, (fingerprint, response.status_code, body), ttl=ttl)
+        return response
+    return wrapper
+
+
+def purge_expired_keys(batch_size=1000):
+    # Deletes expired keys through the expires_at index, one batch per transaction
+    deleted = 0
+    while True:
+        keys = db.session.execute(
+            select(IdempotencyKey.user_id, IdempotencyKey.idempotency_key)
+            .where(IdempotencyKey.expires_at <= datetime.now())
+            .limit(batch_size)
+        ).all()
+        if not keys:
+            return deleted
+        db.session.execute(delete(IdempotencyKey).where(
+            tuple_(IdempotencyKey.user_id, IdempotencyKey.idempotency_key).in_([tuple(k) for k in keys])))
+        db.session.commit()
+        deleted += len(keys)
@@ -0,0 +1,107 @@
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from aldo_safaris.utils.storage import create_storage, spool_stream
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it only the original upload is published
+    Image = None
+
+logger = logging.getLogger('aldo_safaris.images')
+
+
+class ImageProcessor:
+    # Publishes car images in the background: dedups by content hash and renders WebP variants.
+    # IMAGE_WORKERS = 0 processes uploads on the request thread.
+    def __init__(self, app=None):
+        self.app = None
+        self.storage = None
+        self.variants = {}
+        self.primary_variant = None
+        self.quality = 80
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.storage = create_storage(app)
+        self.variants = app.config.get('IMAGE_VARIANTS', {'thumb': 320, 'medium': 1024})
+        self.primary_variant = app.config.get('IMAGE_PRIMARY_VARIANT', 'medium')
+        self.quality = app.config.get('IMAGE_WEBP_QUALITY', 80)
+        workers = app.config.get('IMAGE_WORKERS', 2)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='images') if workers else None
+        app.extensions['image_processor'] = self
+
+    def receive(self, file):
+        # Runs on the request thread: only lands the bytes on local disk
+        extension = file.filename.rsplit('.', 1)[1].lower()
+        path, digest, size = spool_stream(file.stream, self.storage.tmp_dir)
+        return {'path': path, 'digest': digest, 'size': size, 'extension': extension}
+
+    def submit(self, upload, on_done):
+        # on_done(image_url) is called inside an app context once the image is published
+        if self._executor is None:
+            self._process(upload, on_done)
+            return None
+        return self._executor.submit(self._process, upload, on_done)
+
+    def discard(self, upload):
+        if os.path.exists(upload['path']):
+            os.remove(upload['path'])
+
+    def _process(self, upload, on_done):
+        try:
+            key = self._publish(upload)
+            with self.app.app_context():
+                on_done(self.storage.url(key))
+        except Exception:
+            logger.exception('Processing upload %s failed', upload['digest'])
+        finally:
+            self.discard(upload)
+
+    def _publish(self, upload):
+        digest = upload['digest']
+        original_key = '%s.%s' % (digest, upload['extension'])
+        primary_key = original_key
+
+        # Variants are rendered from the local copy before it is handed to the store. A file
+        # Pillow cannot read (truncated, unsupported format) is published as the original only,
+        # as without Pillow.
+        if Image is not None:
+            for name, width in self.variants.items():
+                key = '%s_%s.webp' % (digest, name)
+                if not self.storage.exists(key):
+                    try:
+                        rendered = self._render(upload['path'], width)
+                    except Exception:
+                        logger.warning('Rendering the %s variant of %s failed, publishing the original',
+                                       name, digest, exc_info=True)
+                        break
+                    self.storage.put_file(rendered, key)
+                if name == self.primary_variant:
+                    primary_key = key
+
+        # Identical content is stored once
+        self.storage.put_file(upload['path'], original_key)
+        return primary_key
+
+    def _render(self, source, width):
+        fd, tmp = tempfile.mkstemp(dir=self.storage.tmp_dir, prefix='.variant-')
+        os.close(fd)
+        try:
+            with Image.open(source) as image:
+                image = ImageOps.exif_transpose(image)
+                if image.mode not in ('RGB', 'RGBA'):
+                    # WebP holds RGB(A) only, e.g. CMYK JPEGs and palette PNGs are converted
+                    alpha = 'A' in image.getbands() or 'transparency' in image.info
+                    image = image.convert('RGBA' if alpha else 'RGB')
+                image.thumbnail((width, width))
+                image.save(tmp, 'WEBP', quality=self.quality)
+        except Exception:
+            os.remove(tmp)
+            raise
+        return tmp
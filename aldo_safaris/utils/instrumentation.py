@@ -0,0 +1,147 @@
+import heapq
+import logging
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('aldo_safaris.sql')
+
+
+class RequestSQLStats:
+    # Query count, total DB time and the slowest statements of one request
+    def __init__(self, keep_slowest):
+        self.keep_slowest = keep_slowest
+        self.count = 0
+        self.total = 0.0
+        self.slow = 0
+        self.slowest = []  # min-heap of (duration, statement)
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total += duration
+        if len(self.slowest) < self.keep_slowest:
+            heapq.heappush(self.slowest, (duration, statement))
+        elif self.slowest and duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (duration, statement))
+
+    def slowest_first(self):
+        return sorted(self.slowest, reverse=True)
+
+
+def _server_timing_desc(statement):
+    # Header-safe summary of a statement
+    summary = ' '.join(statement.split())[:60]
+    return summary.replace('\\', '').replace('"', "'")
+
+
+class SQLInstrumentation:
+    # Opt-in per-request SQL metrics: Server-Timing headers, a Prometheus /metrics endpoint
+    # and a slow-query log. Enabled with SQL_INSTRUMENTATION = True.
+    def __init__(self, app=None):
+        self.enabled = False
+        self.slow_query_seconds = 0.2
+        self.keep_slowest = 3
+        self.server_timing = True
+        self._lock = threading.Lock()
+        self._endpoints = {}  # endpoint -> [requests, queries, db seconds, slow queries]
+        self._collectors = {}  # name -> collector
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['sql_instrumentation'] = self
+        self.enabled = app.config.get('SQL_INSTRUMENTATION', False)
+        if not self.enabled:
+            return
+
+        self.slow_query_seconds = app.config.get('SQL_SLOW_QUERY_MS', 200) / 1000.0
+        self.keep_slowest = app.config.get('SQL_SLOWEST_STATEMENTS', 3)
+        self.server_timing = app.config.get('SQL_SERVER_TIMING', True)
+
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule(app.config.get('METRICS_ENDPOINT', '/metrics'), 'metrics', self.metrics_view)
+
+    def add_collector(self, name, collector):
+        # collector() returns extra lines in Prometheus text format for /metrics. Adding one under
+        # an existing name replaces it, so building the app again does not duplicate series.
+        with self._lock:
+            self._collectors[name] = collector
+
+    # Engine events
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_start_time'].pop()
+        duration = time.perf_counter() - started
+
+        stats = g.get('sql_stats') if has_request_context() else None
+        if stats is not None:
+            stats.record(statement, duration)
+
+        if duration >= self.slow_query_seconds:
+            endpoint = request.endpoint if has_request_context() else None
+            blueprint = request.blueprint if has_request_context() else None
+            logger.warning('Slow query %.1f ms blueprint=%s endpoint=%s: %s',
+                           duration * 1000, blueprint or '-', endpoint or '-', ' '.join(statement.split()))
+            if stats is not None:
+                stats.slow += 1
+
+    # Request hooks
+
+    def _before_request(self):
+        g.sql_stats = RequestSQLStats(self.keep_slowest)
+
+    def _after_request(self, response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            totals = self._endpoints.setdefault(endpoint, [0, 0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += stats.count
+            totals[2] += stats.total
+            totals[3] += stats.slow
+
+        if self.server_timing:
+            timings = ['db;dur=%.2f;desc="%d queries"' % (stats.total * 1000, stats.count)]
+            for i, (duration, statement) in enumerate(stats.slowest_first(), 1):
+                timings.append('sql-%d;dur=%.2f;desc="%s"' % (i, duration * 1000, _server_timing_desc(statement)))
+            response.headers.add('Server-Timing', ', '.join(timings))
+        return response
+
+    # Prometheus endpoint
+
+    def metrics_view(self):
+        with self._lock:
+            endpoints = {name: list(values) for name, values in self._endpoints.items()}
+            collectors = list(self._collectors.values())
+
+        lines = []
+        series = [
+            ('aldo_http_requests_total', 'counter', 'Requests served', 0),
+            ('aldo_db_queries_total', 'counter', 'SQL statements executed', 1),
+            ('aldo_db_seconds_total', 'counter', 'Time spent in SQL statements', 2),
+            ('aldo_db_slow_queries_total', 'counter', 'Statements above SQL_SLOW_QUERY_MS', 3),
+        ]
+        for name, kind, help_text, index in series:
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for endpoint, values in sorted(endpoints.items()):
+                lines.append('%s{endpoint="%s"} %s' % (name, endpoint, values[index]))
+
+        for collector in collectors:
+            lines.extend(collector())
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,34 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('aldo_safaris.jobs')
+
+
+class BackgroundJobs:
+    # Runs long tasks off the request thread inside an app context.
+    # JOB_WORKERS = 0 runs them inline (useful for development and tests).
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        workers = app.config.get('JOB_WORKERS', 2)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs') if workers else None
+        app.extensions['background_jobs'] = self
+
+    def submit(self, fn, *args, **kwargs):
+        if self._executor is None:
+            self._run(fn, *args, **kwargs)
+            return None
+        return self._executor.submit(self._run, fn, *args, **kwargs)
+
+    def _run(self, fn, *args, **kwargs):
+        with self.app.app_context():
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                logger.exception('Background job %s failed', getattr(fn, '__name__', fn))
+                raise
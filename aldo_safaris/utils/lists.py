@@ -0,0 +1,21 @@
+# Helpers for list-valued fields (destinations, activities) stored as JSON columns and
+# mirrored into association tables for filtering
+
+
+def parse_string_list(value, field):
+    # Returns (list, None) or (None, error message) for a list sent by a client
+    if value is None:
+        return [], None
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        return None, '%s must be a list of strings' % field
+    return value, None
+
+
+def distinct_values(values, max_length=100):
+    # Distinct, non-empty values in their original order, as stored in an association table
+    seen = []
+    for value in values or []:
+        value = (value or '').strip()[:max_length]
+        if value and value not in seen:
+            seen.append(value)
+    return seen
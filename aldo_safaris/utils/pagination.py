@@ -0,0 +1,60 @@
+import base64
+import json
+from datetime import datetime
+
+# Default and maximum page sizes for keyset-paginated listings
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Rows fetched per round trip when streaming from a server-side cursor
+STREAM_BATCH_SIZE = 500
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    # Clamp the requested page size to a sane range
+    if value is None or value == '':
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, maximum)
+
+
+def encode_cursor(*values):
+    # Opaque, URL-safe cursor built from the sort key of the last row served
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    # Reverse of encode_cursor; ISO timestamps are turned back into datetimes
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(payload, list):
+        raise ValueError('Invalid cursor')
+
+    values = []
+    for value in payload:
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                pass
+        values.append(value)
+    return values
+
+
+def stream_json_array(rows, serialize, dumps):
+    # Yield a JSON array one element at a time so the full result never sits in memory
+    yield '['
+    first = True
+    for row in rows:
+        if not first:
+            yield ','
+        yield dumps(serialize(row))
+        first = False
+    yield ']'
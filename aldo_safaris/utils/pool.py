@@ -0,0 +1,143 @@
+import logging
+import os
+import threading
+import time
+import weakref
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger('aldo_safaris.pool')
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool that records how long callers wait for a connection
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.record_wait(time.perf_counter() - started)
+
+    def recreate(self):
+        # Keep the counters when SQLAlchemy rebuilds the pool (dispose, invalidation)
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+
+def pool_metrics(engine):
+    # Prometheus lines describing the engine's pool, for SQLInstrumentation.add_collector
+    def collect():
+        pool = engine.pool
+        lines = []
+        gauges = [
+            ('aldo_db_pool_size', 'Configured pool size', getattr(pool, 'size', lambda: 0)()),
+            ('aldo_db_pool_checked_out', 'Connections currently checked out', getattr(pool, 'checkedout', lambda: 0)()),
+            ('aldo_db_pool_checked_in', 'Idle connections in the pool', getattr(pool, 'checkedin', lambda: 0)()),
+            ('aldo_db_pool_overflow', 'Connections open beyond pool_size', getattr(pool, 'overflow', lambda: 0)()),
+        ]
+        for name, help_text, value in gauges:
+            lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s gauge' % name, '%s %s' % (name, value)]
+
+        stats = getattr(pool, 'stats', None)
+        if stats is not None:
+            counters = [
+                ('aldo_db_pool_checkouts_total', 'counter', 'Connection checkouts', stats.checkouts),
+                ('aldo_db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection', stats.wait_seconds),
+                ('aldo_db_pool_wait_seconds_max', 'gauge', 'Longest wait for a connection', stats.max_wait_seconds),
+                ('aldo_db_pool_timeouts_total', 'counter', 'Checkouts that hit pool_timeout', stats.timeouts),
+            ]
+            for name, kind, help_text, value in counters:
+                lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s %s' % (name, kind), '%s %s' % (name, value)]
+        return lines
+    return collect
+
+
+def warm_up_pool(engine, connections):
+    # Open `connections` connections at once so the pool holds them before traffic arrives
+    if connections <= 0:
+        return 0
+
+    started = time.perf_counter()
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.exec_driver_sql('SELECT 1')
+    finally:
+        for conn in opened:
+            conn.close()
+    logger.info('Warmed up %d database connections in %.1f ms', len(opened),
+                (time.perf_counter() - started) * 1000)
+    return len(opened)
+
+
+# Engines warmed up again in every gunicorn worker forked from this process, with their
+# number of connections; held weakly like _fork_engines below
+_warm_up_engines = weakref.WeakKeyDictionary()
+
+
+def warm_up_pool_per_process(engine, connections):
+    # Warms the pool now, and registers it to be warmed again in every worker forked from this
+    # process: under gunicorn --preload create_app runs in the master and dispose_pool_after_fork
+    # drops its connections in each worker.
+    if connections <= 0:
+        return
+    warm_up_pool(engine, connections)
+    _warm_up_engines[engine] = connections
+
+
+def warm_up_pools_after_fork():
+    # Called by gunicorn's post_fork hook (gunicorn.conf.py), before the worker accepts
+    # connections. A failure is logged and the worker serves anyway, opening connections
+    # on demand as it would without a warm-up.
+    for engine, connections in list(_warm_up_engines.items()):
+        try:
+            warm_up_pool(engine, connections)
+        except Exception:
+            logger.exception('Could not warm up the database pool in worker %d', os.getpid())
+
+
+# Engines whose pools are dropped in forked children. At-fork hooks cannot be removed, so one
+# hook is registered per process and engines are held weakly; building many apps (tests,
+# benchmarks) neither stacks up hooks nor keeps disposed engines alive.
+_fork_engines = weakref.WeakSet()
+_fork_hook_registered = False
+
+
+def _dispose_pools_in_child():
+    for engine in list(_fork_engines):
+        engine.dispose(close=False)
+
+
+def dispose_pool_after_fork(engine):
+    # Connections opened before a gunicorn --preload fork must not be shared with the workers
+    global _fork_hook_registered
+    _fork_engines.add(engine)
+    if not _fork_hook_registered and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_dispose_pools_in_child)
+        _fork_hook_registered = True
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger('aldo_safaris.pubsub')
+
+
+class LocalBroker:
+    # Loopback broker: messages only reach subscribers of this process.
+    # Enough for a single worker, development and tests.
+    def __init__(self):
+        self.deliver = None
+
+    def start(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, message):
+        if self.deliver is not None:
+            self.deliver(message)
+
+
+class RedisBroker:
+    # Fans messages out to every worker through a Redis channel. Any client exposing
+    # publish() and pubsub() works, so tests can pass an in-memory fake.
+    def __init__(self, client, channel='aldo:notifications'):
+        self.client = client
+        self.channel = channel
+        self.deliver = None
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url, channel='aldo:notifications'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('The redis package is required for PUBSUB_BACKEND="redis"')
+        return cls(redis.Redis.from_url(url), channel=channel)
+
+    def start(self, deliver):
+        # The listener thread is started lazily so that it exists in each forked worker
+        self.deliver = deliver
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self.channel)
+            threading.Thread(target=self._listen, args=(pubsub,), name='pubsub', daemon=True).start()
+
+    def publish(self, message):
+        self.client.publish(self.channel, json.dumps(message))
+
+    def _listen(self, pubsub):
+        for item in pubsub.listen():
+            if item.get('type') != 'message':
+                continue
+            try:
+                self.deliver(json.loads(item['data']))
+            except Exception:
+                logger.exception('Dropping malformed pub/sub message')
+
+
+class Subscription:
+    # Events waiting for one connected client
+    def __init__(self, user_id, size):
+        self.user_id = user_id
+        self.events = queue.Queue(maxsize=size)
+        self.overflowed = False
+
+    def put(self, event, data):
+        try:
+            self.events.put_nowait((event, data))
+        except queue.Full:
+            # A client this far behind reconnects and resyncs instead of holding memory
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class NotificationHub:
+    # In-process pub/sub for pushing notification events to connected clients.
+    # PUBSUB_BACKEND selects the broker that carries events between workers.
+    def __init__(self, app=None):
+        self.app = None
+        self.broker = None
+        self.queue_size = 100
+        self.max_subscribers = 1000
+        self._subscribers = {}  # user id (str) -> set of Subscription
+        self._count = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.queue_size = app.config.get('PUSH_QUEUE_SIZE', 100)
+        self.max_subscribers = app.config.get('PUSH_MAX_SUBSCRIBERS', 1000)
+
+        backend = app.config.get('PUBSUB_BACKEND', 'memory')
+        if backend == 'memory':
+            self.broker = LocalBroker()
+        elif backend == 'redis':
+            self.broker = RedisBroker.from_url(app.config['PUBSUB_REDIS_URL'],
+                                               channel=app.config.get('PUBSUB_CHANNEL', 'aldo:notifications'))
+        else:
+            raise ValueError('Unknown PUBSUB_BACKEND %r' % backend)
+        app.extensions['notification_hub'] = self
+
+    def subscribe(self, user_id):
+        # Returns None when this worker already holds PUSH_MAX_SUBSCRIBERS connections
+        self.broker.start(self._deliver)
+        subscription = Subscription(str(user_id), self.queue_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            self._subscribers.setdefault(subscription.user_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is None or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            self._count -= 1
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+
+    def publish(self, user_ids, event, payload):
+        # Call after the commit that made the change visible. The payload is serialized once
+        # with the app's JSON provider, however many users receive it.
+        message = {'users': [str(user_id) for user_id in user_ids], 'event': event,
+                   'data': self.app.json.dumps(payload)}
+        try:
+            self.broker.publish(message)
+        except Exception:
+            # Push is best effort; clients still see the change on their next sync
+            logger.exception('Publishing %s event failed', event)
+
+    def _deliver(self, message):
+        with self._lock:
+            targets = [subscription for user_id in message['users']
+                       for subscription in self._subscribers.get(user_id, ())]
+        for subscription in targets:
+            subscription.put(message['event'], message['data'])
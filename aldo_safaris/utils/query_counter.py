@@ -0,0 +1,28 @@
+from sqlalchemy import event
+
+
+class QueryCounter:
+    # Records every statement an engine executes while the context is active
+    #
+    #     with QueryCounter(db.engine) as counter:
+    #         client.get('/api/v1/payment/1')
+    #     assert counter.count <= 1, counter.statements
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return False
@@ -0,0 +1,44 @@
+import logging
+
+import click
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+logger = logging.getLogger('aldo_safaris.schema')
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def migration_heads(migrate):
+    # Head revisions of migrations/ (reads the scripts, no database access)
+    return set(ScriptDirectory.from_config(migrate.get_config()).get_heads())
+
+
+def database_revisions(engine):
+    # Revisions recorded in alembic_version: a single SELECT
+    with engine.connect() as conn:
+        return set(MigrationContext.configure(conn).get_current_heads())
+
+
+def check_schema_version(app, db, migrate):
+    # Startup check replacing db.create_all(): compare alembic_version with the migration head.
+    # SCHEMA_CHECK is 'warn' (log), 'error' (refuse to start) or 'off'.
+    mode = app.config.get('SCHEMA_CHECK', 'warn')
+    if mode == 'off':
+        return True
+
+    heads = migration_heads(migrate)
+    current = database_revisions(db.engine)
+    if current == heads:
+        return True
+
+    message = ('Database schema is at %s but migrations head is %s; run "flask db upgrade" '
+               '(or "flask create-db" on an empty database)'
+               % (', '.join(sorted(current)) or 'no revision', ', '.join(sorted(heads))))
+    # CLI commands such as "flask db upgrade" must still start so they can fix the schema
+    if mode == 'error' and click.get_current_context(silent=True) is None:
+        raise SchemaOutOfDate(message)
+    logger.warning(message)
+    return False
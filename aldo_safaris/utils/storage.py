@@ -0,0 +1,132 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+
+# Bytes read from an upload per iteration
+CHUNK_SIZE = 64 * 1024
+
+
+def spool_stream(stream, directory):
+    # Copy a stream to a temporary file in `directory` chunk by chunk, hashing it on the way.
+    # Returns (temporary path, sha256 hex digest, size in bytes).
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest(), size
+
+
+class LocalStorage:
+    # Content-addressed files on local disk; keys are "<sha256>.<ext>" style names
+    def __init__(self, root, url):
+        self.root = root
+        self.url_prefix = url.rstrip('/')
+        self.tmp_dir = os.path.join(root, '.tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def local_path(self, key):
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def put_file(self, path, key):
+        # Moves `path` into the store. The rename is atomic, so readers never see a partial
+        # file. Returns False when identical content was already stored.
+        target = self.local_path(key)
+        if os.path.exists(target):
+            os.remove(path)
+            return False
+        os.replace(path, target)
+        return True
+
+    def put_stream(self, stream, extension):
+        path, digest, _ = spool_stream(stream, self.tmp_dir)
+        key = '%s.%s' % (digest, extension)
+        self.put_file(path, key)
+        return key
+
+    def open(self, key):
+        return open(self.local_path(key), 'rb')
+
+    def url(self, key):
+        return self.url_prefix + '/' + key
+
+
+class S3Storage:
+    # Content-addressed objects in an S3-compatible bucket. `client` is a boto3 S3 client or
+    # anything with the same put_object/get_object/list_objects_v2 calls (MinIO works as a
+    # local stand-in through S3_ENDPOINT_URL).
+    def __init__(self, client, bucket, url, tmp_dir=None):
+        self.client = client
+        self.bucket = bucket
+        self.url_prefix = url.rstrip('/')
+        self.tmp_dir = tmp_dir or tempfile.gettempdir()
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError('The boto3 package is required for STORAGE_BACKEND="s3"')
+        client = boto3.client('s3', endpoint_url=config.get('S3_ENDPOINT_URL'))
+        return cls(client, config['S3_BUCKET'], config.get('S3_PUBLIC_URL') or config['UPLOAD_URL'],
+                   tmp_dir=config.get('UPLOAD_TMP_FOLDER'))
+
+    def local_path(self, key):
+        return None
+
+    def exists(self, key):
+        listing = self.client.list_objects_v2(Bucket=self.bucket, Prefix=key, MaxKeys=1)
+        return any(item['Key'] == key for item in listing.get('Contents', []))
+
+    def put_file(self, path, key):
+        try:
+            if self.exists(key):
+                return False
+            content_type = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+            with open(path, 'rb') as body:
+                self.client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type,
+                                       CacheControl='public, max-age=31536000, immutable')
+            return True
+        finally:
+            os.remove(path)
+
+    def put_stream(self, stream, extension):
+        # The digest is the key, so the upload is spooled and hashed before it is sent
+        path, digest, _ = spool_stream(stream, self.tmp_dir)
+        key = '%s.%s' % (digest, extension)
+        self.put_file(path, key)
+        return key
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+
+    def url(self, key):
+        return self.url_prefix + '/' + key
+
+
+def create_storage(app):
+    # STORAGE_BACKEND selects 'local' (UPLOAD_FOLDER) or 's3' (S3_BUCKET)
+    backend = app.config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        storage = LocalStorage(app.config['UPLOAD_FOLDER'], app.config['UPLOAD_URL'])
+    elif backend == 's3':
+        storage = S3Storage.from_config(app.config)
+    else:
+        raise ValueError('Unknown STORAGE_BACKEND %r' % backend)
+    app.extensions['storage'] = storage
+    return storage
@@ -0,0 +1,104 @@
+# Latency of the car availability search and the rental conflict probe
+#
+# Seeds a fleet with back-to-back rental history through benchmarks.fixtures (2000 cars with
+# three years of rentals by default) into the database configured in config.Config, which
+# should be migrated to head. It then times GET /api/v1/car_rental/car/available for random
+# windows in the next three months, and the per-car conflict check create_rental runs under
+# its row lock. Exits non-zero when a p95 is above --target-ms. Seeded rows are removed at
+# the end unless --keep is given:
+#
+#     python -m benchmarks.car_availability
+#     python -m benchmarks.car_availability --cars 5000 --years 5 --target-ms 10
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from aldo_safaris.extensions import db
+from aldo_safaris.init import create_app
+from aldo_safaris.repositories.availability import has_conflict
+from benchmarks import fixtures
+from benchmarks.package_search import percentile
+
+
+def window(dataset, rng):
+    start = datetime.combine(dataset.today, datetime.min.time()) + timedelta(days=rng.randint(1, 90))
+    return start, start + timedelta(days=rng.randint(1, 7))
+
+
+def time_search(client, dataset, rng, repeat):
+    samples, matches = [], []
+    for _ in range(repeat):
+        start, end = window(dataset, rng)
+        started = time.perf_counter()
+        response = client.get('/api/v1/car_rental/car/available?start=%s&end=%s'
+                              % (start.date().isoformat(), end.date().isoformat()))
+        samples.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise SystemExit('car/available failed: %s %s' % (response.status_code, response.get_data(as_text=True)))
+        matches.append(len(response.get_json()))
+    return samples, statistics.mean(matches)
+
+
+def time_conflict(dataset, rng, repeat):
+    samples, conflicts = [], 0
+    for _ in range(repeat):
+        start, end = window(dataset, rng)
+        car_id = fixtures.FIRST_ID + rng.randrange(dataset.cars)
+        started = time.perf_counter()
+        conflicts += bool(has_conflict(car_id, start, end))
+        samples.append((time.perf_counter() - started) * 1000)
+        db.session.rollback()
+    return samples, conflicts / float(repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the car availability search')
+    parser.add_argument('--cars', type=int, default=2000)
+    parser.add_argument('--years', type=float, default=3, help='Rental history per car.')
+    parser.add_argument('--queries', type=int, default=200, help='Requests per measurement.')
+    parser.add_argument('--target-ms', type=float, default=10.0, help='Largest acceptable p95.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keep', action='store_true', help='Leave the seeded cars and rentals in place.')
+    args = parser.parse_args()
+
+    # Only cars and rentals are seeded; rentals are laid out four days apart per car
+    dataset = fixtures.Dataset(scale=0, spares=0)
+    dataset.cars = args.cars
+    dataset.rentals = int(args.cars * args.years * 365 / 4)
+    rng = random.Random(args.seed)
+
+    app = create_app()
+    client = app.test_client()
+    failures = 0
+    with app.app_context():
+        fixtures.cleanup()
+        try:
+            started = time.perf_counter()
+            fixtures.seed_cars(dataset, rng, fixtures.BulkWriter(5000))
+            print('%d cars, %d rentals (seeded in %.1f s)' % (
+                dataset.cars, dataset.rentals, time.perf_counter() - started))
+
+            print('  %-18s %10s %8s %8s %8s %8s' % ('measurement', 'result', 'p50 ms', 'p95 ms', 'p99 ms', 'mean ms'))
+            for name, (samples, result) in (
+                    ('car/available', time_search(client, dataset, rng, args.queries)),
+                    ('rental conflict', time_conflict(dataset, rng, args.queries))):
+                p95 = percentile(samples, 95)
+                status = 'ok' if p95 <= args.target_ms else 'SLOW (target %.0f ms)' % args.target_ms
+                failures += p95 > args.target_ms
+                print('  %-18s %10.2f %8.1f %8.1f %8.1f %8.1f  %s' % (
+                    name, result, percentile(samples, 50), p95, percentile(samples, 99),
+                    statistics.mean(samples), status))
+            print('  (result: mean cars returned by the search, share of probes that found a conflict)')
+        finally:
+            db.session.rollback()
+            if not args.keep:
+                fixtures.cleanup()
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+# Worker cold-start time: how long create_app() takes in a fresh interpreter
+#
+# Each run starts a new Python process, imports the app and builds it, as a gunicorn worker
+# does on boot. --create-all adds the db.create_all() call that create_app used to make, for
+# a before/after comparison. Runs against the database configured in config.Config:
+#
+#     python -m benchmarks.cold_start --runs 10
+#     python -m benchmarks.cold_start --runs 10 --create-all
+import argparse
+import statistics
+import subprocess
+import sys
+
+WORKER = '''
+import time
+started = time.perf_counter()
+from aldo_safaris.init import create_app
+app = create_app()
+if %(create_all)r:
+    from aldo_safaris.extensions import db
+    with app.app_context():
+        db.create_all()
+print((time.perf_counter() - started) * 1000)
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure create_app() cold-start time')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--create-all', action='store_true',
+                        help='also run db.create_all() as the old startup path did')
+    args = parser.parse_args()
+
+    code = WORKER % {'create_all': args.create_all}
+    timings = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True)
+        timings.append(float(output.stdout.strip().splitlines()[-1]))
+
+    timings.sort()
+    print('startup path:  %s' % ('create_app + db.create_all' if args.create_all else 'create_app'))
+    print('runs:          %d' % len(timings))
+    print('median:        %.1f ms' % statistics.median(timings))
+    print('min / max:     %.1f / %.1f ms' % (timings[0], timings[-1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+# Latency, throughput, SQL statements and memory of every API endpoint
+#
+# Seeds the synthetic data set from benchmarks.fixtures, then sends each endpoint in ENDPOINTS
+# a stream of requests with varying ids, first through the Flask test client (one request at
+# a time, no network) and then through a local threaded WSGI server (--concurrency clients
+# over HTTP). For every endpoint and target it reports p50/p95/p99 latency, requests per
+# second, SQL statements per request and the peak RSS of the process so far. Results can be
+# saved as a baseline and later runs compared against it; the run exits non-zero when an
+# endpoint got slower than --tolerance allows, issues more statements or answers a different
+# share of its requests with errors. A baseline is only saved when every request got a 2xx
+# answer. Use a dedicated database migrated to head:
+#
+#     python -m benchmarks.endpoints --scale 0.1 --save-baseline   # on the base branch
+#     python -m benchmarks.endpoints --scale 0.1                   # on the change, compares
+#     python -m benchmarks.endpoints --skip-seed --keep --only 'booking\.' --targets client
+#
+# Not covered: the SSE stream and broadcasts (long-lived / background work) and the media
+# endpoint (see benchmarks.image_serving).
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlencode
+
+from flask_jwt_extended import create_access_token, create_refresh_token
+from werkzeug.serving import make_server
+
+from aldo_safaris.extensions import db
+from aldo_safaris.init import create_app
+from aldo_safaris.utils.query_counter import QueryCounter
+from benchmarks import fixtures
+from benchmarks.package_search import percentile
+
+try:
+    import resource
+except ImportError:  # Windows; peak RSS is not reported there
+    resource = None
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'endpoints_baseline.json')
+
+BOOKING = {'package_id': '{package_id}', 'user_id': '{user_id}', 'travel_start_date': '{future_start}',
+           'travel_end_date': '{future_end}', 'total_cost': '{amount}', 'destination': '{destination}',
+           'activities': ['Game drive', 'Birding'], 'booking_source': 'web'}
+PACKAGE = {'package_name': 'Benchmark {word} safari', 'description': 'Benchmark package with a {word}',
+           'destinations': ['{destination}'], 'activities': ['Hiking'], 'inclusions': 'Park fees',
+           'price': '{amount}', 'duration': 5}
+
+# (name, anchor, auth, method, path, request kwargs)
+# anchor picks the row the request is about (see fixtures.Dataset.sample; spare_* rows are
+# consumed by deletes and rentals), auth is the token sent: None, 'access' or 'refresh'. {placeholders}
+# in the path and kwargs are filled from the sampled ids.
+ENDPOINTS = [
+    ('customer.register', 'new_user', None, 'post', '/api/v1/customer/register',
+     {'json': {'user_name': 'bench-new-{seq}', 'email': 'bench-new-{seq}@example.com', 'contact': '{contact}',
+               'password': fixtures.PASSWORD}}),
+    ('customer.login', 'user', None, 'post', '/api/v1/customer/login',
+     {'json': {'email': '{email}', 'password': fixtures.PASSWORD}}),
+    ('customer.refresh', 'user', 'refresh', 'post', '/api/v1/customer/refresh', {}),
+    ('customer.edit', 'user', 'access', 'put', '/api/v1/customer/edit/{user_id}', {'json': {}}),
+    ('customer.delete', 'spare_user', 'access', 'delete', '/api/v1/customer/delete/{user_id}', {}),
+
+    ('booking.register', 'user', 'access', 'post', '/api/v1/booking/register', {'json': BOOKING}),
+    ('booking.bulk', 'user', 'access', 'post', '/api/v1/booking/bulk', {'json': [BOOKING] * 20}),
+    ('booking.get', 'booking', 'access', 'get', '/api/v1/booking/{booking_id}', {}),
+    ('booking.update', 'booking', 'access', 'put', '/api/v1/booking/{booking_id}', {'json': {'total_cost': '{amount}'}}),
+    ('booking.delete', 'spare_booking', 'access', 'delete', '/api/v1/booking/{booking_id}', {}),
+    ('booking.user_bookings', 'user', 'access', 'get', '/api/v1/booking/user_bookings?limit=50', {}),
+    ('booking.user_bookings_stream', 'user', 'access', 'get', '/api/v1/booking/user_bookings?stream=true', {}),
+
+    ('payment.create', 'booking', 'access', 'post', '/api/v1/payment/',
+     {'json': {'booking_id': '{booking_id}', 'amount': '{amount}', 'payment_method': 'card', 'status': 'completed'}}),
+    ('payment.get', 'payment', 'access', 'get', '/api/v1/payment/{payment_id}', {}),
+    ('payment.update', 'payment', 'access', 'put', '/api/v1/payment/{payment_id}', {'json': {'status': 'completed'}}),
+    ('payment.delete', 'spare_payment', 'access', 'delete', '/api/v1/payment/{payment_id}', {}),
+    ('payment.list_for_booking', 'booking', 'access', 'get', '/api/v1/payment/booking/{booking_id}', {}),
+
+    ('notification.create', 'user', 'access', 'post', '/api/v1/notification/',
+     {'json': {'recipient_id': '{user_id}', 'message': 'Benchmark message {seq}'}}),
+    ('notification.get', 'notification', 'access', 'get', '/api/v1/notification/{notification_id}', {}),
+    ('notification.update', 'notification', 'access', 'put', '/api/v1/notification/{notification_id}',
+     {'json': {'status': 'read'}}),
+    ('notification.delete', 'spare_notification', 'access', 'delete', '/api/v1/notification/{notification_id}', {}),
+    ('notification.user_notifications', 'user', 'access', 'get', '/api/v1/notification/user_notifications', {}),
+    ('notification.sync', 'user', 'access', 'get', '/api/v1/notification/sync?since=0&limit=50', {}),
+    ('notification.unread_count', 'user', 'access', 'get', '/api/v1/notification/unread_count', {}),
+    ('notification.mark_all_read', 'user', 'access', 'post', '/api/v1/notification/mark_all_read', {}),
+
+    ('car_rental.create_car', 'user', 'access', 'post', '/api/v1/car_rental/car',
+     {'data': {'make': 'Toyota', 'model': 'Land Cruiser', 'year': '2022', 'price_per_day': '{price}'}}),
+    ('car_rental.update_car', 'user', 'access', 'put', '/api/v1/car_rental/car/{car_id}',
+     {'data': {'price_per_day': '{price}'}}),
+    ('car_rental.create_rental', 'spare_rental', 'access', 'post', '/api/v1/car_rental/rental',
+     {'data': {'car_id': '{car_id}', 'start_date': '{rental_start}', 'end_date': '{rental_end}'}}),
+    ('car_rental.available', None, None, 'get',
+     '/api/v1/car_rental/car/available?start={future_start}&end={future_end}', {}),
+
+    ('travel_package.list', None, None, 'get', '/api/v1/travel_package/', {}),
+    ('travel_package.get', 'user', 'access', 'get', '/api/v1/travel_package/{package_id}', {}),
+    ('travel_package.search', None, None, 'get', '/api/v1/travel_package/search?q={word}&destination={destination}', {}),
+    ('travel_package.create', 'user', 'access', 'post', '/api/v1/travel_package/', {'json': PACKAGE}),
+    ('travel_package.update', 'user', 'access', 'put', '/api/v1/travel_package/{package_id}',
+     {'json': {'price': '{amount}'}}),
+    ('travel_package.delete', 'spare_package', 'access', 'delete', '/api/v1/travel_package/{package_id}', {}),
+
+    ('analytics.bookings', 'admin', 'access', 'get',
+     '/api/v1/analytics/bookings?start={month_start}&group_by=destination,booking_source', {}),
+    ('analytics.payments', 'admin', 'access', 'get', '/api/v1/analytics/payments?group_by=day,payment_method', {}),
+    ('export.bookings_day', 'admin', 'access', 'get',
+     '/api/v1/export/bookings?format=ndjson&include=package,user&start={day}&end={day}', {}),
+]
+
+
+def fill(value, ids):
+    # A string that is exactly one placeholder keeps the type of the sampled value
+    if isinstance(value, str):
+        match = re.fullmatch(r'\{(\w+)\}', value)
+        return ids[match.group(1)] if match else value.format(**ids)
+    if isinstance(value, dict):
+        return {key: fill(item, ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, ids) for item in value]
+    return value
+
+
+class RequestFactory:
+    # Builds (method, path, kwargs, headers) for each request; needs an app context for tokens
+    def __init__(self, dataset, seed):
+        self.dataset = dataset
+        self.rng = random.Random(seed)
+        # Unique per run, so repeated runs against kept data do not collide on email / contact
+        self.seq = itertools.count(int(time.time() * 10) % 10 ** 8)
+        self.tokens = {}
+
+    def token(self, user_id, auth):
+        key = (user_id, auth)
+        if key not in self.tokens:
+            create = create_refresh_token if auth == 'refresh' else create_access_token
+            self.tokens[key] = create(identity=str(user_id))
+        return self.tokens[key]
+
+    def build(self, endpoint):
+        name, anchor, auth, method, path, kwargs = endpoint
+        ids = self.dataset.sample(anchor, self.rng)
+        ids['seq'] = next(self.seq)
+        ids['contact'] = 1000000000 + ids['seq'] % 10 ** 9
+        headers = {'Authorization': 'Bearer ' + self.token(ids['user_id'], auth)} if auth else {}
+        path = path.format(**{key: quote(str(value)) for key, value in ids.items()})
+        return method, path, fill(kwargs, ids), headers
+
+
+def test_client_sender(app):
+    client = app.test_client()
+
+    def send(method, path, kwargs, headers):
+        response = getattr(client, method)(path, headers=headers, **kwargs)
+        response.get_data()  # drains streamed bodies
+        response.close()
+        return response.status_code
+    return send
+
+
+def http_sender(port):
+    def send(method, path, kwargs, headers):
+        headers = dict(headers)
+        body = None
+        if 'json' in kwargs:
+            body = json.dumps(kwargs['json'])
+            headers['Content-Type'] = 'application/json'
+        elif 'data' in kwargs:
+            body = urlencode(kwargs['data'])
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        try:
+            conn.request(method.upper(), path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+    return send
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0  # bytes on macOS, KB on Linux
+
+
+def measure(send, requests, concurrency):
+    # Returns (latencies in ms, status counts, wall seconds, SQL statements)
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(request):
+        started = time.perf_counter()
+        try:
+            status = send(*request)
+        except Exception as e:
+            # Counted under the exception name, e.g. ConnectionResetError
+            status = type(e).__name__
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    with QueryCounter(db.engine) as counter:
+        started = time.perf_counter()
+        if concurrency <= 1:
+            for request in requests:
+                one(request)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(one, requests))
+        wall = time.perf_counter() - started
+    return latencies, statuses, wall, counter.count
+
+
+def run_target(target, send, factory, endpoints, args):
+    results = {}
+    concurrency = args.concurrency if target == 'server' else 1
+    for endpoint in endpoints:
+        name = endpoint[0]
+        try:
+            requests = [factory.build(endpoint) for _ in range(args.warmup + args.requests)]
+        except IndexError as e:
+            print('  %-36s skipped: %s' % (name, e))
+            continue
+        measure(send, requests[:args.warmup], concurrency)
+        latencies, statuses, wall, statements = measure(send, requests[args.warmup:], concurrency)
+
+        result = {
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'mean': round(statistics.mean(latencies), 2),
+            'throughput': round(len(latencies) / wall, 1),
+            'queries': round(statements / float(len(latencies)), 2),
+            'peak_rss_mb': peak_rss_mb(),
+            'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        }
+        results['%s:%s' % (target, name)] = result
+        print('  %-36s %8.1f %8.1f %8.1f %9.1f %8.2f %9s  %s' % (
+            name, result['p50'], result['p95'], result['p99'], result['throughput'], result['queries'],
+            '%.0f' % result['peak_rss_mb'] if result['peak_rss_mb'] is not None else 'n/a',
+            ' '.join('%s:%d' % item for item in result['statuses'].items())))
+    return results
+
+
+def error_share(statuses):
+    # Share of the requests not answered with a 2xx; exceptions count as errors
+    total = sum(statuses.values())
+    errors = sum(count for status, count in statuses.items() if not str(status).startswith('2'))
+    return errors / float(total) if total else 0.0
+
+
+def compare(results, baseline, tolerance):
+    # Prints the change against the baseline; returns the number of regressions. An endpoint
+    # whose share of non-2xx answers changed is one too: an error path is usually quicker
+    # than the endpoint, so a change that breaks it must not look like a speed-up.
+    regressions = 0
+    print('\nCompared with the baseline (tolerance %d%% on p95 and throughput):' % (tolerance * 100))
+    for key, result in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            print('  %-45s no baseline' % key)
+            continue
+        problems = []
+        if result['p95'] > base['p95'] * (1 + tolerance):
+            problems.append('p95 %.1f -> %.1f ms' % (base['p95'], result['p95']))
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            problems.append('throughput %.1f -> %.1f/s' % (base['throughput'], result['throughput']))
+        if result['queries'] > base['queries']:
+            problems.append('queries %.2f -> %.2f' % (base['queries'], result['queries']))
+        errors, base_errors = error_share(result['statuses']), error_share(base.get('statuses', {}))
+        if abs(errors - base_errors) > 0.01:
+            problems.append('non-2xx %.0f%% -> %.0f%%' % (base_errors * 100, errors * 100))
+        regressions += bool(problems)
+        print('  %-45s p95 %+6.1f%%  throughput %+6.1f%%  %s' % (
+            key, (result['p95'] / base['p95'] - 1) * 100 if base['p95'] else 0,
+            (result['throughput'] / base['throughput'] - 1) * 100 if base['throughput'] else 0,
+            'REGRESSION: ' + ', '.join(problems) if problems else 'ok'))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every API endpoint against a synthetic data set')
+    parser.add_argument('--scale', type=float, default=1.0, help='Data set size, see benchmarks.fixtures.')
+    parser.add_argument('--spares', type=int, default=1000, help='Rows per table reserved for delete endpoints.')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint and target.')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests sent first.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Client threads against the WSGI server.')
+    parser.add_argument('--targets', nargs='+', choices=['client', 'server'], default=['client', 'server'])
+    parser.add_argument('--only', help='Regular expression selecting endpoint names.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-seed', action='store_true',
+                        help='Reuse data left by a --keep run (same --scale); delete endpoints are skipped.')
+    parser.add_argument('--keep', action='store_true', help='Leave the seeded data in the database.')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--output', help='Also write the results of this run to a JSON file.')
+    args = parser.parse_args()
+
+    endpoints = [endpoint for endpoint in ENDPOINTS if not args.only or re.search(args.only, endpoint[0])]
+    if args.skip_seed:
+        endpoints = [endpoint for endpoint in endpoints if not (endpoint[1] or '').startswith('spare_')]
+    if (args.requests + args.warmup) * len(args.targets) > args.spares:
+        parser.error('--spares must cover --requests + --warmup for each target')
+
+    dataset = fixtures.Dataset(args.scale, args.spares)
+    app = create_app()
+    app.config['ADMIN_USER_IDS'] = list(app.config.get('ADMIN_USER_IDS', [])) + [dataset.admin_id]
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    results = {}
+    with app.app_context():
+        if not args.skip_seed:
+            fixtures.cleanup()
+            fixtures.seed(dataset, args.seed)
+        factory = RequestFactory(dataset, args.seed)
+        try:
+            for target in args.targets:
+                print('\n%s (%s)' % (target, 'Flask test client' if target == 'client'
+                                     else 'threaded WSGI server, %d clients' % args.concurrency))
+                print('  %-36s %8s %8s %8s %9s %8s %9s  %s' % (
+                    'endpoint', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'queries', 'RSS MB', 'statuses'))
+                if target == 'client':
+                    results.update(run_target(target, test_client_sender(app), factory, endpoints, args))
+                    continue
+                server = make_server('127.0.0.1', 0, app, threaded=True)
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                try:
+                    results.update(run_target(target, http_sender(server.server_port), factory, endpoints, args))
+                finally:
+                    server.shutdown()
+        finally:
+            db.session.rollback()
+            if not args.keep:
+                fixtures.cleanup()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    failing = sorted(key for key, result in results.items() if error_share(result['statuses']))
+    if failing:
+        print('\nEndpoints with non-2xx answers: %s' % ', '.join(failing))
+
+    if args.save_baseline:
+        if failing:
+            print('Not writing a baseline that times failing requests')
+            return 1
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('\nBaseline written to %s' % args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('\nNo baseline at %s; run with --save-baseline to create one' % args.baseline)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    return 1 if compare(results, baseline, args.tolerance) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
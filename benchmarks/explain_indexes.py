@@ -0,0 +1,132 @@
+# EXPLAIN check for the controllers' hot queries
+#
+# Seeds the synthetic data set from benchmarks.fixtures (on near-empty tables MySQL scans
+# instead of using an index), refreshes the table statistics and runs EXPLAIN on each query
+# with ids of seeded rows. A query passes only when the plan's key is one of the indexes
+# added for it and no step of the plan is "Using filesort"; exits non-zero otherwise. Use a
+# dedicated MySQL database migrated to head:
+#
+#     python -m benchmarks.explain_indexes
+#     python -m benchmarks.explain_indexes --scale 0.1 --keep
+#     python -m benchmarks.explain_indexes --skip-seed --scale 0.1   # data already seeded
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, or_
+
+from aldo_safaris.controllers.booking_controller import user_bookings_query
+from aldo_safaris.extensions import db
+from aldo_safaris.init import create_app
+from aldo_safaris.models.car_hiring import Rental
+from aldo_safaris.models.notifications import Notification
+from aldo_safaris.models.payments import Payment
+from aldo_safaris.models.user_accounts import User
+from aldo_safaris.repositories.availability import overlaps
+from benchmarks import fixtures
+
+def queries(dataset):
+    # (name, statement, table alias as shown by EXPLAIN, indexes that satisfy it). The public
+    # catalogue (availability = 1) is not checked: it returns most of the table, so a scan is
+    # the right plan for it, and it is answered from the response cache anyway.
+    user = dataset.user_ids(1)
+    booking = dataset.booking_ids(1)
+    start = datetime.combine(dataset.today, datetime.min.time()) + timedelta(days=7)
+    return [
+        ('booking.user_bookings', user_bookings_query(user['user_id']).limit(51),
+         'Booking', {'ix_booking_user_id_date_of_booking'}),
+        ('booking.user_bookings_after',
+         user_bookings_query(user['user_id'], (start, booking['booking_id'])).limit(51),
+         'Booking', {'ix_booking_user_id_date_of_booking'}),
+        ('booking.user_bookings_undated',
+         user_bookings_query(user['user_id'], (None, booking['booking_id'])).limit(51),
+         'Booking', {'ix_booking_user_id_date_of_booking'}),
+        ('payment.list_for_booking',
+         select(Payment).where(Payment.booking_id == booking['booking_id']),
+         'payments', {'ix_payments_booking_id'}),
+        ('notification.user_notifications',
+         select(Notification).where(Notification.recipient_id == user['user_id']),
+         'notifications', {'ix_notifications_recipient_id_status_created_at'}),
+        ('notification.unread',
+         select(Notification).where(Notification.recipient_id == user['user_id'], Notification.status == 'unread')
+         .order_by(Notification.created_at),
+         'notifications', {'ix_notifications_recipient_id_status_created_at'}),
+        ('car_rental.rental_conflict',
+         select(Rental.id).where(Rental.car_id == fixtures.FIRST_ID, overlaps(start, start + timedelta(days=7))),
+         'rentals', {'ix_rentals_car_id_end_date_start_date'}),
+        ('customer.login', select(User).where(User.email == user['email']),
+         'user', {'email'}),
+        ('customer.register_conflict',
+         select(User.email, User.contact).where(or_(User.email == user['email'], User.contact == 800000001)),
+         'user', {'email', 'contact'}),
+    ]
+
+
+def explain(statement):
+    sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    with db.engine.connect() as conn:
+        result = conn.exec_driver_sql('EXPLAIN ' + sql)
+        return [dict(zip(result.keys(), row)) for row in result]
+
+
+def analyze(tables):
+    # Fresh statistics, so the optimizer sees the seeded row counts
+    with db.engine.connect() as conn:
+        for table in sorted(tables):
+            conn.exec_driver_sql('ANALYZE TABLE `%s`' % table).fetchall()
+
+
+def check(name, rows, table, expected):
+    # Returns True when the plan reads `table` through one of the expected indexes and sorts nothing
+    # itself: a filesort means the index does not give the ORDER BY, so every matching row is read
+    filesort = any('Using filesort' in (row.get('Extra') or '') for row in rows)
+    rows = [row for row in rows if row.get('table') == table]
+    if not rows:
+        print('%-34s FAIL  table %s missing from plan' % (name, table))
+        return False
+
+    row = rows[0]
+    used = set((row.get('key') or '').split(','))
+    if not used & expected:
+        print('%-34s FAIL  key=%s possible_keys=%s type=%s rows=%s, expected %s' % (
+            name, row.get('key'), row.get('possible_keys'), row.get('type'), row.get('rows'), ', '.join(sorted(expected))))
+        return False
+    if filesort:
+        print('%-34s FAIL  key=%s type=%s rows=%s, but Using filesort' % (
+            name, row.get('key'), row.get('type'), row.get('rows')))
+        return False
+    print('%-34s ok    key=%s type=%s rows=%s' % (name, row.get('key'), row.get('type'), row.get('rows')))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that the hot queries use their indexes')
+    parser.add_argument('--scale', type=float, default=0.01, help='Size of the seeded data set (see benchmarks.fixtures).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-seed', action='store_true', help='Use data already seeded by benchmarks.fixtures.')
+    parser.add_argument('--keep', action='store_true', help='Leave the seeded data in place.')
+    args = parser.parse_args()
+
+    dataset = fixtures.Dataset(args.scale, spares=0)
+    app = create_app()
+    failures = 0
+    with app.app_context():
+        if not args.skip_seed:
+            fixtures.cleanup()
+            fixtures.seed(dataset, args.seed)
+        try:
+            checks = queries(dataset)
+            analyze({table for _, _, table, _ in checks})
+            for name, statement, table, expected in checks:
+                if not check(name, explain(statement), table, expected):
+                    failures += 1
+        finally:
+            db.session.rollback()
+            if not args.skip_seed and not args.keep:
+                fixtures.cleanup()
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
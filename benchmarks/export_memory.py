@@ -0,0 +1,82 @@
+# Memory use of the streamed bookings and payments exports
+#
+# Seeds the synthetic data set from benchmarks.fixtures into the database configured in
+# config.Config, which should be migrated to head, then runs each export the way
+# GET /api/v1/export/<kind> does (stream_export into export_chunks) and discards the output.
+# Reports rows, output size, time and the peak Python allocation while exporting, measured
+# with tracemalloc. Compare two --scale values: the peak should not grow with the export.
+# Seeded rows are removed at the end unless --keep is given:
+#
+#     python -m benchmarks.export_memory --scale 0.02
+#     python -m benchmarks.export_memory --scale 0.2 --formats csv --include package,user
+import argparse
+import sys
+import time
+import tracemalloc
+
+from aldo_safaris.extensions import db
+from aldo_safaris.init import create_app
+from aldo_safaris.repositories.exports import EXPORT_INCLUDES, EXPORT_KINDS, stream_export
+from aldo_safaris.utils.exports import EXPORT_FORMATS, export_chunks
+from benchmarks import fixtures
+
+
+def run_export(kind, fmt, include):
+    # Returns (rows, characters written, seconds, peak MB allocated while exporting)
+    counted = [0]
+
+    def counting(rows):
+        for row in rows:
+            counted[0] += 1
+            yield row
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        columns, rows = stream_export(kind, include=include)
+        size = sum(len(chunk) for chunk in export_chunks(fmt, columns, counting(rows)))
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        db.session.rollback()
+    return counted[0], size, elapsed, peak / (1024.0 * 1024.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure memory use of the streamed exports')
+    parser.add_argument('--scale', type=float, default=0.02, help='Data set size, see benchmarks.fixtures.')
+    parser.add_argument('--kinds', nargs='+', choices=EXPORT_KINDS, default=list(EXPORT_KINDS))
+    parser.add_argument('--formats', nargs='+', choices=sorted(EXPORT_FORMATS), default=sorted(EXPORT_FORMATS))
+    parser.add_argument('--include', default='', help='Comma-separated: %s.' % ', '.join(sorted(EXPORT_INCLUDES)))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-seed', action='store_true', help='Reuse data left by a --keep run.')
+    parser.add_argument('--keep', action='store_true', help='Leave the seeded data in the database.')
+    args = parser.parse_args()
+    include = tuple(name for name in args.include.split(',') if name)
+    unknown = set(include) - set(EXPORT_INCLUDES)
+    if unknown:
+        parser.error('unknown --include: %s' % ', '.join(sorted(unknown)))
+
+    app = create_app()
+    with app.app_context():
+        if not args.skip_seed:
+            fixtures.cleanup()
+            fixtures.seed(fixtures.Dataset(args.scale, spares=0), args.seed)
+        try:
+            print('  %-9s %-7s %10s %10s %8s %12s' % ('export', 'format', 'rows', 'MB out', 's', 'peak MB'))
+            for kind in args.kinds:
+                for fmt in args.formats:
+                    rows, size, elapsed, peak = run_export(kind, fmt, include)
+                    print('  %-9s %-7s %10d %10.1f %8.1f %12.2f' % (
+                        kind, fmt, rows, size / (1024.0 * 1024.0), elapsed, peak))
+            print('  (peak MB: largest Python allocation while the export ran, from tracemalloc)')
+        finally:
+            db.session.rollback()
+            if not args.keep:
+                fixtures.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
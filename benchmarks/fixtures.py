@@ -0,0 +1,357 @@
+# Synthetic data for the endpoint benchmarks (benchmarks.endpoints)
+#
+# Generates users, travel packages, bookings with their payments, notifications, cars and
+# rental history with executemany INSERTs, together with the rows the write paths would
+# normally maintain (payment totals, booking_activities, unread counters, the notification
+# change log, the package search index and the analytics rollups). At --scale 1 that is
+# 100k users, 1M bookings, 2M payments, 1M notifications and 500 cars with 200k rentals.
+#
+# Related rows are laid out arithmetically (booking b belongs to user b % active users,
+# payment p to booking p // 2, ...) so the benchmark can pick consistent ids without
+# querying. Seeded ids start at FIRST_ID and are removed by id range, together with anything
+# the benchmark created after them. Use a dedicated database migrated to head:
+#
+#     python -m benchmarks.fixtures --scale 0.1
+#     python -m benchmarks.fixtures --cleanup
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert, delete, select, func
+
+from aldo_safaris.extensions import db, hasher
+from aldo_safaris.init import create_app
+from aldo_safaris.models.booking import Booking
+from aldo_safaris.models.booking_activities import BookingActivity
+from aldo_safaris.models.car_hiring import Car, Rental
+from aldo_safaris.models.notification_changes import NotificationChange
+from aldo_safaris.models.notification_counters import NotificationCounter
+from aldo_safaris.models.notifications import Notification
+from aldo_safaris.models.payments import Payment
+from aldo_safaris.models.user_accounts import User
+from aldo_safaris.repositories.analytics import rebuild_rollups
+from aldo_safaris.repositories.payment_totals import PAID_STATUSES, payment_status_for
+from benchmarks import package_search
+from benchmarks.package_search import ACTIVITIES, DESTINATIONS, WORDS
+
+# Seeded users, bookings, payments, notifications, cars and rentals get ids from here up.
+# Travel packages use package_search.FIRST_ID, so both benchmarks share one cleanup.
+FIRST_ID = 20000000
+
+# Row counts at --scale 1
+SIZES = {
+    'users': 100000,
+    'packages': 2000,
+    'bookings': 1000000,
+    'notifications': 1000000,
+    'cars': 500,
+    'rentals': 200000,
+}
+PAYMENTS_PER_BOOKING = 2
+
+# Password of every seeded user
+PASSWORD = 'benchmark-password'
+
+ACCOMMODATION = ['Lodge', 'Tented camp', 'Hotel', 'Guest house', 'Eco lodge']
+TRANSPORTATION = ['4x4 safari vehicle', 'Minibus', 'Domestic flight', 'Private car']
+BOOKING_SOURCES = ['web', 'mobile', 'agent', 'phone']
+BOOKING_STATUSES = ['confirmed', 'confirmed', 'confirmed', 'pending', 'cancelled']
+PAYMENT_METHODS = ['card', 'mpesa', 'airtel_money', 'bank_transfer', 'cash']
+CARS = [('Toyota', 'Land Cruiser'), ('Toyota', 'RAV4'), ('Nissan', 'Patrol'), ('Land Rover', 'Defender'),
+        ('Toyota', 'Hiace'), ('Mitsubishi', 'Pajero'), ('Subaru', 'Forester'), ('Suzuki', 'Jimny')]
+
+# Days of booking history, ending today
+HISTORY_DAYS = 730
+
+
+class Dataset:
+    # Sizes of one seeded dataset and the id arithmetic that relates its rows. The last
+    # `spares` users, bookings, payments, notifications and packages are kept out of reads
+    # and handed out one at a time to endpoints that delete rows.
+    def __init__(self, scale=1.0, spares=1000):
+        self.spares = spares
+        self.users = max(int(SIZES['users'] * scale), spares + 100)
+        self.packages = max(int(SIZES['packages'] * scale), 2 * spares + 10)
+        self.bookings = max(int(SIZES['bookings'] * scale), 3 * spares + 100)
+        self.notifications = max(int(SIZES['notifications'] * scale), spares + 100)
+        self.cars = max(int(SIZES['cars'] * scale), 20)
+        self.rentals = max(int(SIZES['rentals'] * scale), self.cars)
+        self.active_users = self.users - spares  # spare users own no rows
+        self.live_packages = self.packages - spares
+        self.live_bookings = self.bookings - 2 * spares
+        self.live_notifications = self.notifications - spares
+        self.today = date.today()
+        self._taken = {}
+
+    def __repr__(self):
+        return '%d users, %d packages, %d bookings, %d payments, %d notifications, %d cars, %d rentals' % (
+            self.users, self.packages, self.bookings, self.bookings * PAYMENTS_PER_BOOKING,
+            self.notifications, self.cars, self.rentals)
+
+    @property
+    def admin_id(self):
+        return FIRST_ID
+
+    @property
+    def available_cars(self):
+        # The first 95% of the cars; the rest are marked unavailable
+        return self.cars - self.cars // 20
+
+    def user_ids(self, u):
+        return {'user_id': FIRST_ID + u, 'email': 'bench%d@example.com' % u}
+
+    def booking_ids(self, b):
+        return dict(self.user_ids(b % self.active_users), booking_id=FIRST_ID + b)
+
+    def payment_ids(self, p):
+        return dict(self.booking_ids(p // PAYMENTS_PER_BOOKING), payment_id=FIRST_ID + p)
+
+    def notification_ids(self, n):
+        return dict(self.user_ids(n % self.active_users), notification_id=FIRST_ID + n)
+
+    def package_id(self, i):
+        return package_search.FIRST_ID + i
+
+    def sample(self, anchor, rng):
+        # Ids for one request: the anchor row, the user that owns it and some random values
+        future_start = self.today + timedelta(days=rng.randint(1, 90))
+        ids = {
+            'amount': round(rng.uniform(50, 2000), 2),
+            'price': round(rng.uniform(40, 250), 2),
+            'package_id': self.package_id(rng.randrange(self.live_packages)),
+            'car_id': FIRST_ID + rng.randrange(self.cars),
+            'destination': rng.choice(DESTINATIONS),
+            'word': rng.choice(WORDS),
+            'day': (self.today - timedelta(days=rng.randrange(HISTORY_DAYS))).isoformat(),
+            'month_start': (self.today - timedelta(days=30)).isoformat(),
+            'future_start': future_start.isoformat(),
+            'future_end': (future_start + timedelta(days=rng.randint(1, 7))).isoformat(),
+        }
+        if anchor in ('user', 'admin'):
+            ids.update(self.user_ids(0 if anchor == 'admin' else rng.randrange(self.active_users)))
+        elif anchor == 'booking':
+            ids.update(self.booking_ids(rng.randrange(self.live_bookings)))
+        elif anchor == 'payment':
+            ids.update(self.payment_ids(rng.randrange(self.live_bookings * PAYMENTS_PER_BOOKING)))
+        elif anchor == 'notification':
+            ids.update(self.notification_ids(rng.randrange(self.live_notifications)))
+        elif anchor is not None:
+            ids.update(self.take(anchor))
+        return ids
+
+    def take(self, kind):
+        # Next unused spare row of a kind; raises IndexError when they are used up
+        k = self._taken.get(kind, 0)
+        self._taken[kind] = k + 1
+        if kind == 'spare_booking' and k < self.spares:
+            return self.booking_ids(self.live_bookings + k)
+        if kind == 'spare_payment' and k < self.spares * PAYMENTS_PER_BOOKING:
+            # Payments of the last `spares` bookings, which are never deleted themselves
+            return self.payment_ids((self.bookings - self.spares) * PAYMENTS_PER_BOOKING + k)
+        if kind == 'spare_notification' and k < self.spares:
+            return self.notification_ids(self.live_notifications + k)
+        if kind == 'spare_user' and k < self.spares:
+            return self.user_ids(self.active_users + k)
+        if kind == 'spare_package' and k < self.spares:
+            return dict(self.user_ids(0), package_id=self.package_id(self.live_packages + k))
+        if kind == 'spare_rental' and k < self.spares:
+            # A one-day window of an available car a year ahead, after the seeded history;
+            # successive windows move through the fleet and then two days on
+            start = self.today + timedelta(days=365 + 2 * (k // self.available_cars))
+            return dict(self.user_ids(0), car_id=FIRST_ID + k % self.available_cars,
+                        rental_start=start.isoformat(), rental_end=(start + timedelta(days=1)).isoformat())
+        if kind == 'new_user':
+            return {}
+        raise IndexError('No spare rows left for %s' % kind)
+
+
+class BulkWriter:
+    # Buffers rows per model and writes them with one executemany INSERT per model, in the
+    # order the models were first seen (parents before children), committing every batch
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.pending = {}
+        self.written = {}
+
+    def add(self, model, row):
+        rows = self.pending.setdefault(model, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for model, rows in self.pending.items():
+            if rows:
+                db.session.execute(insert(model), rows)
+                self.written[model.__tablename__] = self.written.get(model.__tablename__, 0) + len(rows)
+                rows.clear()
+        db.session.commit()
+
+
+def _timed(label, fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    print('  %-14s %.1f s' % (label, time.perf_counter() - started))
+
+
+def seed_users(dataset, rng, writer):
+    # One bcrypt hash for everybody, at the configured work factor, so logins cost what they do in production
+    password = hasher.generate_password_hash(PASSWORD)
+    for u in range(dataset.users):
+        writer.add(User, {'user_id': FIRST_ID + u, 'user_name': 'bench%d' % u, 'email': 'bench%d@example.com' % u,
+                          'contact': 800000000 + u, 'password': password})
+    writer.flush()
+
+
+def seed_bookings(dataset, rng, writer):
+    prices = {}
+    for b in range(dataset.bookings):
+        booked_at = datetime.combine(dataset.today, datetime.min.time()) - timedelta(
+            days=rng.randrange(HISTORY_DAYS), seconds=rng.randrange(86400))
+        start = booked_at.date() + timedelta(days=rng.randint(7, 120))
+        package = rng.randrange(dataset.live_packages)
+        total_cost = prices.setdefault(package, round(rng.uniform(150, 5000), 2))
+        activities = rng.sample(ACTIVITIES, rng.randint(0, 3))
+
+        # A deposit, then the balance, which may still be outstanding. Bookings handed to
+        # booking.delete get none, as payments.booking_id references them.
+        payments = [(round(total_cost * 0.3, 2), 'completed'),
+                    (round(total_cost * 0.7, 2), rng.choice(['completed', 'completed', 'pending', 'failed']))]
+        if dataset.live_bookings <= b < dataset.live_bookings + dataset.spares:
+            payments = []
+        amount_paid = sum(amount for amount, status in payments if status in PAID_STATUSES)
+
+        writer.add(Booking, {
+            'booking_id': FIRST_ID + b,
+            'package_id': dataset.package_id(package),
+            'user_id': FIRST_ID + b % dataset.active_users,
+            'date_of_booking': booked_at,
+            'travel_start_date': start,
+            'travel_end_date': start + timedelta(days=rng.randint(1, 14)),
+            'total_cost': total_cost,
+            'amount_paid': amount_paid,
+            'balance_due': total_cost - amount_paid,
+            'payment_status': payment_status_for(amount_paid, total_cost),
+            'booking_status': rng.choice(BOOKING_STATUSES),
+            'destination': rng.choice(DESTINATIONS),
+            'accommodation': rng.choice(ACCOMMODATION),
+            'transportation': rng.choice(TRANSPORTATION),
+            'activities': activities,
+            'booking_source': rng.choice(BOOKING_SOURCES),
+        })
+        for activity in activities:
+            writer.add(BookingActivity, {'booking_id': FIRST_ID + b, 'activity': activity})
+        for k, (amount, status) in enumerate(payments):
+            writer.add(Payment, {
+                'payment_id': FIRST_ID + b * PAYMENTS_PER_BOOKING + k,
+                'booking_id': FIRST_ID + b,
+                'payment_date': booked_at + timedelta(days=k * rng.randint(1, 30)),
+                'amount': amount,
+                'payment_method': rng.choice(PAYMENT_METHODS),
+                'status': status,
+            })
+    writer.flush()
+
+
+def seed_notifications(dataset, rng, writer):
+    unread = {}
+    for n in range(dataset.notifications):
+        user_id = FIRST_ID + n % dataset.active_users
+        created_at = datetime.now() - timedelta(seconds=rng.randrange(90 * 86400))
+        status = 'unread' if rng.random() < 0.3 else 'read'
+        if status == 'unread':
+            unread[user_id] = unread.get(user_id, 0) + 1
+        writer.add(Notification, {'notification_id': FIRST_ID + n, 'recipient_id': user_id, 'created_at': created_at,
+                                  'message': 'Your trip to %s is coming up' % rng.choice(DESTINATIONS),
+                                  'status': status})
+        writer.add(NotificationChange, {'recipient_id': user_id, 'notification_id': FIRST_ID + n,
+                                        'op': 'upsert', 'changed_at': created_at})
+    for user_id, count in unread.items():
+        writer.add(NotificationCounter, {'user_id': user_id, 'unread': count})
+    writer.flush()
+
+
+def seed_cars(dataset, rng, writer):
+    prices = []
+    for c in range(dataset.cars):
+        make, model = rng.choice(CARS)
+        prices.append(round(rng.uniform(40, 250), 2))
+        writer.add(Car, {'id': FIRST_ID + c, 'make': make, 'model': model, 'year': rng.randint(2010, 2024),
+                         'available': c < dataset.available_cars, 'price_per_day': prices[c]})
+
+    # Back-to-back history per car that runs a couple of months into the future
+    per_car = -(-dataset.rentals // dataset.cars)
+    first_day = datetime.combine(dataset.today, datetime.min.time()) - timedelta(days=per_car * 4 - 60)
+    for r in range(dataset.rentals):
+        c, k = r % dataset.cars, r // dataset.cars
+        start = first_day + timedelta(days=k * 4 + rng.randint(0, 1))
+        days = rng.randint(1, 3)
+        writer.add(Rental, {'id': FIRST_ID + r, 'car_id': FIRST_ID + c, 'start_date': start,
+                            'end_date': start + timedelta(days=days),
+                            'user_id': FIRST_ID + rng.randrange(dataset.active_users),
+                            'total_cost': days * prices[c]})
+    writer.flush()
+
+
+def seed(dataset, seed=42, batch_size=5000):
+    rng = random.Random(seed)
+    writer = BulkWriter(batch_size)
+    started = time.perf_counter()
+    print('Seeding %r' % dataset)
+    _timed('users', seed_users, dataset, rng, writer)
+    _timed('packages', package_search.seed, rng, package_search.FIRST_ID, dataset.packages)
+    _timed('bookings', seed_bookings, dataset, rng, writer)
+    _timed('notifications', seed_notifications, dataset, rng, writer)
+    _timed('cars', seed_cars, dataset, rng, writer)
+
+    def rollups():
+        rebuild_rollups()
+        db.session.commit()
+    _timed('rollups', rollups)
+
+    elapsed = time.perf_counter() - started
+    rows = sum(writer.written.values())
+    print('  %d rows in %.1f s (%.0f rows/s, packages and rollups not counted)' % (rows, elapsed, rows / elapsed))
+
+
+def _delete_from(column, batch_size):
+    # Deletes rows with column >= FIRST_ID a range at a time, so no transaction gets huge
+    last = db.session.execute(select(func.max(column))).scalar()
+    start = FIRST_ID
+    while last is not None and start <= last:
+        db.session.execute(delete(column.table).where(column >= start, column < start + batch_size))
+        db.session.commit()
+        start += batch_size
+
+
+def cleanup(batch_size=50000):
+    # Children first, in case the schema enforces foreign keys
+    for column in (BookingActivity.booking_id, Payment.payment_id, NotificationChange.recipient_id,
+                   NotificationCounter.user_id, Notification.notification_id, Rental.id, Car.id,
+                   Booking.booking_id, User.user_id):
+        _delete_from(column, batch_size)
+    package_search.cleanup()
+    # Rollups are keyed by day, not by id; recompute them from what is left
+    rebuild_rollups()
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed or remove synthetic benchmark data')
+    parser.add_argument('--scale', type=float, default=1.0, help='Fraction of the full data set (1.0 = 1M bookings).')
+    parser.add_argument('--spares', type=int, default=1000, help='Rows per table reserved for delete endpoints.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT.')
+    parser.add_argument('--cleanup', action='store_true', help='Only remove previously seeded data.')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        cleanup()
+        if not args.cleanup:
+            seed(Dataset(args.scale, args.spares), args.seed, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# Load test for Idempotency-Key on POST /api/v1/payment/
+#
+# Seeds a user with a booking, then:
+#   * sends one payment with a key and retries it, counting the SQL statements per retry
+#     (a retry served from the in-process cache issues none);
+#   * fires bursts of concurrent duplicates at a local threaded WSGI server, one burst per
+#     key, and checks that each key created exactly one payment.
+# Runs against the database configured in config.Config, which should be migrated to head:
+#
+#     python -m benchmarks.idempotent_payments --retries 500 --keys 50 --duplicates 8
+import argparse
+import http.client
+import json
+import logging
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import delete, func, select
+from werkzeug.serving import make_server
+
+from aldo_safaris.extensions import db
+from aldo_safaris.init import create_app
+from aldo_safaris.models.idempotency_keys import IdempotencyKey
+from aldo_safaris.models.payments import Payment
+from aldo_safaris.utils.query_counter import QueryCounter
+from benchmarks.query_budget import seed, cleanup
+
+PATH = '/api/v1/payment/'
+
+
+def payment_body(booking_id):
+    return {'booking_id': booking_id, 'amount': 10, 'payment_method': 'card', 'status': 'completed'}
+
+
+def measure_retries(client, headers, body, retries):
+    # Returns (statements for the first request, statements per retry, retry latencies in ms)
+    key = {'Idempotency-Key': str(uuid.uuid4())}
+    with QueryCounter(db.engine) as counter:
+        first = client.post(PATH, json=body, headers=dict(headers, **key))
+    if first.status_code != 201:
+        raise SystemExit('First request failed: %s %s' % (first.status_code, first.get_data(as_text=True)))
+    first_statements = counter.count
+
+    latencies = []
+    with QueryCounter(db.engine) as counter:
+        for _ in range(retries):
+            started = time.perf_counter()
+            response = client.post(PATH, json=body, headers=dict(headers, **key))
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.get_json() != first.get_json() or response.headers.get('Idempotent-Replayed') != 'true':
+                raise SystemExit('Retry was not replayed: %s' % response.get_data(as_text=True))
+    return first_statements, counter.count / float(retries), latencies
+
+
+def post(port, headers, body):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('POST', PATH, body=json.dumps(body), headers=dict(headers, **{'Content-Type': 'application/json'}))
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return response.status
+
+
+def burst(port, headers, body, keys, duplicates):
+    # Every key is sent by `duplicates` threads released at the same moment
+    statuses = {}
+    with ThreadPoolExecutor(max_workers=duplicates) as pool:
+        for _ in range(keys):
+            key_headers = dict(headers, **{'Idempotency-Key': str(uuid.uuid4())})
+            gate = threading.Barrier(duplicates)
+
+            def send(_):
+                gate.wait()
+                return post(port, key_headers, body)
+
+            for status in pool.map(send, range(duplicates)):
+                statuses[status] = statuses.get(status, 0) + 1
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--retries', type=int, default=500)
+    parser.add_argument('--keys', type=int, default=50, help='Concurrent bursts, one key each.')
+    parser.add_argument('--duplicates', type=int, default=8, help='Requests per key in a burst.')
+    args = parser.parse_args()
+
+    app = create_app()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    failed = False
+    with app.app_context():
+        user_id, booking_id, _ = seed()
+        headers = {'Authorization': 'Bearer ' + create_access_token(identity=str(user_id))}
+        body = payment_body(booking_id)
+        client = app.test_client()
+        try:
+            first, per_retry, latencies = measure_retries(client, headers, body, args.retries)
+            print('first request   %d statements' % first)
+            print('retries         %.2f statements per retry, p50 %.2f ms, max %.2f ms (%d retries)' % (
+                per_retry, statistics.median(latencies), max(latencies), args.retries))
+            failed |= per_retry > 0
+
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            payments_before = db.session.execute(
+                select(func.count()).select_from(Payment).where(Payment.booking_id == booking_id)).scalar()
+            db.session.commit()
+            statuses = burst(server.server_port, headers, body, args.keys, args.duplicates)
+            server.shutdown()
+            created = db.session.execute(
+                select(func.count()).select_from(Payment).where(Payment.booking_id == booking_id)
+            ).scalar() - payments_before
+            print('bursts          %d keys x %d duplicates: %d payments created, statuses=%s' % (
+                args.keys, args.duplicates, created, statuses))
+            failed |= created != args.keys
+        finally:
+            db.session.rollback()
+            db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.user_id == str(user_id)))
+            db.session.commit()
+            cleanup(user_id)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# Throughput of concurrent car image fetches from the media endpoint
+#
+# Serves a temporary UPLOAD_FOLDER through a local threaded WSGI server and fetches one image
+# from many client threads: full downloads, revalidations (If-None-Match -> 304) and range
+# requests. No database is needed:
+#
+#     python -m benchmarks.image_serving --size-kb 800 --clients 16 --requests 2000
+import argparse
+import hashlib
+import http.client
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import make_server
+
+import config
+from aldo_safaris.init import create_app
+
+
+def make_image(folder, size):
+    data = os.urandom(size)
+    key = hashlib.sha256(data).hexdigest() + '.jpg'
+    with open(os.path.join(folder, key), 'wb') as f:
+        f.write(data)
+    return key
+
+
+def fetch(port, path, headers, requests):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    received = 0
+    statuses = {}
+    for _ in range(requests):
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        received += len(response.read())
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+    conn.close()
+    return received, statuses
+
+
+def run(port, path, headers, clients, requests):
+    per_client = max(1, requests // clients)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(lambda _: fetch(port, path, headers, per_client), range(clients)))
+    elapsed = time.perf_counter() - started
+
+    received = sum(r[0] for r in results)
+    statuses = {}
+    for _, s in results:
+        for status, count in s.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return per_client * clients / elapsed, received / elapsed / 1024 / 1024, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent image fetch benchmark')
+    parser.add_argument('--size-kb', type=int, default=800)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='aldo-media-')
+
+    class BenchmarkConfig(config.TestingConfig):
+        UPLOAD_FOLDER = folder
+
+    try:
+        app = create_app(BenchmarkConfig)
+        key = make_image(folder, args.size_kb * 1024)
+        path = app.config['UPLOAD_URL'] + '/' + key
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_port
+
+        etag = '"%s"' % key.rsplit('.', 1)[0]
+        scenarios = [
+            ('full download', {}),
+            ('If-None-Match (304)', {'If-None-Match': etag}),
+            ('Range first 64 KiB', {'Range': 'bytes=0-65535'}),
+        ]
+        print('%d KiB image, %d clients, %d requests per scenario' % (args.size_kb, args.clients, args.requests))
+        for name, headers in scenarios:
+            rps, mbps, statuses = run(port, path, headers, args.clients, args.requests)
+            print('%-22s %9.1f req/s %9.1f MiB/s  statuses=%s' % (name, rps, mbps, statuses))
+
+        server.shutdown()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# Latency of GET /api/v1/travel_package/search at growing catalogue sizes
+#
+# Seeds synthetic packages (and their search index rows) into the database configured in
+# config.Config, which should be migrated to head, then times a mix of text, facet and
+# combined searches through the Flask test client at each size. Seeded rows are removed at
+# the end unless --keep is given:
+#
+#     python -m benchmarks.package_search --sizes 10000 100000 --queries 200
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import insert, delete
+
+from aldo_safaris.extensions import db
+from aldo_safaris.init import create_app
+from aldo_safaris.models.package_search import PackageSearchTerm, PackageFacet
+from aldo_safaris.models.travel_packages import TravelPackage
+from aldo_safaris.repositories.package_search import TEXT_FIELDS, tokenize
+
+# Seeded packages get ids from here up, so they can be told apart and removed
+FIRST_ID = 10000000
+
+DESTINATIONS = ['Bwindi', 'Queen Elizabeth', 'Murchison Falls', 'Kidepo', 'Jinja', 'Lake Mburo',
+                'Kibale', 'Rwenzori', 'Sipi Falls', 'Lake Bunyonyi', 'Entebbe', 'Mgahinga']
+ACTIVITIES = ['Gorilla tracking', 'Chimpanzee tracking', 'Game drive', 'Boat cruise', 'Hiking',
+              'Rafting', 'Birding', 'Cultural visit', 'Kayaking', 'Mountain biking', 'Fishing', 'Camping']
+WORDS = ('gorilla chimpanzee safari lodge luxury budget family trek forest savannah lake river nile '
+         'falls crater mountain sunrise sunset birding culture village tea coffee canoe boat cruise '
+         'lion elephant leopard buffalo giraffe rhino hippo crocodile guide camp tent cottage '
+         'breakfast dinner transfer airport flight permit park ranger walk hike climb summit').split()
+
+# (name, query string) searched at every size
+QUERIES = [
+    ('text', 'q=gorilla'),
+    ('text_prefix', 'q=chimp'),
+    ('text_two_terms', 'q=luxury+lodge'),
+    ('facet_destination', 'destination=Bwindi'),
+    ('facet_activity_price', 'activity=Hiking&max_price=1500'),
+    ('combined', 'q=safari&destination=Murchison+Falls&activity=Game+drive&min_duration=3&max_duration=7'),
+    ('no_filters', ''),
+]
+
+
+def fake_package(rng, package_id):
+    def words(n):
+        return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+    return {
+        'package_id': package_id,
+        'package_name': words(3).title(),
+        'description': words(30),
+        'inclusions': words(8),
+        'price': round(rng.uniform(150, 5000), 2),
+        'duration': rng.randint(1, 14),
+        'availability': rng.random() < 0.9,
+    }, rng.sample(DESTINATIONS, rng.randint(1, 3)), rng.sample(ACTIVITIES, rng.randint(1, 4))
+
+
+def seed(rng, start, count, batch_size=2000):
+    # Packages and their index rows go in with executemany, as index_package would write them
+    for offset in range(0, count, batch_size):
+        packages, terms, facets = [], [], []
+        for package_id in range(start + offset, start + min(offset + batch_size, count)):
+            package, destinations, activities = fake_package(rng, package_id)
+            packages.append(dict(package, destinations=destinations, activities=activities))
+            weights = {}
+            for field, weight in TEXT_FIELDS:
+                for term in set(tokenize(package[field])):
+                    weights[term] = weights.get(term, 0) + weight
+            terms += [{'term': t, 'package_id': package_id, 'weight': w} for t, w in weights.items()]
+            facets += [{'facet': 'destination', 'value': v, 'package_id': package_id} for v in destinations]
+            facets += [{'facet': 'activity', 'value': v, 'package_id': package_id} for v in activities]
+        db.session.execute(insert(TravelPackage), packages)
+        db.session.execute(insert(PackageSearchTerm), terms)
+        db.session.execute(insert(PackageFacet), facets)
+        db.session.commit()
+
+
+def cleanup():
+    for model in (PackageSearchTerm, PackageFacet, TravelPackage):
+        db.session.execute(delete(model).where(model.package_id >= FIRST_ID))
+    db.session.commit()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def measure(client, query, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get('/api/v1/travel_package/search?' + query)
+        samples.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise SystemExit('search?%s failed: %s %s' % (query, response.status_code, response.get_data(as_text=True)))
+    return response.get_json()['total'], samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=100, help='Requests per query and size.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keep', action='store_true', help='Leave the seeded packages in the database.')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        cleanup()
+        seeded = 0
+        try:
+            for size in sorted(args.sizes):
+                started = time.perf_counter()
+                seed(rng, FIRST_ID + seeded, size - seeded)
+                seeded = size
+                print('%d packages (seeded in %.1f s)' % (size, time.perf_counter() - started))
+                print('  %-22s %8s %8s %8s %8s %8s' % ('query', 'matches', 'p50 ms', 'p95 ms', 'p99 ms', 'mean ms'))
+                for name, query in QUERIES:
+                    total, samples = measure(client, query, args.queries)
+                    print('  %-22s %8d %8.1f %8.1f %8.1f %8.1f' % (
+                        name, total, percentile(samples, 50), percentile(samples, 95),
+                        percentile(samples, 99), statistics.mean(samples)))
+        finally:
+            if not args.keep:
+                cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# SQL statements per endpoint, checked against benchmarks/query_budget.json
+#
+# Seeds a user with a booking and payments, calls each endpoint once through the Flask test
+# client and counts the statements it issues. Exits non-zero when an endpoint needs more
+# queries than its budget or answers with an HTTP error: a 403 or 500 usually takes fewer
+# statements, which must not pass as an improvement. It also fails when the budget lists an
+# endpoint that is not measured or lacks one that is. Runs against the database configured
+# in config.Config:
+#
+#     python -m benchmarks.query_budget            # check
+#     python -m benchmarks.query_budget --update   # record the current counts as the budget
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+from flask_jwt_extended import create_access_token
+
+from aldo_safaris.extensions import db
+from aldo_safaris.init import create_app
+from aldo_safaris.models.booking import Booking
+from aldo_safaris.models.payments import Payment
+from aldo_safaris.models.user_accounts import User
+from aldo_safaris.utils.query_counter import QueryCounter
+
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), 'query_budget.json')
+
+# (name, method, path, JSON body); {booking_id} and {payment_id} refer to the seeded rows
+ENDPOINTS = [
+    ('payment.get', 'get', '/api/v1/payment/{payment_id}', None),
+    ('payment.update', 'put', '/api/v1/payment/{payment_id}', {'amount': 20}),
+    ('payment.list_for_booking', 'get', '/api/v1/payment/booking/{booking_id}', None),
+    ('payment.create', 'post', '/api/v1/payment/',
+     {'booking_id': '{booking_id}', 'amount': 10, 'payment_method': 'card', 'status': 'completed'}),
+    ('payment.delete', 'delete', '/api/v1/payment/{payment_id}', None),
+    ('booking.get', 'get', '/api/v1/booking/{booking_id}', None),
+    ('booking.user_bookings', 'get', '/api/v1/booking/user_bookings?limit=50', None),
+]
+
+
+EMAIL = 'query-budget@example.com'
+
+
+def seed():
+    user = User(user_name='query-budget', email=EMAIL, contact=700000099,
+                password='not-a-real-hash')
+    db.session.add(user)
+    db.session.flush()
+    booking = Booking(user_id=user.user_id, date_of_booking=datetime.now(), total_cost=100,
+                      destination='Bwindi')
+    db.session.add(booking)
+    db.session.flush()
+    payments = [Payment(booking_id=booking.booking_id, payment_date=datetime.now(), amount=10,
+                        payment_method='card', status='completed') for _ in range(5)]
+    db.session.add_all(payments)
+    db.session.commit()
+    return user.user_id, booking.booking_id, payments[0].payment_id
+
+
+def cleanup():
+    # Removes the seeded rows, including those left by a run that was interrupted
+    for user in User.query.filter_by(email=EMAIL):
+        booking_ids = [b.booking_id for b in Booking.query.filter_by(user_id=user.user_id)]
+        Payment.query.filter(Payment.booking_id.in_(booking_ids)).delete(synchronize_session=False)
+        Booking.query.filter_by(user_id=user.user_id).delete()
+        db.session.delete(user)
+    db.session.commit()
+
+
+def fill(value, ids):
+    if isinstance(value, str):
+        filled = value.format(**ids)
+        return int(filled) if value.startswith('{') and filled.isdigit() else filled
+    if isinstance(value, dict):
+        return {k: fill(v, ids) for k, v in value.items()}
+    return value
+
+
+def measure():
+    # Returns {name: (statements, HTTP status)}
+    app = create_app()
+    counts = {}
+    with app.app_context():
+        cleanup()
+        try:
+            user_id, booking_id, payment_id = seed()
+            ids = {'booking_id': booking_id, 'payment_id': payment_id}
+            headers = {'Authorization': 'Bearer ' + create_access_token(identity=str(user_id))}
+            client = app.test_client()
+            for name, method, path, body in ENDPOINTS:
+                with QueryCounter(db.engine) as counter:
+                    response = getattr(client, method)(fill(path, ids), json=fill(body, ids), headers=headers)
+                if response.status_code >= 400:
+                    print('%s: HTTP %d %s' % (name, response.status_code, response.get_data(as_text=True)))
+                counts[name] = counter.count, response.status_code
+        finally:
+            db.session.rollback()
+            cleanup()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check SQL statements per endpoint against a budget')
+    parser.add_argument('--update', action='store_true', help='write the measured counts as the new budget')
+    args = parser.parse_args()
+
+    counts = measure()
+    errors = sorted(name for name, (_, status_code) in counts.items() if status_code >= 400)
+
+    if args.update:
+        if errors:
+            print('Not updating the budget, these endpoints failed: %s' % ', '.join(errors))
+            return 1
+        with open(BUDGET_FILE, 'w') as f:
+            json.dump({name: count for name, (count, _) in counts.items()}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('Budget written to %s' % BUDGET_FILE)
+        return 0
+
+    with open(BUDGET_FILE) as f:
+        budget = json.load(f)
+
+    # Every budget must come from a measurement: an endpoint without one, or a budget for an
+    # endpoint that is no longer measured, fails the check until --update is run
+    regressions = 0
+    for name, (count, status_code) in counts.items():
+        allowed = budget.get(name)
+        status = 'ok'
+        if status_code >= 400:
+            status = 'FAILED (HTTP %d)' % status_code
+            regressions += 1
+        elif allowed is None:
+            status = 'NO BUDGET (run --update)'
+            regressions += 1
+        elif count > allowed:
+            status = 'REGRESSION'
+            regressions += 1
+        print('%-28s %3d queries (budget %s) %s' % (name, count, allowed, status))
+    for name in sorted(set(budget) - set(counts)):
+        print('%-28s not measured; remove it with --update' % name)
+        regressions += 1
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# Rejected-signup throughput for /api/v1/customer/register
+#
+# Compares the current validation pipeline with the previous ordering, which hashed the
+# password before checking anything. Runs against the database configured in config.Config:
+#
+#     python -m benchmarks.register_rejections --requests 200
+import argparse
+import time
+
+from flask import jsonify, request
+
+from aldo_safaris.extensions import db, hasher
+from aldo_safaris.init import create_app
+from aldo_safaris.models.user_accounts import User
+
+SEED_EMAIL = 'bench-register@example.com'
+SEED_CONTACT = 700000001
+
+REJECTED_PAYLOADS = [
+    {'user_name': 'missing-fields'},
+    {'user_name': 'short', 'email': 'short@example.com', 'contact': 700000002, 'password': 'abc'},
+    {'user_name': 'dup-email', 'email': SEED_EMAIL, 'contact': 700000003, 'password': 'secret123'},
+    {'user_name': 'dup-contact', 'email': 'dup@example.com', 'contact': SEED_CONTACT, 'password': 'secret123'},
+]
+
+
+def legacy_register():
+    # The registration flow before the validation pipeline: hash first, then two lookups
+    data = request.json
+    password = data.get('password')
+    hasher.generate_password_hash(password or '')
+    if not data.get('user_name') or not data.get('email') or not data.get('contact') or not password:
+        return jsonify({"error": "All fields are required"})
+    if len(password) < 6:
+        return jsonify({"error": "Your password must have at least 6 characters"})
+    if User.query.filter_by(email=data['email']).first():
+        return jsonify({"error": "This email is already registered"})
+    if User.query.filter_by(contact=data['contact']).first():
+        return jsonify({"error": "This contact is already registered"})
+    return jsonify({"error": "unexpected success"})
+
+
+def run(client, url, requests):
+    started = time.perf_counter()
+    for i in range(requests):
+        response = client.post(url, json=REJECTED_PAYLOADS[i % len(REJECTED_PAYLOADS)])
+        assert 'error' in response.get_json(), response.get_json()
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rejected-signup throughput benchmark')
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    app.add_url_rule('/bench/legacy_register', 'legacy_register', legacy_register, methods=['POST'])
+
+    with app.app_context():
+        seed = User(user_name='bench-register', email=SEED_EMAIL, contact=SEED_CONTACT,
+                    password=hasher.generate_password_hash('secret123'))
+        db.session.add(seed)
+        db.session.commit()
+
+    try:
+        client = app.test_client()
+        before = run(client, '/bench/legacy_register', args.requests)
+        after = run(client, '/api/v1/customer/register', args.requests)
+    finally:
+        with app.app_context():
+            User.query.filter_by(email=SEED_EMAIL).delete()
+            db.session.commit()
+
+    print('rejected signups/s  before: %10.1f' % before)
+    print('rejected signups/s  after:  %10.1f' % after)
+    print('speed-up:                   %10.1fx' % (after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,136 @@
+import os
+
+from aldo_safaris.utils.pool import TimedQueuePool
+
+
 class Config:
-    SQLALCHEMY_DATABASE_URI="mysql+pymysql://root:@localhost/aldo"
+    SQLALCHEMY_DATABASE_URI=os.environ.get('DATABASE_URL', "mysql+pymysql://root:@localhost/aldo")
     JWT_SECRET_KEY='safaris'
+
+    # Users allowed to call admin endpoints (broadcasts, exports)
+    ADMIN_USER_IDS=[int(i) for i in os.environ.get('ADMIN_USER_IDS', '').split(',') if i.strip()]
+
+    # Startup check that alembic_version matches migrations/: 'warn', 'error' or 'off'
+    SCHEMA_CHECK='warn'
+
+    # Connection pool (per app worker)
+    DB_POOL_SIZE=int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW=int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_RECYCLE=int(os.environ.get('DB_POOL_RECYCLE', 280))  # below MySQL wait_timeout to avoid "server has gone away"
+    DB_POOL_TIMEOUT=int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    DB_POOL_WARMUP=int(os.environ.get('DB_POOL_WARMUP', 0))  # connections opened at startup
+    SQLALCHEMY_ENGINE_OPTIONS={
+        'poolclass': TimedQueuePool,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_pre_ping': True,
+    }
+
+    # gunicorn worker processes; gunicorn reads the same variable
+    WEB_CONCURRENCY=int(os.environ.get('WEB_CONCURRENCY', 1))
+
+    # Response cache for the public travel package catalogue. 'memory' is a per-process LRU:
+    # a package write only evicts the worker that handled it, the others serve the old
+    # catalogue until CACHE_DEFAULT_TTL runs out, so it is only the default for one worker.
+    CACHE_BACKEND=os.environ.get('CACHE_BACKEND', 'redis' if WEB_CONCURRENCY > 1 else 'memory')
+    CACHE_REDIS_URL=os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_DEFAULT_TTL=300
+    CACHE_MAX_ENTRIES=256
+
+    # Password hashing pool
+    BCRYPT_LOG_ROUNDS=12  # bcrypt work factor; older hashes are upgraded on the next login
+    PASSWORD_HASH_WORKERS=2  # processes per app worker, 0 hashes on the request thread
+    PASSWORD_HASH_MAX_PENDING=8  # in-flight hashes before answering 503
+    PASSWORD_HASH_TIMEOUT=10
+    PASSWORD_HASH_RETRY_AFTER=1
+
+    # Bulk booking uploads
+    BULK_BOOKING_CHUNK_SIZE=500  # rows per INSERT (and per transaction in partial mode)
+    BULK_BOOKING_MAX_ROWS=5000
+
+    # Idempotency-Key support on payment creation
+    IDEMPOTENCY_TTL_SECONDS=86400  # how long a key's response is replayed
+    IDEMPOTENCY_CACHE_ENTRIES=1024  # completed responses kept in memory per worker
+    IDEMPOTENCY_WAIT_SECONDS=2  # how long a concurrent duplicate waits for the first response
+    IDEMPOTENCY_RETRY_AFTER=1  # Retry-After sent when that wait runs out
+    IDEMPOTENCY_LEASE_SECONDS=60  # an unfinished request's key is reclaimed after this
+
+    # Per-request SQL instrumentation (Server-Timing headers, /metrics, slow-query log)
+    SQL_INSTRUMENTATION=False
+    SQL_SLOW_QUERY_MS=200
+    SQL_SLOWEST_STATEMENTS=3
+    SQL_SERVER_TIMING=True
+    METRICS_ENDPOINT='/metrics'
+
+    # Car image uploads; WebP variants need Pillow installed
+    STORAGE_BACKEND=os.environ.get('STORAGE_BACKEND', 'local')  # 'local' (UPLOAD_FOLDER) or 's3' (needs boto3)
+    UPLOAD_FOLDER=os.environ.get('UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
+    UPLOAD_URL='/uploads'
+    UPLOAD_TMP_FOLDER=None  # spool directory for the s3 backend, defaults to the system temp dir
+    S3_BUCKET=os.environ.get('S3_BUCKET')
+    S3_ENDPOINT_URL=os.environ.get('S3_ENDPOINT_URL')  # e.g. a local MinIO
+    S3_PUBLIC_URL=os.environ.get('S3_PUBLIC_URL')  # base URL clients fetch objects from
+    IMAGE_WORKERS=2  # background threads per app worker, 0 processes on the request thread
+    IMAGE_VARIANTS={'thumb': 320, 'medium': 1024}  # name -> longest side in pixels
+    IMAGE_PRIMARY_VARIANT='medium'  # variant stored in Car.image_url
+    IMAGE_WEBP_QUALITY=80
+
+    # Background jobs (notification broadcasts)
+    JOB_WORKERS=2  # threads per app worker, 0 runs jobs on the request thread
+    BROADCAST_CHUNK_SIZE=1000  # recipients per INSERT ... SELECT
+
+    # Push channel (GET /api/v1/notification/stream). Each open stream holds a worker thread,
+    # so serve it with threaded or gevent workers.
+    PUBSUB_BACKEND='memory'  # 'memory' (this worker only) or 'redis' (fans out across workers)
+    PUBSUB_REDIS_URL=os.environ.get('PUBSUB_REDIS_URL', 'redis://localhost:6379/0')
+    PUBSUB_CHANNEL='aldo:notifications'
+    PUSH_HEARTBEAT_SECONDS=15  # comment line sent on idle streams to keep proxies from closing them
+    PUSH_QUEUE_SIZE=100  # undelivered events per stream before the client is told to resync
+    PUSH_MAX_SUBSCRIBERS=1000  # open streams per worker
+
+    # Delta sync (GET /api/v1/notification/sync): changes younger than this are held back so
+    # a slower transaction with a lower change id is never skipped
+    NOTIFICATION_SYNC_SETTLE_SECONDS=2
+    NOTIFICATION_CHANGE_RETENTION_DAYS=7  # superseded changes older than this are purged
+
+    # Revenue reports (GET /api/v1/analytics/...), answered from the daily rollup tables
+    ANALYTICS_MAX_RANGE_DAYS=731
+
+
+class DevelopmentConfig(Config):
+    DEBUG=True
+    PASSWORD_HASH_WORKERS=0
+
+
+class ProductionConfig(Config):
+    DB_POOL_SIZE=int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW=int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_WARMUP=int(os.environ.get('DB_POOL_WARMUP', DB_POOL_SIZE))
+    SQLALCHEMY_ENGINE_OPTIONS=dict(Config.SQLALCHEMY_ENGINE_OPTIONS,
+                                   pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+    SCHEMA_CHECK='error'
+    PUBSUB_BACKEND=os.environ.get('PUBSUB_BACKEND', 'memory')
+
+
+class TestingConfig(Config):
+    TESTING=True
+    SQLALCHEMY_DATABASE_URI=os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+    SQLALCHEMY_ENGINE_OPTIONS={}
+    BCRYPT_LOG_ROUNDS=4
+    PASSWORD_HASH_WORKERS=0
+    SCHEMA_CHECK='off'
+    CACHE_BACKEND='memory'
+    NOTIFICATION_SYNC_SETTLE_SECONDS=0
+
+
+# Selected with APP_ENV; create_app falls back to Config
+configs = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
 #class Config:
     # Database configuration
     #SQLALCHEMY_DATABASE_URI = "mysql+pymysql://root:@localhost/aldo_safaris"
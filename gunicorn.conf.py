@@ -0,0 +1,13 @@
+# gunicorn settings, read from the working directory:
+#
+#     gunicorn --preload app:app
+#
+# The number of workers comes from WEB_CONCURRENCY, which gunicorn reads itself.
+from aldo_safaris.utils.pool import warm_up_pools_after_fork
+
+
+def post_fork(server, worker):
+    # Fill the worker's database pool (DB_POOL_WARMUP connections) before it accepts traffic.
+    # Only an app preloaded in the master has pools to warm here; without --preload each
+    # worker builds the app, and warms its pool, before accepting anyway.
+    warm_up_pools_after_fork()
@@ -0,0 +1,45 @@
+"""add indexes for hot lookup columns
+
+Revision ID: 7134afa991ea
+Revises: 6ab58ec7e65f
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7134afa991ea'
+down_revision = '6ab58ec7e65f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Booking history: WHERE user_id = ? ORDER BY date_of_booking DESC, booking_id DESC
+    with op.batch_alter_table('Booking', schema=None) as batch_op:
+        batch_op.create_index('ix_booking_user_id_date_of_booking', ['user_id', 'date_of_booking'], unique=False)
+
+    # Payments of a booking, and the ownership join on booking_id
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.create_index('ix_payments_booking_id', ['booking_id'], unique=False)
+
+    # Unread-notification feed: WHERE recipient_id = ? AND status = ? ORDER BY created_at
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.create_index('ix_notifications_recipient_id_status_created_at',
+                              ['recipient_id', 'status', 'created_at'], unique=False)
+
+    # user.email and user.contact are already covered by their unique indexes. The public catalogue
+    # (WHERE availability = 1) gets none: a boolean matching most packages is read faster by a scan
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_recipient_id_status_created_at')
+
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.drop_index('ix_payments_booking_id')
+
+    with op.batch_alter_table('Booking', schema=None) as batch_op:
+        batch_op.drop_index('ix_booking_user_id_date_of_booking')
@@ -0,0 +1,160 @@
+"""store list columns as JSON with association tables
+
+Revision ID: 8c2d4f6a1b93
+Revises: 3a8f1c5e9d47
+Create Date: 2026-10-18 16:58:20.461377
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c2d4f6a1b93'
+down_revision = '3a8f1c5e9d47'
+branch_labels = None
+depends_on = None
+
+# Rows converted per UPDATE batch
+BATCH_SIZE = 1000
+
+# table -> (primary key, list columns)
+LIST_COLUMNS = {
+    'TravelPackages': ('package_id', ('destinations', 'activities')),
+    'Booking': ('booking_id', ('activities',)),
+}
+
+
+def parse_legacy_list(value):
+    # Values written before this migration may be JSON, a Postgres-style array literal
+    # ({a,"b c"}) or comma-separated text, depending on how the column was created
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    text = value.strip()
+    if not text:
+        return []
+    if text.startswith('['):
+        try:
+            parsed = json.loads(text)
+            if isinstance(parsed, list):
+                return [str(item) for item in parsed]
+        except ValueError:
+            pass
+    if text.startswith('{') and text.endswith('}'):
+        text = text[1:-1]
+    return [item.strip().strip('"') for item in text.split(',') if item.strip().strip('"')]
+
+
+def distinct_values(values):
+    seen = []
+    for value in values or []:
+        value = value.strip()[:100]
+        if value and value not in seen:
+            seen.append(value)
+    return seen
+
+
+def convert_table(conn, table, pk, columns, existing):
+    # Copies each legacy column into a new JSON column batch by batch, then swaps them
+    for column in columns:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column(column + '_json', sa.JSON(), nullable=True))
+
+    legacy = [column for column in columns if column in existing]
+    if legacy:
+        source = sa.table(table, sa.column(pk), *[sa.column(column) for column in legacy])
+        target = sa.table(table, sa.column(pk), *[sa.column(column + '_json', sa.JSON(none_as_null=True))
+                                                  for column in legacy])
+        update = (target.update()
+                  .where(target.c[pk] == sa.bindparam('_pk'))
+                  .values({column + '_json': sa.bindparam('_' + column) for column in legacy}))
+        last_id = None
+        while True:
+            query = sa.select(source).order_by(source.c[pk]).limit(BATCH_SIZE)
+            if last_id is not None:
+                query = query.where(source.c[pk] > last_id)
+            rows = conn.execute(query).all()
+            if not rows:
+                break
+            conn.execute(update, [
+                dict({'_pk': row[0]}, **{'_' + column: parse_legacy_list(row[i + 1])
+                                         for i, column in enumerate(legacy)})
+                for row in rows
+            ])
+            last_id = rows[-1][0]
+
+    with op.batch_alter_table(table, schema=None) as batch_op:
+        for column in legacy:
+            batch_op.drop_column(column)
+        for column in columns:
+            batch_op.alter_column(column + '_json', new_column_name=column, existing_type=sa.JSON(),
+                                  existing_nullable=True)
+
+
+def fill_association(conn, table, pk, column, insert_rows):
+    # Mirrors a converted JSON column into its association table, batch by batch
+    source = sa.table(table, sa.column(pk), sa.column(column, sa.JSON()))
+    last_id = None
+    while True:
+        query = sa.select(source).where(source.c[column].isnot(None)).order_by(source.c[pk]).limit(BATCH_SIZE)
+        if last_id is not None:
+            query = query.where(source.c[pk] > last_id)
+        rows = conn.execute(query).all()
+        if not rows:
+            break
+        insert_rows(rows)
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    op.create_table('booking_activities',
+    sa.Column('booking_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('activity', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('booking_id', 'activity')
+    )
+    with op.batch_alter_table('booking_activities', schema=None) as batch_op:
+        batch_op.create_index('ix_booking_activities_activity_booking_id', ['activity', 'booking_id'], unique=False)
+
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    for table, (pk, columns) in LIST_COLUMNS.items():
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        convert_table(conn, table, pk, columns, existing)
+
+    booking_activities = sa.table('booking_activities', sa.column('booking_id'), sa.column('activity'))
+    package_facets = sa.table('package_facets', sa.column('facet'), sa.column('value'), sa.column('package_id'))
+
+    def insert_booking_activities(rows):
+        values = [{'booking_id': booking_id, 'activity': activity}
+                  for booking_id, activities in rows for activity in distinct_values(activities)]
+        if values:
+            conn.execute(booking_activities.insert(), values)
+
+    def insert_package_facets(facet):
+        def insert_rows(rows):
+            ids = [package_id for package_id, _ in rows]
+            conn.execute(package_facets.delete().where(package_facets.c.facet == facet,
+                                                       package_facets.c.package_id.in_(ids)))
+            values = [{'facet': facet, 'value': value, 'package_id': package_id}
+                      for package_id, values in rows for value in distinct_values(values)]
+            if values:
+                conn.execute(package_facets.insert(), values)
+        return insert_rows
+
+    fill_association(conn, 'Booking', 'booking_id', 'activities', insert_booking_activities)
+    fill_association(conn, 'TravelPackages', 'package_id', 'destinations', insert_package_facets('destination'))
+    fill_association(conn, 'TravelPackages', 'package_id', 'activities', insert_package_facets('activity'))
+
+
+def downgrade():
+    # The JSON columns are kept: MySQL has no ARRAY type to convert them back to
+    with op.batch_alter_table('booking_activities', schema=None) as batch_op:
+        batch_op.drop_index('ix_booking_activities_activity_booking_id')
+
+    op.drop_table('booking_activities')
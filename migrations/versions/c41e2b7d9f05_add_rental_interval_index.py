@@ -0,0 +1,57 @@
+"""add rental interval index for availability search
+
+Revision ID: c41e2b7d9f05
+Revises: 7134afa991ea
+Create Date: 2026-10-18 10:02:17.554930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e2b7d9f05'
+down_revision = '7134afa991ea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 6ab58ec7e65f dropped cars and rentals although the models and the car rental endpoints
+    # still use them. Recreate them with the models' columns where they are missing.
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    if 'cars' not in tables:
+        op.create_table('cars',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('make', sa.String(length=50), nullable=False),
+        sa.Column('model', sa.String(length=50), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('available', sa.Boolean(), nullable=True),
+        sa.Column('image_url', sa.String(length=255), nullable=True),
+        sa.Column('price_per_day', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'rentals' not in tables:
+        op.create_table('rentals',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('car_id', sa.Integer(), nullable=False),
+        sa.Column('start_date', sa.DateTime(), nullable=True),
+        sa.Column('end_date', sa.DateTime(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('total_cost', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    elif 'ix_rentals_car_id_end_date_start_date' in {index['name'] for index in inspector.get_indexes('rentals')}:
+        return
+
+    # Overlap probe: WHERE car_id = ? AND end_date > :start AND start_date < :end
+    with op.batch_alter_table('rentals', schema=None) as batch_op:
+        batch_op.create_index('ix_rentals_car_id_end_date_start_date',
+                              ['car_id', 'end_date', 'start_date'], unique=False)
+
+
+def downgrade():
+    # The tables are left in place: they may have existed before this revision
+    with op.batch_alter_table('rentals', schema=None) as batch_op:
+        batch_op.drop_index('ix_rentals_car_id_end_date_start_date')